@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the linter: the cost per line of `lint_markdown` on generated documents.
+
+The documents come from the benchmark corpus (corpus.generate_document), optionally followed
+by a fenced code appendix (`--code-lines`). Every measurement is the best of `--repeat` runs.
+`--compare REV` also measures src/linter.py as it was at a git revision, on the same
+documents, and reports whether both find the same issues.
+
+Run from the repository root:
+    python -m smart_md_debugger.benchmarks.bench_linter --lines 1000 20000 --compare HEAD~1
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from typing import Callable, List
+
+try:
+    from ..src import linter
+    from .corpus import generate_document
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    import linter
+    from corpus import generate_document
+
+LINTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "linter.py")
+# A line of code for the code appendix, with the dollars, scripts and backslashes of a real listing
+CODE_LINE = 'printf("%s: $%d\\n", name_of_item_a_b, total_cost^2);  /* \\begin{x} */\n'
+
+
+def code_appendix(lines: int) -> str:
+    """A fenced code block of `lines` lines, to append to a document."""
+    if lines <= 0:
+        return ""
+    return "\n```c\n" + CODE_LINE * lines + "```\n"
+
+
+def load_linter_at(revision: str):
+    """
+    Imports src/linter.py as it was at a git revision, as a separate module.
+
+    The whole src/ tree of the revision is exported into a package of its own, so the modules
+    the linter imports (region_mask, document, ...) are the revision's as well.
+    """
+    src_dir = os.path.dirname(os.path.realpath(LINTER_PATH))
+    repo_root = subprocess.run(["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True,
+                               cwd=src_dir).stdout.strip()
+    commit = subprocess.run(["git", "rev-parse", "--verify", f"{revision}^{{commit}}"], capture_output=True, text=True,
+                            check=True, cwd=repo_root).stdout.strip()
+    relative_path = os.path.relpath(src_dir, repo_root)
+    archive = subprocess.run(["git", "archive", "--format=tar", f"{commit}:{relative_path}"], capture_output=True,
+                             check=True, cwd=repo_root).stdout
+    # A package name per commit, so revisions loaded side by side do not share modules
+    package = f"smd_src_at_{commit[:12]}"
+    with tempfile.TemporaryDirectory(prefix="smd-bench-linter-") as temp_dir:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(os.path.join(temp_dir, package), filter="data")
+        sys.path.insert(0, temp_dir)
+        try:
+            module = importlib.import_module(f"{package}.linter")
+        finally:
+            sys.path.remove(temp_dir)
+    return module
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    """Returns the shortest of `repeat` runs of `function`, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_benchmark(line_counts: List[int], repeat: int, seed: int, baseline=None, code_lines: int = 0) -> List[dict]:
+    """
+    Measures the linter (and the baseline module, if given) on a document of every size.
+
+    Args:
+        line_counts: The sizes of the generated documents, in lines, without the code appendix.
+        repeat: Runs per measurement; the fastest counts.
+        seed: Seed of the document generator.
+        baseline: Another linter module to measure on the same documents, or None.
+        code_lines: Lines of the fenced code block appended to every document.
+
+    Returns:
+        A dict per document with its size, the number of findings and the cost per line.
+    """
+    results = []
+    for lines in line_counts:
+        document, _ = generate_document(lines, seed=seed)
+        document += code_appendix(code_lines)
+        line_count = len(document.splitlines())
+        result = {
+            "lines": line_count,
+            "findings": len(linter.lint_markdown(document)),
+            "us_per_line": round(best_time(lambda: linter.lint_markdown(document), repeat) / line_count * 1e6, 3),
+        }
+        if baseline is not None:
+            result["same_findings"] = baseline.lint_markdown(document) == linter.lint_markdown(document)
+            result["baseline_us_per_line"] = round(best_time(lambda: baseline.lint_markdown(document), repeat) / line_count * 1e6, 3)
+            result["speedup"] = round(result["baseline_us_per_line"] / result["us_per_line"], 2)
+        results.append(result)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the linter's cost per line on generated documents.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 20000], help="Document sizes in lines (default: 1000 20000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the fastest counts (default: 5).")
+    parser.add_argument("--code-lines", type=int, default=0, help="Lines of a fenced code block appended to every document (default: 0).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the document generator (default: 0).")
+    parser.add_argument("--compare", default=None, metavar="REV", help="Also measure src/linter.py as of git revision REV.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        try:
+            baseline = load_linter_at(args.compare)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Error: could not load the linter at revision '{args.compare}': {e}", file=sys.stderr)
+            return 1
+    results = run_benchmark(args.lines, args.repeat, args.seed, baseline, args.code_lines)
+    if args.json:
+        json.dump({"compare": args.compare, "repeat": args.repeat, "seed": args.seed, "code_lines": args.code_lines,
+                   "results": results}, sys.stdout, indent=2)
+        print()
+        return 0
+    for result in results:
+        line = f"{result['lines']:>7} lines  {result['us_per_line']:7.2f} us/line"
+        if baseline is not None:
+            line += f"  ({args.compare}: {result['baseline_us_per_line']:7.2f} us/line, {result['speedup']:.2f}x)"
+            if not result["same_findings"]:
+                line += f"  {args.compare} finds other issues"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import random
+from typing import Dict, List, NamedTuple, Tuple
+
+# Errors the generator injects: an undefined command, an environment that is never closed and
+# a math group whose closing brace is missing. The simulated backend (and the stub pandoc) fails on these.
+ERROR_TYPES = ("undefined-command", "unclosed-environment", "unbalanced-brace")
+
+WORDS = ("the", "chunk", "probe", "pandoc", "document", "error", "range", "line", "block", "section",
+         "compiles", "fails", "quickly", "with", "every", "output", "text", "and", "of", "a")
+# Commands and environments the filler text uses; the simulated backend knows all of them.
+FILLER_INLINES = ("\\textbf{bold}", "\\emph{stress}", "$\\alpha + \\beta$", "$\\frac{a}{b}$", "$x^{2}$")
+# Every how many lines a new section starts
+SECTION_LINES = 40
+
+
+class InjectedError(NamedTuple):
+    """An error the generator put into a document: its type and the line it is on."""
+    type: str
+    line: int
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 12))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(FILLER_INLINES))
+    return " ".join(words).capitalize() + "."
+
+
+def _filler_block(rng: random.Random, section: int) -> List[str]:
+    """A paragraph, a list or a display equation, without errors."""
+    kind = rng.random()
+    if kind < 0.15:
+        items = [f"  \\item {_sentence(rng)}" for _ in range(rng.randint(2, 4))]
+        return ["\\begin{itemize}", *items, "\\end{itemize}"]
+    if kind < 0.25:
+        return ["$$", f"\\sum_{{i=1}}^{{{section + 2}}} x_i^{{2}}", "$$"]
+    return [_sentence(rng) for _ in range(rng.randint(1, 4))]
+
+
+def _error_block(rng: random.Random, error_type: str, index: int) -> Tuple[List[str], int]:
+    """Returns a block with one error and the offset of the line the error is on."""
+    if error_type == "undefined-command":
+        return [_sentence(rng), f"This line uses \\undefinedcommand{chr(ord('a') + index % 26)} by mistake.", _sentence(rng)], 1
+    if error_type == "unclosed-environment":
+        return ["\\begin{enumerate}", f"  \\item {_sentence(rng)}", f"  \\item {_sentence(rng)}"], 0
+    if error_type == "unbalanced-brace":
+        return [_sentence(rng), f"The value $x^{{{index + 2}$ is never closed."], 1
+    raise ValueError(f"Unknown error type {error_type!r}, expected one of {ERROR_TYPES}")
+
+
+def generate_document(lines: int, errors_per_type: int = 1, seed: int = 0,
+                      error_types: Tuple[str, ...] = ERROR_TYPES) -> Tuple[str, List[InjectedError]]:
+    """
+    Generates a Markdown document of about `lines` lines with `errors_per_type` errors of every type.
+
+    The document is made of sections, paragraphs, lists and equations separated by blank
+    lines. The errors are put into blocks of their own, at random but reproducible positions.
+
+    Returns:
+        The document and the injected errors, sorted by line.
+    """
+    rng = random.Random(seed)
+    planned = [error_type for error_type in error_types for _ in range(errors_per_type)]
+    rng.shuffle(planned)
+    # Spread the errors over the document: the i-th error goes after the line at its slot
+    slots = sorted(rng.sample(range(1, max(lines, len(planned) + 1)), len(planned)))
+    output: List[str] = []
+    errors: List[InjectedError] = []
+    section = 0
+    while len(output) < lines or planned:
+        if len(output) // SECTION_LINES >= section:
+            section += 1
+            output += [f"# Section {section}", ""]
+        if planned and len(output) >= slots[len(errors)]:
+            error_type = planned.pop()
+            block, offset = _error_block(rng, error_type, len(errors))
+            errors.append(InjectedError(error_type, len(output) + offset + 1))
+        else:
+            block = _filler_block(rng, section)
+        output += block + [""]
+    return "\n".join(output) + "\n", sorted(errors, key=lambda error: error.line)
+
+
+def count_errors(errors: List[InjectedError]) -> Dict[str, int]:
+    """Returns the number of injected errors of every type."""
+    counts = dict.fromkeys(ERROR_TYPES, 0)
+    for error in errors:
+        counts[error.type] += 1
+    return counts
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Benchmarks find_error_ranges on generated documents with known errors.
+
+Every configuration (document size x strategy x search x probe x cache) runs on the same
+generated documents. For every run, the JSON report records the wall time, the time of every
+stage, the compilations the debugger counted, the pandoc invocations and how well the reported
+ranges localize the injected errors. By default pandoc and TeX are simulated in-process
+(`compiler_backend.SimulatedBackend`); `--backend stub` runs the same simulation as a `pandoc`
+executable (stub_pandoc.py), so every conversion pays for a process start as it would with
+pandoc, and `--backend pandoc` runs the pandoc on PATH (and counts its invocations).
+
+Run from the repository root:
+    python -m smart_md_debugger.benchmarks.run_benchmarks --lines 200 1000 --output results.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+try:
+    from ..src import debugger
+    from ..src.ast_cache import AstCache
+    from ..src.compile_cache import CompileCache
+    from ..src.compiler_backend import SimulatedBackend
+    from .corpus import ERROR_TYPES, InjectedError, count_errors, generate_document
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    import debugger
+    from ast_cache import AstCache
+    from compile_cache import CompileCache
+    from compiler_backend import SimulatedBackend
+    from corpus import ERROR_TYPES, InjectedError, count_errors, generate_document
+
+STUB_PANDOC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_pandoc.py")
+# How the compilation and AST caches are used: not at all, empty at the start of the run, or
+# filled by an identical run right before the measured one.
+CACHE_MODES = ("none", "cold", "warm")
+# What compiles the documents: the in-process simulation, the simulation behind a `pandoc`
+# executable, or the real pandoc.
+BACKENDS = ("simulated", "stub", "pandoc")
+
+
+@contextlib.contextmanager
+def pandoc_on_path(real_pandoc: str | None, latency: float):
+    """
+    Puts a `pandoc` that logs every invocation first on PATH: the stub, or a shim in front of
+    `real_pandoc`. Yields the path of the invocation log.
+    """
+    bin_dir = tempfile.mkdtemp(prefix="smd-bench-bin-")
+    log_path = os.path.join(bin_dir, "invocations.log")
+    with open(os.path.join(bin_dir, "pandoc"), "w", encoding="utf-8") as script:
+        script.write(f'#!/bin/sh\nexec "{sys.executable}" "{STUB_PANDOC}" "$@"\n')
+    os.chmod(os.path.join(bin_dir, "pandoc"), 0o755)
+    saved = {name: os.environ.get(name) for name in ("PATH", "SMD_STUB_PANDOC_LOG", "SMD_STUB_PANDOC_LATENCY", "SMD_STUB_PANDOC_REAL")}
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["SMD_STUB_PANDOC_LOG"] = log_path
+    os.environ["SMD_STUB_PANDOC_LATENCY"] = str(latency)
+    if real_pandoc:
+        os.environ["SMD_STUB_PANDOC_REAL"] = real_pandoc
+    debugger.get_pandoc_version.cache_clear()
+    try:
+        yield log_path
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        debugger.get_pandoc_version.cache_clear()
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+
+def count_invocations(log_path: str) -> Dict[str, int]:
+    """Returns the number of pandoc invocations per output format since the log was last reset, and resets it."""
+    counts: Dict[str, int] = {}
+    if os.path.exists(log_path):
+        with open(log_path, encoding="utf-8") as log:
+            for line in log:
+                counts[line.strip()] = counts.get(line.strip(), 0) + 1
+        os.remove(log_path)
+    return counts
+
+
+def take_invocations(log_path: str | None, backend: SimulatedBackend | None) -> Dict[str, int]:
+    """Returns the conversions per output format since the last call, from the simulated backend or the invocation log."""
+    if backend is None:
+        return count_invocations(log_path)
+    counts = dict(backend.invocations)
+    backend.invocations.clear()
+    return counts
+
+
+def localization_accuracy(bad_ranges: List[Tuple[int, int]], errors: List[InjectedError]) -> dict:
+    """
+    Scores the reported ranges against the injected errors.
+
+    An error is found if a reported range covers its line. Precision is the share of reported
+    ranges that cover an error, and the excess lines are the reported lines without an error.
+    """
+    found = [error for error in errors if any(start <= error.line <= end for start, end in bad_ranges)]
+    hit_ranges = [r for r in bad_ranges if any(r[0] <= error.line <= r[1] for error in errors)]
+    error_lines = {error.line for error in errors}
+    reported_lines = sum(end - start + 1 for start, end in bad_ranges)
+    return {
+        "errors": len(errors),
+        "found": len(found),
+        "found_by_type": count_errors(found),
+        "recall": len(found) / len(errors) if errors else 1.0,
+        "reported_ranges": len(bad_ranges),
+        "precision": len(hit_ranges) / len(bad_ranges) if bad_ranges else (1.0 if not errors else 0.0),
+        "excess_lines": reported_lines - len([line for line in error_lines if any(s <= line <= e for s, e in bad_ranges)]),
+    }
+
+
+def run_once(document: str, config: dict, cache_dir: str | None,
+             backend: SimulatedBackend | None = None) -> Tuple[tuple, debugger.DebugStats, float]:
+    stats = debugger.DebugStats()
+    cache = ast_cache = None
+    if cache_dir is not None:
+        cache, ast_cache = CompileCache(cache_dir), AstCache(cache_dir)
+    started = time.perf_counter()
+    try:
+        result = debugger.find_error_ranges(
+            document, workers=config["workers"], cache=cache, search=config["search"], stats=stats,
+            probe=config["probe"], strategy=config["strategy"], ast_cache=ast_cache, backend=backend
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+    return result, stats, time.perf_counter() - started
+
+
+def run_benchmark(document: str, errors: List[InjectedError], config: dict, log_path: str | None,
+                  backend: SimulatedBackend | None = None) -> dict:
+    """Runs one configuration on one document and returns its report entry."""
+    with contextlib.ExitStack() as cleanup:
+        cache_dir = None
+        if config["cache"] != "none":
+            cache_dir = cleanup.enter_context(tempfile.TemporaryDirectory(prefix="smd-bench-cache-"))
+        if config["cache"] == "warm":
+            run_once(document, config, cache_dir, backend)
+        take_invocations(log_path, backend)
+        (good_ranges, bad_ranges, _), stats, wall_seconds = run_once(document, config, cache_dir, backend)
+    invocations = take_invocations(log_path, backend)
+    return {
+        **config,
+        "wall_seconds": round(wall_seconds, 4),
+        "stage_seconds": {stage: round(seconds, 4) for stage, seconds in stats.stage_seconds.items()},
+        "compilations": {
+            "full": stats.full_compilations,
+            "chunks": stats.chunk_compilations,
+            "localization": stats.localization_compilations,
+            "total": stats.total_compilations,
+            "saved_by_bisection": stats.compilations_saved,
+        },
+        "pandoc_invocations": {"total": sum(invocations.values()), "by_format": invocations},
+        "bad_ranges": bad_ranges,
+        "hang_ranges": stats.hang_ranges,
+        "accuracy": localization_accuracy(bad_ranges, errors),
+    }
+
+
+def save_corpus(directory: str, name: str, document: str, errors: List[InjectedError]):
+    """Writes a generated document to <directory>/<name>.md and its errors to <name>.errors.json."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name + ".md"), "w", encoding="utf-8") as f:
+        f.write(document)
+    with open(os.path.join(directory, name + ".errors.json"), "w", encoding="utf-8") as f:
+        json.dump([error._asdict() for error in errors], f, indent=2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark find_error_ranges on generated documents with known errors.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[200, 1000], help="Document sizes in lines (default: 200 1000).")
+    parser.add_argument("--errors", type=int, default=1, help=f"Errors of every type ({', '.join(ERROR_TYPES)}) per document (default: 1).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the document generator (default: 0).")
+    parser.add_argument("--strategies", nargs="+", choices=debugger.STRATEGIES, default=list(debugger.STRATEGIES))
+    parser.add_argument("--searches", nargs="+", choices=debugger.SEARCH_MODES, default=list(debugger.SEARCH_MODES))
+    parser.add_argument("--probes", nargs="+", choices=debugger.PROBE_MODES, default=["pdf"],
+                        help="Probe modes (default: pdf; the others need a TeX engine and --backend pandoc).")
+    parser.add_argument("--caches", nargs="+", choices=CACHE_MODES, default=["none"],
+                        help="Cache modes: 'none' (default), 'cold' (empty caches) or 'warm' (caches filled by an identical run).")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backend", choices=BACKENDS, default="simulated",
+                        help="'simulated' (default) compiles in-process, 'stub' runs the simulation as a pandoc executable, "
+                             "'pandoc' runs the pandoc on PATH.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every simulated PDF compilation takes (default: 0).")
+    parser.add_argument("--output", default=None, metavar="FILE", help="Write the JSON report to FILE instead of stdout.")
+    parser.add_argument("--save-corpus", default=None, metavar="DIR",
+                        help="Also write every generated document to DIR, with its injected errors in a .json file next to it.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend = None
+    if args.backend == "simulated":
+        backend = SimulatedBackend(latency=args.latency)
+        pandoc_context = contextlib.nullcontext()
+    else:
+        real_pandoc = None
+        if args.backend == "pandoc":
+            real_pandoc = shutil.which("pandoc")
+            if real_pandoc is None:
+                print("Error: pandoc command not found. Please ensure pandoc is installed and in your PATH.", file=sys.stderr)
+                return 1
+        pandoc_context = pandoc_on_path(real_pandoc, args.latency)
+    results = []
+    with pandoc_context as log_path:
+        pandoc_version = backend.version() if backend is not None else debugger.get_pandoc_version()
+        for lines in args.lines:
+            document, errors = generate_document(lines, args.errors, args.seed)
+            if args.save_corpus:
+                save_corpus(args.save_corpus, f"bench_{lines}_lines", document, errors)
+            for strategy in args.strategies:
+                for search in args.searches:
+                    for probe in args.probes:
+                        for cache in args.caches:
+                            config = {"lines": lines, "strategy": strategy, "search": search, "probe": probe,
+                                      "cache": cache, "workers": args.workers}
+                            result = run_benchmark(document, errors, config, log_path, backend)
+                            results.append(result)
+                            accuracy = result["accuracy"]
+                            print(f"{lines:>6} lines  {strategy:<12} {search:<6} {probe:<9} {cache:<5} "
+                                  f"{result['wall_seconds']:8.3f}s  {result['compilations']['total']:>5} compilations  "
+                                  f"found {accuracy['found']}/{accuracy['errors']}", file=sys.stderr)
+    report = {
+        "pandoc": pandoc_version,
+        "backend": args.backend,
+        "latency": args.latency if args.backend != "pandoc" else None,
+        "errors_per_type": args.errors,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
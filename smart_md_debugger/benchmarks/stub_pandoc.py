@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the `pandoc` executable, so the benchmarks run offline, without pandoc or TeX.
+
+Reads Markdown from stdin like pandoc and answers the conversions the debugger runs with
+`compiler_backend.SimulatedBackend`:
+
+- `--version`
+- `-f <reader> -t json`: the simulated AST, with `data-pos` attributes for `+sourcepos` readers.
+- `-t latex [--standalone]`: the simulated LaTeX.
+- `-t pdf -o <path>`: fails like pandoc with the simulated TeX error, if there is one. No PDF
+  is written.
+
+Unlike the simulated backend, every conversion costs a process start, as it does with pandoc.
+
+Environment variables:
+    SMD_STUB_PANDOC_LATENCY: Seconds every PDF compilation takes (default 0).
+    SMD_STUB_PANDOC_LOG: File that gets one line per invocation, naming the output format.
+    SMD_STUB_PANDOC_REAL: Path of a real pandoc. The invocation is only logged, then handed to it.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from compiler_backend import SimulatedBackend
+
+
+def parse_args(argv):
+    options = {"from": "markdown", "to": "html", "output": None, "standalone": False, "version": False}
+    args = iter(argv)
+    for arg in args:
+        if arg == "--version":
+            options["version"] = True
+        elif arg in ("-f", "--from"):
+            options["from"] = next(args)
+        elif arg in ("-t", "--to"):
+            options["to"] = next(args)
+        elif arg in ("-o", "--output"):
+            options["output"] = next(args)
+        elif arg in ("-s", "--standalone"):
+            options["standalone"] = True
+    return options
+
+
+def main(argv):
+    options = parse_args(argv)
+    log_path = os.environ.get("SMD_STUB_PANDOC_LOG")
+    if log_path:
+        with open(log_path, "a", encoding="utf-8") as log:
+            log.write(("version" if options["version"] else options["to"]) + "\n")
+    real_pandoc = os.environ.get("SMD_STUB_PANDOC_REAL")
+    if real_pandoc:
+        os.execv(real_pandoc, [real_pandoc, *argv])
+    backend = SimulatedBackend(latency=float(os.environ.get("SMD_STUB_PANDOC_LATENCY", "0")))
+    if options["version"]:
+        print(backend.version())
+        return 0
+    text = sys.stdin.read()
+    if options["to"] == "pdf":
+        process = backend.compile_pdf(text, options["output"] or os.devnull, float("inf"))
+        sys.stderr.write(process.stderr)
+        return process.returncode
+    converted, output = backend.convert(text, options["from"], options["to"], options["standalone"])
+    (sys.stdout if converted else sys.stderr).write(output)
+    return 0 if converted else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,113 @@
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from typing import List
+
+try:
+    from .compile_cache import default_cache_dir
+    from .splitter import BlockPosition
+except ImportError:
+    from compile_cache import default_cache_dir
+    from splitter import BlockPosition
+
+AST_CACHE_DIR_NAME = "ast"
+ENTRY_SUFFIX = ".marshal"
+DEFAULT_MAX_ENTRIES = 500
+# Bump whenever the meaning of a stored block table changes, so old entries are ignored.
+AST_CACHE_VERSION = 1
+
+
+class AstCache:
+    """
+    Persistent cache of the block tables (see `splitter.get_block_table`) of whole documents.
+
+    Entries are keyed by a hash of the document, the pandoc version and the AST reader. Only
+    the block table is stored, a few tuples per block instead of pandoc's multi-megabyte JSON,
+    in `marshal` format, so a warm run skips both the pandoc call and the JSON parse. Every
+    entry is a file of its own; the cache keeps at most `max_entries` of them, evicting the
+    least recently used ones first.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            cache_dir: Directory of the compilation cache; the entries are kept in a subdirectory.
+            max_entries: Number of block tables to keep.
+        """
+        self.cache_dir = os.path.join(cache_dir or default_cache_dir(), AST_CACHE_DIR_NAME)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(markdown_string: str, pandoc_version: str, reader: str) -> str:
+        """Hashes everything that can change a document's block table."""
+        digest = hashlib.sha256()
+        digest.update(f"{AST_CACHE_VERSION}\0{pandoc_version}\0{reader}\0".encode("utf-8"))
+        digest.update(markdown_string.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> List[BlockPosition] | None:
+        """Returns the cached block table for a key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                rows = marshal.load(f)
+            os.utime(path) # Mark the entry as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            print(f"Warning: Ignoring unreadable AST cache entry {path}: {e}", file=sys.stderr)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [BlockPosition(*row) for row in rows]
+
+    def put(self, key: str, block_table: List[BlockPosition]):
+        """Stores a block table, evicting the least recently used entries beyond `max_entries`."""
+        data = marshal.dumps([tuple(block) for block in block_table])
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self._path(key)) # Readers never see a half-written entry
+        except OSError as e:
+            print(f"Warning: Could not write AST cache entry: {e}", file=sys.stderr)
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError: # Evicted by another run
+                    pass
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Removes all cached block tables."""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def __len__(self) -> int:
+        return sum(entry.name.endswith(ENTRY_SUFFIX) for entry in os.scandir(self.cache_dir))
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+
+CACHE_FILE_NAME = "compile_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 20000
+# Only an excerpt of pandoc's stderr is kept; the debugger never shows more than this.
+MAX_ERROR_LENGTH = 4000
+
+
+def default_cache_dir() -> str:
+    """Returns the per-user cache directory ($XDG_CACHE_HOME/smart_md_debugger or ~/.cache/smart_md_debugger)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "smart_md_debugger")
+
+
+class CompileCache:
+    """
+    Persistent, content-addressed cache of chunk compilation results.
+
+    Entries are keyed by a hash of the chunk text, the pandoc version and the pandoc
+    arguments, and store whether the compilation succeeded plus an excerpt of the error.
+    The cache holds at most `max_entries` results; the least recently used ones are
+    evicted first. It is safe to share one instance between the threads of a CompilePool.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.path = os.path.join(self.cache_dir, CACHE_FILE_NAME)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " success INTEGER NOT NULL,"
+            " error TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(markdown_string: str, pandoc_version: str, pandoc_args: List[str]) -> str:
+        """Hashes everything that can change the outcome of a compilation."""
+        digest = hashlib.sha256()
+        digest.update(pandoc_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(json.dumps(pandoc_args).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(markdown_string.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, str] | None:
+        """Returns the cached (success, error) for a key, or None on a miss."""
+        with self._lock:
+            row = self._connection.execute("SELECT success, error FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+        return bool(row[0]), row[1]
+
+    def put(self, key: str, success: bool, error: str):
+        """Stores a compilation result and evicts the least recently used entries beyond the size bound."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, success, error, last_used) VALUES (?, ?, ?, ?)",
+                (key, int(success), error[:MAX_ERROR_LENGTH], time.time())
+            )
+            self._connection.execute(
+                "DELETE FROM results WHERE key IN"
+                " (SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._connection.commit()
+
+    def clear(self):
+        """Removes every cached result."""
+        with self._lock:
+            self._connection.execute("DELETE FROM results")
+            self._connection.commit()
+            self._connection.execute("VACUUM")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,166 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Tuple
+
+CompileResult = Tuple[bool, str]
+# Called with (compilations finished, compilations submitted) whenever a compilation finishes
+ProgressCallback = Callable[[int, int], None]
+# Start of the error of a compilation that was stopped, or never started, because it ran out of time.
+# Such a result says nothing about whether the input compiles.
+TIMEOUT_PREFIX = "Timed out: "
+
+
+def is_timeout(result: CompileResult) -> bool:
+    """True if a compilation result is a timeout rather than a verdict on its input."""
+    return not result[0] and result[1].startswith(TIMEOUT_PREFIX)
+
+
+class CompilePool:
+    """
+    Runs chunk compilations concurrently on a pool of worker threads.
+
+    Each compilation is a pandoc subprocess, so threads are enough to keep every
+    core busy. Every worker thread gets its own temporary output path, which keeps
+    concurrent pandoc runs from writing over each other's PDF. Results are always
+    returned in submission order, so callers can merge them deterministically.
+    With a scratch directory, every worker instead gets its own directory inside it, and
+    its output path is a file in that directory.
+
+    The pool counts the compilations submitted to it and finished by it, and reports
+    every finished compilation to `on_progress`, from the thread that ran it. Once the
+    optional deadline has passed, no further compilations are started; their results are
+    timeouts (see `is_timeout`).
+    """
+
+    def __init__(self, compile_fn: Callable[[str, str], CompileResult], workers: int = 1,
+                 on_progress: ProgressCallback | None = None, deadline: float | None = None,
+                 scratch_dir: str | None = None):
+        """
+        Args:
+            compile_fn: Function with the signature of `compile_markdown_to_pdf`.
+            workers: Number of concurrent compilations. 1 compiles inline, without threads.
+            on_progress: Optional callback receiving (finished, submitted) compilation counts.
+            deadline: Optional `time.monotonic()` time after which no compilation is started.
+            scratch_dir: Optional directory (e.g. a tmpfs such as /dev/shm) for the per-worker directories.
+        """
+        self.compile_fn = compile_fn
+        self.workers = max(1, workers)
+        self.on_progress = on_progress
+        self.deadline = deadline
+        self.scratch_dir = scratch_dir
+        self.submitted = 0
+        self.finished = 0
+        self._executor = None
+        if self.workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="md-probe")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._temp_paths: List[str] = []
+        self._temp_dirs: List[str] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _worker_output_path(self) -> str:
+        """Returns the temporary PDF path owned by the calling worker thread."""
+        path = getattr(self._local, "output_path", None)
+        if path is None:
+            if self.scratch_dir is not None:
+                directory = tempfile.mkdtemp(prefix="smd-worker-", dir=self.scratch_dir)
+                path = os.path.join(directory, "probe.pdf")
+                with self._lock:
+                    self._temp_dirs.append(directory)
+            else:
+                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmpfile:
+                    path = tmpfile.name
+                with self._lock:
+                    self._temp_paths.append(path)
+            self._local.output_path = path
+        return path
+
+    def _count_submitted(self, count: int):
+        with self._lock:
+            self.submitted += count
+
+    def _run(self, markdown_string: str) -> CompileResult:
+        """Compiles a submitted markdown string on the calling thread and reports the progress."""
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            result = (False, TIMEOUT_PREFIX + "the time budget of the session ran out before this compilation started.")
+        else:
+            result = self.compile_fn(markdown_string, self._worker_output_path())
+        with self._lock:
+            self.finished += 1
+            finished, submitted = self.finished, self.submitted
+        if self.on_progress is not None:
+            self.on_progress(finished, submitted)
+        return result
+
+    def compile_one(self, markdown_string: str) -> CompileResult:
+        """Compiles a single markdown string on the calling thread."""
+        self._count_submitted(1)
+        return self._run(markdown_string)
+
+    def compile_all(self, markdown_strings: List[str]) -> List[CompileResult]:
+        """
+        Compiles all markdown strings, concurrently if the pool has several workers.
+
+        Returns:
+            One (success, error) tuple per input string, in the same order as the input.
+        """
+        return list(self.imap(markdown_strings))
+
+    def imap(self, markdown_strings: List[str]) -> Iterator[CompileResult]:
+        """
+        Like `compile_all`, but yields every result as soon as it and all results before it
+        are available. With several workers, all compilations are started right away; a
+        single-worker pool compiles each string when its result is requested.
+        """
+        self._count_submitted(len(markdown_strings))
+        if self._executor is None or len(markdown_strings) <= 1:
+            return map(self._run, markdown_strings)
+        return self._executor.map(self._run, markdown_strings)
+
+    def submit_all(self, markdown_strings: List[str]) -> List[Future]:
+        """
+        Starts compiling all markdown strings in the background, without waiting for them.
+
+        Returns:
+            One future per input string, in the same order as the input. Compilations that
+            have not started yet can still be cancelled. A pool with a single worker has no
+            background threads and returns futures that are already done.
+        """
+        self._count_submitted(len(markdown_strings))
+        if self._executor is None:
+            futures = []
+            for markdown_string in markdown_strings:
+                future = Future()
+                future.set_result(self._run(markdown_string))
+                futures.append(future)
+            return futures
+        return [self._executor.submit(self._run, s) for s in markdown_strings]
+
+    def close(self):
+        """Shuts down the worker threads and removes their temporary output files and directories."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            temp_paths, self._temp_paths = self._temp_paths, []
+            temp_dirs, self._temp_dirs = self._temp_dirs, []
+        for directory in temp_dirs:
+            shutil.rmtree(directory, ignore_errors=True)
+        for path in temp_paths:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    # Non-critical, but good to know if cleanup fails
+                    print(f"Warning: Could not remove temporary file {path}: {e}", file=sys.stderr)
@@ -0,0 +1,294 @@
+import json
+import re
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Pandoc's exit code when the PDF engine reports an error
+PDF_ERROR_EXIT_CODE = 43
+SIMULATED_VERSION = "pandoc (simulated by smart_md_debugger)"
+# Errors the simulated TeX run stops at: a command outside `known_commands`, an environment
+# outside `known_environments`, an \end that does not match its \begin or an environment that
+# is never closed, and a brace group that is never closed (or closed twice).
+SIMULATED_ERRORS = ("undefined-command", "unknown-environment", "unclosed-environment", "unbalanced-brace")
+KNOWN_COMMANDS = frozenset({
+    "alpha", "beta", "gamma", "delta", "epsilon", "lambda", "mu", "pi", "sigma", "theta", "omega",
+    "sum", "prod", "int", "frac", "sqrt", "cdot", "times", "ldots", "cdots", "infty", "leq", "geq",
+    "neq", "approx", "equiv", "pm", "in", "to", "rightarrow", "leftarrow", "Rightarrow", "forall",
+    "exists", "partial", "nabla", "oint", "dots", "quad", "qquad", "lim", "max", "min", "text",
+    "mathbf", "mathrm", "mathbb", "mathcal", "hat", "bar", "vec", "overline", "binom", "Delta",
+    "Gamma", "Theta", "Lambda", "Pi", "Sigma", "Phi", "Psi", "Omega", "zeta", "eta", "iota",
+    "kappa", "nu", "xi", "rho", "tau", "upsilon", "phi", "chi", "psi", "varepsilon", "varphi",
+    "dot", "ddot", "left", "right", "sin", "cos", "tan", "ln", "log", "exp", "textbf", "textit",
+    "emph", "texttt", "underline", "section", "subsection", "subsubsection", "paragraph",
+    "subparagraph", "item", "begin", "end", "label", "ref", "cite", "footnote", "href", "url",
+    "documentclass", "usepackage", "newline", "hline", "hspace", "vspace", "centering", "caption",
+    "includegraphics", "LaTeX", "TeX",
+})
+KNOWN_ENVIRONMENTS = frozenset({
+    "itemize", "enumerate", "description", "equation", "equation*", "align", "align*", "verbatim",
+    "center", "tabular", "table", "figure", "quote", "quotation", "document",
+})
+SIMULATED_PREAMBLE = "\\documentclass{article}\n\\begin{document}\n"
+
+FENCE_RX = re.compile(r"^(`{3,}|~{3,})\s*(\{=latex\})?")
+HEADER_RX = re.compile(r"^(#{1,6})\s+(.*)$")
+CODE_SPAN_RX = re.compile(r"`[^`\n]*`")
+COMMENT_RX = re.compile(r"(?<!\\)%.*$")
+TEX_TOKEN_RX = re.compile(r"\\(begin|end)\{([^}]*)\}|\\([A-Za-z]+)|\\.|[{}]")
+# LaTeX commands of the header levels 1 to 6
+HEADER_COMMANDS = ("section", "subsection", "subsubsection", "paragraph", "subparagraph", "subparagraph")
+
+
+class CompilerBackend:
+    """
+    The conversions the debugger runs pandoc for, behind one interface.
+
+    `compile_markdown_to_pdf`, `convert_markdown_to_latex`, `get_markdown_ast` and
+    `get_markdown_blocks` only handle caching, error messages and parsing; the conversion
+    itself is the backend's. The debugger's own backends run pandoc as a subprocess
+    (`debugger.SubprocessBackend`) or send conversions to a pandoc server where it can
+    (`debugger.ServerBackend`); `SimulatedBackend` needs neither pandoc nor TeX.
+
+    Backends are called from several worker threads at once.
+    """
+
+    def version(self) -> str:
+        """Identifies the converter in cache keys, like the first line of `pandoc --version`."""
+        raise NotImplementedError
+
+    def compile_pdf(self, markdown_string: str, output_pdf_path: str, timeout: float,
+                    env: Dict[str, str] | None = None) -> subprocess.CompletedProcess:
+        """
+        Compiles Markdown to PDF like `pandoc <PANDOC_PDF_ARGS> -o <output_pdf_path>`.
+
+        Returns:
+            The finished run: pandoc's exit code and stderr.
+
+        Raises:
+            subprocess.TimeoutExpired: If the compilation did not finish within `timeout` seconds.
+            FileNotFoundError: If the converter is not installed.
+        """
+        raise NotImplementedError
+
+    def convert(self, markdown_string: str, reader: str, writer: str, standalone: bool = False) -> Tuple[bool, str]:
+        """
+        Converts Markdown like `pandoc -f <reader> -t <writer> [--standalone]`.
+
+        Returns:
+            (True, output) if the conversion succeeded, (False, error message) otherwise.
+        """
+        raise NotImplementedError
+
+    def stream(self, markdown_string: str, reader: str, writer: str, consume: Callable[[str], None]) -> Tuple[bool, str]:
+        """
+        Converts like `convert`, but hands the output to `consume` instead of returning it;
+        backends that can, hand it over piece by piece while it is produced.
+
+        Returns:
+            (True, "") if the conversion succeeded, (False, error message) otherwise.
+        """
+        converted, output = self.convert(markdown_string, reader, writer)
+        if not converted:
+            return False, output
+        consume(output)
+        return True, ""
+
+
+class SimulatedBackend(CompilerBackend):
+    """
+    In-process stand-in for pandoc and TeX, for fast and deterministic tests and benchmarks.
+
+    Markdown is "converted" line by line: raw LaTeX blocks are unwrapped, other code blocks
+    become verbatim environments, headers become sections, and everything else is copied as
+    it is, so every line of the LaTeX body comes from the Markdown line with the same number.
+    A PDF compilation scans that LaTeX for the enabled `errors` and the extra `patterns` and
+    fails with TeX's error message, `l.<N>` line included, at the first one. The AST has a
+    top-level block for every header and every run of lines between blank lines, with
+    `data-pos` source positions when the reader asks for `+sourcepos`.
+
+    No PDF is written. The number of conversions per output format is kept in `invocations`.
+    """
+
+    def __init__(self, errors: Iterable[str] = SIMULATED_ERRORS, patterns: Dict[str, str] | None = None,
+                 hang_patterns: Iterable[str] = (), latency: float = 0.0,
+                 known_commands: Iterable[str] = KNOWN_COMMANDS,
+                 known_environments: Iterable[str] = KNOWN_ENVIRONMENTS):
+        """
+        Args:
+            errors: Which of SIMULATED_ERRORS make a compilation fail.
+            patterns: Extra failures: regular expressions, matched against every LaTeX line,
+                      mapped to the TeX error message a match produces.
+            hang_patterns: Regular expressions that make a compilation time out, like a
+                           runaway argument would. The timeout is raised right away.
+            latency: Seconds every PDF compilation takes. Longer than the compilation's
+                     timeout, it times out after the timeout.
+            known_commands: Commands that are defined, without their backslash.
+            known_environments: Environments that are defined.
+        """
+        self.errors = frozenset(errors)
+        unknown = self.errors.difference(SIMULATED_ERRORS)
+        if unknown:
+            raise ValueError(f"Unknown simulated errors {sorted(unknown)}, expected some of {SIMULATED_ERRORS}")
+        self.patterns = [(re.compile(pattern), message) for pattern, message in (patterns or {}).items()]
+        self.hang_patterns = [re.compile(pattern) for pattern in hang_patterns]
+        self.latency = latency
+        self.known_commands = frozenset(known_commands)
+        self.known_environments = frozenset(known_environments)
+        self.invocations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, writer: str):
+        with self._lock:
+            self.invocations[writer] = self.invocations.get(writer, 0) + 1
+
+    def version(self) -> str:
+        return SIMULATED_VERSION
+
+    def compile_pdf(self, markdown_string: str, output_pdf_path: str, timeout: float,
+                    env: Dict[str, str] | None = None) -> subprocess.CompletedProcess:
+        self._count("pdf")
+        command = ["pandoc", "-t", "pdf", "-o", output_pdf_path]
+        if self.latency > timeout:
+            time.sleep(timeout)
+            raise subprocess.TimeoutExpired(command, timeout)
+        if self.latency:
+            time.sleep(self.latency)
+        body = self.to_latex(markdown_string)
+        if any(pattern.search(body) for pattern in self.hang_patterns):
+            raise subprocess.TimeoutExpired(command, timeout)
+        error = self.find_tex_error(body)
+        if error is None:
+            return subprocess.CompletedProcess(command, 0, "", "")
+        message, line_number, context = error
+        line_number += SIMULATED_PREAMBLE.count("\n")
+        return subprocess.CompletedProcess(command, PDF_ERROR_EXIT_CODE, "",
+                                           f"Error producing PDF.\n{message}\nl.{line_number} {context}\n")
+
+    def convert(self, markdown_string: str, reader: str, writer: str, standalone: bool = False) -> Tuple[bool, str]:
+        self._count(writer)
+        if writer == "json":
+            return True, self.to_json(markdown_string, "+sourcepos" in reader)
+        if writer == "latex":
+            body = self.to_latex(markdown_string)
+            return True, SIMULATED_PREAMBLE + body + "\\end{document}\n" if standalone else body
+        return False, f"Unknown output format {writer}"
+
+    @staticmethod
+    def to_latex(markdown_string: str) -> str:
+        """Returns the LaTeX body of a document, line for line."""
+        output = []
+        fence = None
+        for line in markdown_string.splitlines():
+            match = FENCE_RX.match(line)
+            if fence is not None:
+                if match and line.startswith(fence[0]) and not match.group(2):
+                    output.append("" if fence[1] else "\\end{verbatim}")
+                    fence = None
+                else:
+                    output.append(line)
+            elif match:
+                fence = (match.group(1), bool(match.group(2)))
+                output.append("" if fence[1] else "\\begin{verbatim}")
+            else:
+                header = HEADER_RX.match(line)
+                if header:
+                    line = f"\\{HEADER_COMMANDS[len(header.group(1)) - 1]}{{{header.group(2)}}}"
+                output.append(CODE_SPAN_RX.sub("\\\\texttt{}", line))
+        if fence is not None and not fence[1]:
+            output.append("\\end{verbatim}")
+        return "".join(line + "\n" for line in output)
+
+    def find_tex_error(self, latex_body: str) -> Tuple[str, int, str] | None:
+        """Returns (message, line number in `latex_body`, input up to the error) of the first error, or None."""
+        environments: List[Tuple[str, int]] = []
+        braces: List[int] = []
+        for line_number, line in enumerate(latex_body.splitlines(), start=1):
+            if environments and environments[-1][0] == "verbatim" and line != "\\end{verbatim}":
+                continue
+            for pattern, message in self.patterns:
+                match = pattern.search(line)
+                if match:
+                    return message, line_number, line[:match.end()]
+            line = COMMENT_RX.sub("", line)
+            for match in TEX_TOKEN_RX.finditer(line):
+                context = line[:match.end()]
+                token = match.group(0)
+                if match.group(1) == "begin":
+                    name = match.group(2)
+                    if "unknown-environment" in self.errors and name not in self.known_environments:
+                        return f"! LaTeX Error: Environment {name} undefined.", line_number, context
+                    environments.append((name, line_number))
+                elif match.group(1) == "end":
+                    name = match.group(2)
+                    if not environments:
+                        if "unclosed-environment" in self.errors:
+                            return f"! LaTeX Error: \\begin{{document}} ended by \\end{{{name}}}.", line_number, context
+                        continue
+                    opened, opened_at = environments.pop()
+                    if opened != name and "unclosed-environment" in self.errors:
+                        return (f"! LaTeX Error: \\begin{{{opened}}} on input line {opened_at} ended by \\end{{{name}}}.",
+                                line_number, context)
+                elif match.group(3):
+                    if "undefined-command" in self.errors and match.group(3) not in self.known_commands:
+                        return "! Undefined control sequence.", line_number, context
+                elif token == "{":
+                    braces.append(line_number)
+                elif token == "}":
+                    if braces:
+                        braces.pop()
+                    elif "unbalanced-brace" in self.errors:
+                        return "! Extra }, or forgotten $.", line_number, context
+        if braces and "unbalanced-brace" in self.errors:
+            return "! Missing } inserted.", braces[-1], ""
+        if environments and "unclosed-environment" in self.errors:
+            name, opened_at = environments[-1]
+            return f"! LaTeX Error: \\begin{{{name}}} on input line {opened_at} ended by \\end{{document}}.", opened_at, ""
+        return None
+
+    @staticmethod
+    def to_json(markdown_string: str, with_positions: bool) -> str:
+        """Returns pandoc's JSON AST of the document's top-level blocks."""
+        lines = markdown_string.splitlines()
+        blocks = []
+        for first, last, kind in _split_blocks(lines):
+            position = f"{first}:1-{last}:{len(lines[last - 1]) + 1}"
+            attr = ["", [], [["data-pos", position]] if with_positions else []]
+            if kind == "Header":
+                blocks.append({"t": "Header", "c": [1, attr, [{"t": "Str", "c": lines[first - 1].lstrip("# ")}]]})
+            else:
+                text = "\n".join(lines[first - 1:last])
+                blocks.append({"t": "Div", "c": [attr, [{"t": "Para", "c": [{"t": "Str", "c": text}]}]]})
+        return json.dumps({"pandoc-api-version": [1, 23, 1], "meta": {}, "blocks": blocks}, separators=(",", ":"))
+
+
+def _split_blocks(lines: List[str]) -> List[Tuple[int, int, str]]:
+    """Returns (first line, last line, type) of every header and blank-line separated run of lines; code blocks are kept whole."""
+    blocks = []
+    start = None
+    fence = None
+    for line_number, line in enumerate(lines, start=1):
+        match = FENCE_RX.match(line)
+        if fence is not None:
+            if match and line.startswith(fence):
+                fence = None
+            continue
+        if match:
+            fence = match.group(1)
+            if start is None:
+                start = line_number
+        elif HEADER_RX.match(line):
+            if start is not None:
+                blocks.append((start, line_number - 1, "Para"))
+            blocks.append((line_number, line_number, "Header"))
+            start = None
+        elif not line.strip():
+            if start is not None:
+                blocks.append((start, line_number - 1, "Para"))
+            start = None
+        elif start is None:
+            start = line_number
+    if start is not None:
+        blocks.append((start, len(lines), "Para"))
+    return blocks
@@ -1,131 +1,789 @@
 import subprocess
 import json
+import os
+import signal
+import time
+import re
+import functools
+import contextlib
+import hashlib
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Arguments of the PDF compilation, shared with the compilation cache key. The engine options make
+# sure TeX never stops at an interactive error prompt, which would stall the probe until its timeout.
+PANDOC_PDF_ARGS = ["-f", "markdown", "-t", "pdf",
+                   "--pdf-engine-opt=-interaction=nonstopmode", "--pdf-engine-opt=-halt-on-error"]
+# Seconds a PDF compilation may take before it is killed and counted as a hang.
+DEFAULT_COMPILE_TIMEOUT = 120.0
+# RAM-backed file system on most Linux systems, where probes can keep their scratch files.
+DEFAULT_SCRATCH_DIR = "/dev/shm"
+# Arguments of the stage-one conversion of the two-stage probe.
+PANDOC_LATEX_ARGS = ["-f", "markdown", "-t", "latex"]
+# Pandoc's exit code when the PDF engine (e.g. pdflatex) is not installed.
+PANDOC_PDF_PROGRAM_NOT_FOUND = 47
+# Characters read from pandoc's stdout at a time while its JSON output is scanned for blocks.
+AST_READ_SIZE = 65536
+# Readers for the AST that guides chunking. Pandoc's own markdown reader records no source
+# positions, so chunking with it always falls back to single lines.
+AST_READERS = ("commonmark_x", "markdown")
+
+
+@functools.lru_cache(maxsize=None)
+def get_pandoc_version() -> str:
+    """Returns the first line of `pandoc --version`, or an empty string if pandoc cannot be run."""
+    try:
+        process = subprocess.run(["pandoc", "--version"], text=True, capture_output=True, check=False)
+    except OSError:
+        return ""
+    return process.stdout.splitlines()[0] if process.stdout else ""
 
-def compile_markdown_to_pdf(markdown_string: str, output_pdf_path: str = "temp_output.pdf") -> tuple[bool, str]:
+
+def compile_markdown_to_pdf(markdown_string: str, output_pdf_path: str = "temp_output.pdf",
+                            cache: "CompileCache | None" = None,
+                            timeout: float = DEFAULT_COMPILE_TIMEOUT, scratch: bool = False,
+                            backend: "CompilerBackend | None" = None) -> tuple[bool, str]:
     """
     Compiles a given markdown string to PDF using pandoc.
 
     Args:
         markdown_string: The markdown content as a string.
         output_pdf_path: The path to save the output PDF.
+        cache: Optional compilation cache. A cached result is returned without running pandoc,
+               and fresh results are stored in it.
+        timeout: Seconds after which pandoc and its TeX engine are killed. The result is then
+                 a timeout (see `compile_pool.is_timeout`), which is never cached.
+        scratch: Use the directory of `output_pdf_path` as scratch space: pandoc writes its LaTeX
+                 intermediates there (through TMPDIR) instead of the system's temporary directory,
+                 and the PDF itself is discarded rather than written.
+        backend: Optional CompilerBackend to compile with instead of a pandoc subprocess.
 
     Returns:
         A tuple containing:
             - bool: True if compilation was successful, False otherwise.
             - str: Pandoc's stderr output (empty if successful, error message otherwise).
     """
+    backend = backend or DEFAULT_BACKEND
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(markdown_string, backend.version(), PANDOC_PDF_ARGS)
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+    env = None
+    if scratch:
+        scratch_dir = os.path.dirname(os.path.abspath(output_pdf_path))
+        env = dict(os.environ, TMPDIR=scratch_dir, TMP=scratch_dir, TEMP=scratch_dir)
+        output_pdf_path = os.devnull # Only the exit status matters
     try:
-        process = subprocess.run(
-            ["pandoc", "-f", "markdown", "-t", "pdf", "-o", output_pdf_path],
-            input=markdown_string,
-            text=True,
-            capture_output=True,
-            check=False  # Do not raise exception on non-zero exit
-        )
-        if process.returncode == 0:
-            return True, ""
+        process = backend.compile_pdf(markdown_string, output_pdf_path, timeout, env)
+    except FileNotFoundError:
+        return False, "Pandoc command not found. Please ensure pandoc is installed and in your PATH."
+    except subprocess.TimeoutExpired:
+        return False, f"{TIMEOUT_PREFIX}pandoc did not finish within {timeout:g} seconds (runaway argument or infinite loop?)."
+    except Exception as e:
+        return False, f"An unexpected error occurred during pandoc execution: {str(e)}"
+
+    if process.returncode == 0:
+        result = (True, "")
+    else:
+        result = (False, _condense_pdf_error(process.stderr))
+    # Only results of an actual compilation are cached, never failures to start pandoc or the PDF engine
+    if cache_key is not None and process.returncode != PANDOC_PDF_PROGRAM_NOT_FOUND:
+        cache.put(cache_key, *result)
+    return result
+
+
+def _run_killable(command: list[str], input_text: str, timeout: float,
+                  env: dict | None = None) -> subprocess.CompletedProcess:
+    """
+    Runs a command like `subprocess.run(..., capture_output=True, text=True)` in a new process
+    group. On timeout, the whole group is killed, so a TeX engine that pandoc started does not
+    keep looping after pandoc is gone, and `subprocess.TimeoutExpired` is raised.
+    """
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+        start_new_session=hasattr(os, "killpg"),
+    )
+    try:
+        stdout, stderr = process.communicate(input_text, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
         else:
-            # Attempt to clean up common pandoc error messages
-            error_message = process.stderr
-            if "Error producing PDF" in error_message:
-                # Try to find a more specific LaTeX error if possible
-                # This is a heuristic and might need refinement
-                latex_error_prefix = "! LaTeX Error:"
-                if latex_error_prefix in error_message:
-                    error_lines = error_message.splitlines()
-                    for i, line in enumerate(error_lines):
-                        if line.startswith(latex_error_prefix):
-                            # Return the error line and the next few for context
-                            return False, "\n".join(error_lines[i:i+3])
-            return False, error_message
+            process.kill()
+        process.communicate()
+        raise
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+def _condense_pdf_error(error_message: str) -> str:
+    """Attempt to clean up common pandoc error messages."""
+    if "Error producing PDF" in error_message:
+        # Try to find a more specific LaTeX error if possible
+        # This is a heuristic and might need refinement
+        latex_error_prefix = "! LaTeX Error:"
+        if latex_error_prefix in error_message:
+            error_lines = error_message.splitlines()
+            for i, line in enumerate(error_lines):
+                if line.startswith(latex_error_prefix):
+                    # Return the error line and the next few for context
+                    excerpt = error_lines[i:i+3]
+                    # Keep TeX's "l.<N>" line too, it tells where in the LaTeX the error is
+                    for context_line in error_lines[i+3:]:
+                        if context_line.startswith("! "):
+                            break
+                        if TEX_ERROR_LINE_RX.match(context_line):
+                            excerpt.append(context_line)
+                            break
+                    return "\n".join(excerpt)
+    return error_message
+
+def convert_markdown_to_latex(markdown_string: str, standalone: bool = False,
+                              server: "PandocServer | None" = None,
+                              backend: "CompilerBackend | None" = None) -> tuple[bool, str]:
+    """
+    Converts a markdown string to LaTeX with pandoc, without running a TeX engine.
+
+    Args:
+        markdown_string: The markdown content as a string.
+        standalone: Whether to produce a full document (with the template's preamble) instead of a body.
+        server: Optional pandoc server to convert with. Pandoc runs as a subprocess if it is unavailable.
+        backend: Optional CompilerBackend to convert with; takes the place of `server`.
+
+    Returns:
+        A tuple containing:
+            - bool: True if the conversion was successful, False otherwise.
+            - str: The LaTeX output if successful, pandoc's error message otherwise.
+    """
+    backend = _resolve_backend(backend, server)
+    try:
+        return backend.convert(markdown_string, PANDOC_LATEX_ARGS[1], PANDOC_LATEX_ARGS[3], standalone)
     except FileNotFoundError:
         return False, "Pandoc command not found. Please ensure pandoc is installed and in your PATH."
     except Exception as e:
         return False, f"An unexpected error occurred during pandoc execution: {str(e)}"
 
-def get_markdown_ast(markdown_string: str, use_sourcepos: bool = True) -> tuple[dict | None, str]:
+
+def get_markdown_ast(markdown_string: str, use_sourcepos: bool = True,
+                     reader: str = "commonmark_x", server: "PandocServer | None" = None,
+                     backend: "CompilerBackend | None" = None) -> tuple[dict | None, str]:
     """
     Gets the AST (Abstract Syntax Tree) of the markdown string using pandoc's JSON output.
 
     Args:
         markdown_string: The markdown content as a string.
         use_sourcepos: Whether to include source position information in the AST.
+        reader: One of AST_READERS. Only "commonmark_x" can record source positions: it
+                wraps blocks and inlines in Divs and Spans with a `data-pos` attribute.
+        server: Optional pandoc server to convert with. Pandoc runs as a subprocess if it is unavailable.
+        backend: Optional CompilerBackend to convert with; takes the place of `server`.
 
     Returns:
         A tuple containing:
             - dict | None: The AST as a Python dictionary, or None if an error occurred.
             - str: Pandoc's stderr output or an error message.
     """
+    if reader not in AST_READERS:
+        raise ValueError(f"Unknown AST reader {reader!r}, expected one of {AST_READERS}")
     try:
-        pandoc_command = ["pandoc", "-f", "markdown", "-t", "json"]
-        if use_sourcepos:
-            pandoc_command.append("--sourcepos")
-
-        process = subprocess.run(
-            pandoc_command,
-            input=markdown_string,
-            text=True,
-            capture_output=True,
-            check=False
-        )
-        if process.returncode == 0:
+        if reader == "commonmark_x" and use_sourcepos:
+            reader += "+sourcepos"
+        converted, output = _resolve_backend(backend, server).convert(markdown_string, reader, "json")
+        if converted:
             try:
-                ast = json.loads(process.stdout)
+                ast = json.loads(output)
                 return ast, ""
             except json.JSONDecodeError as e:
                 return None, f"Error decoding pandoc JSON output: {str(e)}"
         else:
-            return None, process.stderr
+            return None, output
     except FileNotFoundError:
         return None, "Pandoc command not found. Please ensure pandoc is installed and in your PATH."
     except Exception as e:
         return None, f"An unexpected error occurred during pandoc AST generation: {str(e)}"
 
-import tempfile
-import os
+
+def get_markdown_blocks(markdown_string: str, reader: str = "commonmark_x",
+                        server: "PandocServer | None" = None,
+                        backend: "CompilerBackend | None" = None) -> tuple[list["BlockPosition"] | None, str]:
+    """
+    Gets the table of top-level blocks (see `splitter.get_block_table`) from pandoc's JSON output.
+
+    Unlike `get_markdown_ast`, the AST is never built: pandoc's stdout is scanned for the
+    blocks while pandoc writes it (see `splitter.BlockTableScanner`), which keeps memory and
+    parse time low on book-length documents.
+
+    Args:
+        markdown_string: The markdown content as a string.
+        reader: One of AST_READERS; "commonmark_x" is read with source positions.
+        server: Optional pandoc server to convert with. Pandoc runs as a subprocess if it is unavailable.
+        backend: Optional CompilerBackend to convert with; takes the place of `server`.
+
+    Returns:
+        A tuple containing:
+            - list | None: The block table, or None if an error occurred.
+            - str: Pandoc's stderr output or an error message.
+    """
+    if reader not in AST_READERS:
+        raise ValueError(f"Unknown AST reader {reader!r}, expected one of {AST_READERS}")
+    if reader == "commonmark_x":
+        reader += "+sourcepos"
+    scanner = BlockTableScanner()
+    try:
+        converted, error = _resolve_backend(backend, server).stream(markdown_string, reader, "json", scanner.feed)
+        if not converted:
+            return None, error
+        return scanner.close(), ""
+    except FileNotFoundError:
+        return None, "Pandoc command not found. Please ensure pandoc is installed and in your PATH."
+    except ValueError as e:
+        return None, f"Error decoding pandoc JSON output: {str(e)}"
+    except Exception as e:
+        return None, f"An unexpected error occurred during pandoc AST generation: {str(e)}"
+
+
+def _stream_pandoc_output(command: list[str], input_text: str, consume: Callable[[str], None]) -> tuple[bool, str]:
+    """
+    Runs pandoc and hands its stdout to `consume` piece by piece, as it is written.
+
+    Returns:
+        (True, "") if pandoc succeeded, (False, pandoc's stderr) otherwise.
+    """
+    # A file for stderr, so pandoc never blocks on a full stderr pipe while we read stdout
+    with tempfile.TemporaryFile(mode="w+", encoding="utf-8") as stderr:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+                                   text=True, encoding="utf-8")
+        # The input is written from another thread, so pandoc's output is read while it arrives
+        writer = threading.Thread(target=_write_and_close, args=(process.stdin, input_text), daemon=True)
+        writer.start()
+        try:
+            for piece in iter(functools.partial(process.stdout.read, AST_READ_SIZE), ""):
+                consume(piece)
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            writer.join()
+            process.wait()
+        if process.returncode != 0:
+            stderr.seek(0)
+            return False, stderr.read()
+    return True, ""
+
+
+def _write_and_close(stream, text: str):
+    """Writes text to a subprocess's stdin and closes it, ignoring a process that stopped reading."""
+    try:
+        stream.write(text)
+    except BrokenPipeError:
+        pass
+    try:
+        stream.close()
+    except BrokenPipeError:
+        pass
+
+
+def get_document_blocks(markdown_string: str, reader: str = "commonmark_x", server: "PandocServer | None" = None,
+                        ast_cache: "AstCache | None" = None,
+                        backend: "CompilerBackend | None" = None) -> tuple[list["BlockPosition"] | None, str]:
+    """
+    Gets the table of top-level blocks (see `splitter.get_block_table`) that the document is split by.
+
+    Args:
+        markdown_string: The markdown content as a string.
+        reader: One of AST_READERS.
+        server: Optional pandoc server to get the AST from.
+        ast_cache: Optional cache of block tables. A cached table is returned without running
+                   pandoc or parsing its JSON, and fresh tables are stored in it.
+        backend: Optional CompilerBackend to get the AST from; takes the place of `server`.
+
+    Returns:
+        A tuple containing:
+            - list | None: The block table, or None if the AST could not be generated.
+            - str: The error message of `get_markdown_blocks` if the AST could not be generated.
+    """
+    backend = _resolve_backend(backend, server)
+    cache_key = None
+    if ast_cache is not None:
+        cache_key = ast_cache.make_key(markdown_string, backend.version(), reader)
+        cached_table = ast_cache.get(cache_key)
+        if cached_table is not None:
+            return cached_table, ""
+    block_table, error = get_markdown_blocks(markdown_string, reader, backend=backend)
+    if block_table is None:
+        return None, error
+    if cache_key is not None:
+        ast_cache.put(cache_key, block_table)
+    return block_table, ""
+
 import sys # Ensure sys is imported for sys.stderr
 
 # To make splitter usable, we need to ensure its import works.
 # This might require adjustments based on how the project is structured or run.
 try:
-    from .splitter import split_markdown_by_ast_blocks, split_markdown_by_lines
+    from .splitter import BlockIndex, BlockPosition, BlockTableScanner, section_starts, split_markdown_by_blocks, split_markdown_by_lines
+    from .compile_pool import TIMEOUT_PREFIX, CompilePool, ProgressCallback, is_timeout
+    from .compile_cache import CompileCache
+    from .ast_cache import AstCache
+    from .tex_engine import DEFAULT_PROBE_TIMEOUT, PersistentTexEngine, build_format, split_latex_preamble, typeset_batch
+    from .run_state import ChunkVerdict, RunState
+    from .source_map import TEX_ERROR_LINE_RX, LatexSourceMap, mark_chunks, parse_tex_error_line
+    from .pandoc_server import PandocServer
+    from .compiler_backend import CompilerBackend
+    from .document import MarkdownDocument
 except ImportError:
     # Fallback for direct execution or if not run as part of a package
-    from splitter import split_markdown_by_ast_blocks, split_markdown_by_lines
+    from splitter import BlockIndex, BlockPosition, BlockTableScanner, section_starts, split_markdown_by_blocks, split_markdown_by_lines
+    from compile_pool import TIMEOUT_PREFIX, CompilePool, ProgressCallback, is_timeout
+    from compile_cache import CompileCache
+    from ast_cache import AstCache
+    from tex_engine import DEFAULT_PROBE_TIMEOUT, PersistentTexEngine, build_format, split_latex_preamble, typeset_batch
+    from run_state import ChunkVerdict, RunState
+    from source_map import TEX_ERROR_LINE_RX, LatexSourceMap, mark_chunks, parse_tex_error_line
+    from pandoc_server import PandocServer
+    from compiler_backend import CompilerBackend
+    from document import MarkdownDocument
+
+
+class SubprocessBackend(CompilerBackend):
+    """The default CompilerBackend: every conversion is a run of the `pandoc` on PATH."""
+
+    def version(self) -> str:
+        return get_pandoc_version()
+
+    def compile_pdf(self, markdown_string: str, output_pdf_path: str, timeout: float,
+                    env: dict | None = None) -> subprocess.CompletedProcess:
+        return _run_killable(["pandoc", *PANDOC_PDF_ARGS, "-o", output_pdf_path], markdown_string, timeout, env)
+
+    def convert(self, markdown_string: str, reader: str, writer: str, standalone: bool = False) -> tuple[bool, str]:
+        pandoc_command = ["pandoc", "-f", reader, "-t", writer]
+        if standalone:
+            pandoc_command.append("--standalone")
+        process = subprocess.run(pandoc_command, input=markdown_string, text=True, capture_output=True, check=False)
+        if process.returncode == 0:
+            return True, process.stdout
+        return False, process.stderr
+
+    def stream(self, markdown_string: str, reader: str, writer: str, consume: Callable[[str], None]) -> tuple[bool, str]:
+        return _stream_pandoc_output(["pandoc", "-f", reader, "-t", writer], markdown_string, consume)
 
 
-def find_error_ranges(markdown_content: str) -> tuple[list[tuple[int, int]], list[tuple[int, int]], str]:
+class ServerBackend(SubprocessBackend):
+    """
+    CompilerBackend that sends the conversions without a PDF to a PandocServer. PDFs, and
+    every conversion once the server is unavailable, are pandoc subprocesses.
+    """
+
+    def __init__(self, server: PandocServer):
+        self.server = server
+
+    def convert(self, markdown_string: str, reader: str, writer: str, standalone: bool = False) -> tuple[bool, str]:
+        result = self.server.convert(markdown_string, reader, writer, standalone)
+        if result is None:
+            return super().convert(markdown_string, reader, writer, standalone)
+        return result
+
+    def stream(self, markdown_string: str, reader: str, writer: str, consume: Callable[[str], None]) -> tuple[bool, str]:
+        result = self.server.convert(markdown_string, reader, writer)
+        if result is None:
+            return super().stream(markdown_string, reader, writer, consume)
+        converted, output = result
+        if not converted:
+            return False, output
+        consume(output)
+        return True, ""
+
+
+DEFAULT_BACKEND = SubprocessBackend()
+
+
+def _resolve_backend(backend: CompilerBackend | None, server: PandocServer | None) -> CompilerBackend:
+    """Returns `backend` if given, otherwise a backend for `server`, or pandoc subprocesses without one."""
+    if backend is not None:
+        return backend
+    return DEFAULT_BACKEND if server is None else ServerBackend(server)
+
+# How failing chunks are narrowed down: "linear" compiles every line of the chunk,
+# "bisect" recursively halves the failing ranges.
+SEARCH_MODES = ("linear", "bisect")
+
+# Which chunks are probed: "flat" probes every AST block, "hierarchical" bisects the
+# header-delimited sections first and only probes blocks inside failing sections.
+STRATEGIES = ("flat", "hierarchical")
+
+
+# How chunks are compiled: "pdf" runs `pandoc -t pdf` per chunk, "two-stage" converts the
+# chunk with `pandoc -t latex` and typesets it in a persistent TeX engine, "format" does the
+# same with engines started from the document's preamble precompiled into a .fmt file. "batch"
+# typesets all chunks in one TeX run first and only probes the chunks that run cannot vouch for.
+PROBE_MODES = ("pdf", "two-stage", "format", "batch")
+
+# Called with (kind, start_line, end_line) as soon as a range's verdict is known. The kind is
+# "good", "bad", or "hang" for ranges whose probe timed out, which neither compile nor fail.
+VerdictCallback = Callable[[str, int, int], None]
+
+
+def _ignore_verdict(kind: str, start_line: int, end_line: int):
+    """The verdict callback of runs nobody listens to."""
+
+
+class TwoStageProbe:
+    """
+    Chunk probe that skips the full `pandoc -t pdf` run.
+
+    Stage one converts the chunk with `pandoc -t latex`, which catches pure Markdown/Pandoc
+    errors without starting TeX. Stage two typesets the LaTeX in a PersistentTexEngine that
+    has already loaded the preamble, so no probe pays for an engine start. Every worker
+    thread of a CompilePool gets its own engine. Instances are called like
+    `compile_markdown_to_pdf`; if the engine cannot be started, probes fall back to it.
+
+    With `precompile`, the preamble is dumped into a format file the first time an engine
+    is needed, and all engines of the session start from that format instead of loading
+    the preamble themselves. If the format cannot be built, engines load the preamble.
+
+    With a `scratch_dir`, the engines and the format work inside it, and engines that have a
+    draft mode write no PDF. With a `pandoc_server`, stage one is a request to the server
+    instead of a pandoc subprocess; with a `backend`, stage one and the fallback compilations
+    are the backend's.
+    """
+
+    def __init__(self, preamble: str, engine: str = "pdflatex", cache: CompileCache | None = None,
+                 precompile: bool = False, probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+                 scratch_dir: str | None = None, pandoc_server: PandocServer | None = None,
+                 backend: CompilerBackend | None = None):
+        self.preamble = preamble
+        self.engine = engine
+        self.cache = cache
+        self.precompile = precompile
+        self.probe_timeout = probe_timeout
+        self.scratch_dir = scratch_dir
+        self.pandoc_server = pandoc_server
+        self.backend = _resolve_backend(backend, pandoc_server)
+        self.engine_error = ""
+        self.format_error = ""
+        self._format_path = None
+        self._format_dir = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._format_lock = threading.Lock()
+        self._engines: list[PersistentTexEngine] = []
+        digest = hashlib.sha256(preamble.encode("utf-8")).hexdigest()
+        # Everything besides the chunk text that decides a probe's outcome, for the cache key
+        self._cache_args = [*PANDOC_LATEX_ARGS, "two-stage", engine, digest]
+
+    def __call__(self, markdown_string: str, output_pdf_path: str = "temp_output.pdf") -> tuple[bool, str]:
+        if self.engine_error:
+            return compile_markdown_to_pdf(markdown_string, output_pdf_path, cache=self.cache, backend=self.backend)
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(markdown_string, self.backend.version(), self._cache_args)
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        converted, latex_or_error = convert_markdown_to_latex(markdown_string, backend=self.backend)
+        if not converted:
+            result = (False, latex_or_error)
+        else:
+            engine = self._worker_engine()
+            if engine is None:
+                return compile_markdown_to_pdf(markdown_string, output_pdf_path, cache=self.cache, backend=self.backend)
+            result = engine.probe(latex_or_error)
+        if cache_key is not None and not is_timeout(result):
+            self.cache.put(cache_key, *result)
+        return result
+
+    def _worker_engine(self) -> PersistentTexEngine | None:
+        """Returns the calling thread's engine, starting it on first use."""
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = PersistentTexEngine(self.preamble, self.engine, self.probe_timeout, self._shared_format(),
+                                         self.scratch_dir)
+            started, error = engine.start()
+            if not started:
+                with self._lock:
+                    if not self.engine_error:
+                        self.engine_error = error
+                        print(f"Warning: Persistent TeX engine unavailable, probing with full PDF compilations. {error}", file=sys.stderr)
+                return None
+            self._local.engine = engine
+            with self._lock:
+                self._engines.append(engine)
+        return engine
+
+    def typeset_batch(self, latex_bodies: list[str]) -> list[tuple[bool, str] | None]:
+        """Typesets LaTeX chunk bodies in a single engine run with this probe's preamble (see `tex_engine.typeset_batch`)."""
+        return typeset_batch(self.preamble, latex_bodies, self.engine, format_path=self._shared_format(),
+                             scratch_dir=self.scratch_dir)
+
+    def _shared_format(self) -> str | None:
+        """Returns the session's precompiled format, building it on first use."""
+        if not self.precompile:
+            return None
+        with self._format_lock: # Other workers wait for the one building the format
+            if self._format_dir is None:
+                self._format_dir = tempfile.mkdtemp(prefix="smd-fmt-", dir=self.scratch_dir)
+                built, path_or_error = build_format(self.preamble, self._format_dir, self.engine)
+                if built:
+                    self._format_path = path_or_error
+                else:
+                    self.format_error = path_or_error
+                    print(f"Warning: Could not precompile the preamble, engines will load it instead. {path_or_error}", file=sys.stderr)
+            return self._format_path
+
+    def close(self):
+        """Stops all engines started by this probe and removes the precompiled format."""
+        with self._lock:
+            engines, self._engines = self._engines, []
+        for engine in engines:
+            engine.close()
+        with self._format_lock:
+            if self._format_dir is not None:
+                shutil.rmtree(self._format_dir, ignore_errors=True)
+                self._format_dir = None
+                self._format_path = None
+
+
+def make_two_stage_probe(markdown_content: str, engine: str = "pdflatex", cache: CompileCache | None = None,
+                         precompile: bool = False, probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+                         scratch_dir: str | None = None,
+                         pandoc_server: PandocServer | None = None,
+                         backend: CompilerBackend | None = None) -> TwoStageProbe | None:
+    """
+    Builds a TwoStageProbe whose preamble is the standalone LaTeX preamble of the whole
+    document: the pandoc template filled in from the YAML header, plus every package the
+    content needs (tables, highlighting, ...). Chunks are thus typeset in the document's
+    real context. Returns None if the preamble cannot be generated.
+    """
+    converted, standalone_latex = convert_markdown_to_latex(markdown_content, standalone=True, server=pandoc_server,
+                                                            backend=backend)
+    preamble = split_latex_preamble(standalone_latex) if converted else None
+    if preamble is None:
+        return None
+    return TwoStageProbe(preamble, engine, cache, precompile, probe_timeout, scratch_dir, pandoc_server, backend)
+
+
+# Stages of a find_error_ranges run that DebugStats times
+STAGES = ("full_compile", "ast", "chunk_probes", "localization")
+
+
+class DebugStats:
+    """Counts the compilations performed by one find_error_ranges run."""
+
+    def __init__(self):
+        self.full_compilations = 0
+        self.chunk_compilations = 0
+        # Compilations spent localizing errors inside failing chunks
+        self.localization_compilations = 0
+        # What the line-by-line search would have spent on the same failing chunks
+        self.linear_localization_compilations = 0
+        # Chunks whose verdict was carried forward from the previous run instead of compiled
+        self.carried_chunks = 0
+        # The chunk the TeX error line pointed at in a guided run, and whether it failed
+        self.guided_chunk = None
+        self.guided_hit = False
+        # Ranges whose probes timed out, either hanging or after the time budget ran out
+        self.hang_ranges = []
+        # Chunks whose verdict came from the batched TeX run of the "batch" probe alone
+        self.batched_chunks = 0
+        # Wall time of every stage of the run, in seconds. The whole document is compiled while
+        # the AST is extracted, and chunk probes include merging their verdicts as they arrive.
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+
+    @contextlib.contextmanager
+    def stage_timer(self, stage: str):
+        """Adds the wall time of the `with` block to `stage_seconds[stage]`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - started
+
+    @property
+    def total_compilations(self) -> int:
+        return self.full_compilations + self.chunk_compilations + self.localization_compilations
+
+    @property
+    def compilations_saved(self) -> int:
+        return self.linear_localization_compilations - self.localization_compilations
+
+
+def find_error_ranges(markdown_content: str, workers: int = 1,
+                      cache: CompileCache | None = None, search: str = "linear",
+                      stats: DebugStats | None = None, probe: str = "pdf",
+                      tex_engine: str = "pdflatex",
+                      state: RunState | None = None,
+                      speculative: bool = False,
+                      guided: bool = False,
+                      reader: str = "commonmark_x",
+                      strategy: str = "flat",
+                      on_verdict: VerdictCallback | None = None,
+                      on_progress: ProgressCallback | None = None,
+                      probe_timeout: float | None = None,
+                      time_budget: float | None = None,
+                      scratch_dir: str | None = None,
+                      pandoc_server: PandocServer | None = None,
+                      ast_cache: AstCache | None = None,
+                      backend: CompilerBackend | None = None) -> tuple[list[tuple[int, int]], list[tuple[int, int]], str]:
     """
     Identifies line ranges in the markdown content that cause compilation errors.
 
     Args:
         markdown_content: The full markdown string.
+        workers: Number of chunk compilations to run concurrently.
+        cache: Optional compilation cache, so unchanged chunks are not compiled again across runs.
+        search: How failing chunks are narrowed down, one of SEARCH_MODES. Defaults to "linear",
+                the original behavior; note that the CLI's `--search` defaults to "bisect".
+        stats: Optional DebugStats that receives the number of compilations performed.
+        probe: How chunks are compiled, one of PROBE_MODES. The whole document is always compiled to PDF.
+               "batch" probes like "two-stage", but all chunks are typeset together once first; the
+               hierarchical strategy does not batch.
+        tex_engine: TeX engine used by the "two-stage" and "format" probes.
+        state: Optional verdicts of the previous run on this document. Chunks that did not change
+               since then are not compiled again, and the state is updated with this run.
+        speculative: Start probing chunks as soon as the AST is available, while the whole document
+                     is still being compiled. Saves time on failing documents at the cost of wasted
+                     compilations on documents that compile. Needs the "pdf" probe and several workers.
+        guided: Map the `l.<N>` line of the whole document's TeX error back to a chunk and probe that
+                chunk first. If it fails, only its errors are localized and returned, and no other
+                chunk is compiled; otherwise all chunks are searched as usual, and the guessed chunk
+                keeps its result (the hierarchical strategy uses it wherever it would probe that
+                chunk on its own).
+        reader: Pandoc reader for the AST that the document is split by, one of AST_READERS.
+        strategy: Which chunks are probed, one of STRATEGIES. "hierarchical" does not reuse the
+                  verdicts of `state` and does not speculate.
+        on_verdict: Optional callback receiving ("good", "bad" or "hang", start_line, end_line) for
+                    every range as soon as the probes have settled it, on the calling thread. The ranges
+                    are not consolidated yet; the returned lists are the final verdict.
+        on_progress: Optional callback receiving the number of finished and submitted compilations
+                     whenever a compilation finishes, on the thread that ran it. More compilations
+                     are submitted while failing ranges are narrowed down.
+        probe_timeout: Seconds a single compilation may take before it is killed. Defaults to
+                       DEFAULT_COMPILE_TIMEOUT for PDF compilations and to the TeX engine's own
+                       timeout for the two-stage and format probes.
+        time_budget: Optional seconds for the whole run. Once they are spent, no further compilation
+                     is started, and the ranges left unprobed count as hangs.
+        scratch_dir: Optional directory, ideally a RAM disk such as DEFAULT_SCRATCH_DIR, where every
+                     worker keeps its intermediate files in a directory of its own. Probes in this
+                     mode write no PDF: `pandoc -t pdf` writes it to the null device, and persistent
+                     engines run in draft mode where they have one.
+        pandoc_server: Optional pandoc server for the conversions that produce no PDF: the AST, the
+                       LaTeX of the two-stage probes and the marked document of guided and batch
+                       runs. PDF compilations always run pandoc as a subprocess. The caller owns
+                       the server and closes it.
+        ast_cache: Optional cache of the document's block table, so an unchanged document is
+                   split without running pandoc for its AST (see `get_document_blocks`).
+        backend: Optional CompilerBackend for every conversion and compilation instead of pandoc,
+                 e.g. a `compiler_backend.SimulatedBackend` in tests and benchmarks. Takes the
+                 place of `pandoc_server`.
 
     Returns:
         A tuple containing:
             - good_ranges: List of (start_line, end_line) tuples that compile.
             - bad_ranges: List of (start_line, end_line) tuples that fail to compile.
             - initial_error: The error message from the first failed compilation of the whole document.
+        Ranges whose probes timed out are in neither list; they are collected in `stats.hang_ranges`.
     """
-    lines = markdown_content.splitlines(keepends=True)
-    total_lines = len(lines)
+    if search not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {search!r}, expected one of {SEARCH_MODES}")
+    if probe not in PROBE_MODES:
+        raise ValueError(f"Unknown probe mode {probe!r}, expected one of {PROBE_MODES}")
+    if reader not in AST_READERS:
+        raise ValueError(f"Unknown AST reader {reader!r}, expected one of {AST_READERS}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+    if stats is None:
+        stats = DebugStats()
+    report = on_verdict or _ignore_verdict
+    backend = _resolve_backend(backend, pandoc_server)
+
+    # Indexes the lines once; chunks and probe ranges are slices of it
+    document = MarkdownDocument(markdown_content)
+    total_lines = len(document)
     if total_lines == 0:
         return [], [], "No content to process."
 
-    # Use a temporary file for pandoc outputs
-    temp_pdf_file = None
-    try:
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmpfile:
-            temp_pdf_file = tmpfile.name
-
-        # 1. Try to compile the whole document first
-        full_compile_success, full_compile_error = compile_markdown_to_pdf(markdown_content, temp_pdf_file)
+    run_config = None
+    if state is not None:
+        run_config = _run_config(document, search, probe, tex_engine, reader, backend.version())
+        if state.matches(run_config) and state.markdown == markdown_content and state.complete:
+            # Nothing changed since the previous run
+            good_ranges, bad_ranges, _ = state.result
+            _report_ranges(report, good_ranges, bad_ranges)
+            return state.result
+
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    pdf_timeout = DEFAULT_COMPILE_TIMEOUT if probe_timeout is None else probe_timeout
+    with contextlib.ExitStack() as cleanup:
+        # The pool gives every worker its own temporary output path and cleans them up on exit
+        pool = cleanup.enter_context(CompilePool(
+            functools.partial(compile_markdown_to_pdf, cache=cache, timeout=pdf_timeout, scratch=scratch_dir is not None,
+                              backend=backend),
+            workers, on_progress, deadline, scratch_dir
+        ))
+        # 1. Try to compile the whole document. The AST is extracted at the same time: both are
+        # independent pandoc runs, and a failing document needs the AST right afterwards.
+        background = cleanup.enter_context(ThreadPoolExecutor(max_workers=1, thread_name_prefix="md-full"))
+
+        def compile_whole_document():
+            with stats.stage_timer("full_compile"):
+                return pool.compile_one(markdown_content)
+
+        full_compile = background.submit(compile_whole_document)
+        stats.full_compilations += 1
+        with stats.stage_timer("ast"):
+            block_table, ast_error = get_document_blocks(markdown_content, reader, ast_cache=ast_cache, backend=backend)
+
+        chunks = carried = speculative_results = None
+        if speculative and block_table is not None and probe == "pdf" and pool.workers > 1 and not guided and strategy == "flat":
+            # Most documents under the debugger fail, so start probing chunks right away
+            chunks = _split_into_chunks(document, block_table)
+            carried = _carried_verdicts(state, run_config, markdown_content)
+            speculative_results = pool.submit_all([
+                chunk_content for chunk_content, chunk_range in chunks if chunk_range not in carried
+            ])
+
+        full_compile_success, full_compile_error = full_compile.result()
         if full_compile_success:
+            if speculative_results:
+                # Probes that already started still ran; the others are dropped
+                stats.chunk_compilations += sum(not future.cancel() for future in speculative_results)
+            if state is not None:
+                state.save(markdown_content, run_config, [], ([(1, total_lines)], [], ""))
+            report("good", 1, total_lines)
             return [(1, total_lines)], [], "" # Whole document is good
 
-        # 2. Get AST to guide splitting
-        ast, ast_error = get_markdown_ast(markdown_content)
-        if not ast:
+        two_stage_probe = None
+        if probe in ("two-stage", "format", "batch"):
+            two_stage_probe = make_two_stage_probe(
+                markdown_content, tex_engine, cache, precompile=probe == "format",
+                probe_timeout=DEFAULT_PROBE_TIMEOUT if probe_timeout is None else probe_timeout,
+                scratch_dir=scratch_dir, backend=backend
+            )
+            if two_stage_probe is None:
+                print("Warning: Could not generate the document's LaTeX preamble, probing with full PDF compilations.", file=sys.stderr)
+            else:
+                # The whole document was compiled to PDF above; chunks go through the two-stage probe
+                pool.compile_fn = two_stage_probe
+                cleanup.callback(two_stage_probe.close)
+
+        # 2. Use the AST to guide splitting
+        if block_table is None:
             # If AST parsing fails, we can't use AST-based splitting.
             # For now, we'll report this and could fall back to line-based, but that's less ideal.
             # A robust tool might try to recover or use simpler splitting.
@@ -136,153 +794,538 @@ def find_error_ranges(markdown_content: str) -> tuple[list[tuple[int, int]], lis
             match = re.search(r"line (\d+), column \d+", ast_error)
             if match:
                 line_num = int(match.group(1))
+                report("bad", line_num, line_num)
                 return [], [(line_num, line_num)], error_message # Pinpoint the AST error line
+            report("bad", 1, total_lines)
             return [], [(1, total_lines)], error_message # Cannot pinpoint further
 
         # 3. Use AST blocks for initial splitting
-        # Ensure splitter functions are available
-        chunks = split_markdown_by_ast_blocks(markdown_content, ast)
-
-        if not chunks:
-            # Fallback to line-based splitting if AST splitting yields no chunks
-            # This might happen if get_block_source_positions doesn't find suitable blocks
-            # or if the markdown is very simple (e.g., one line).
-            # Fallback to line-by-line splitting if AST splitting yields no chunks.
-            # Ensure sys is imported at the top of the file if this print statement is to be used.
-            # For now, assuming sys is available or error reporting might be simplified if it's not critical path.
-            # Let's assume sys is imported at the top for stderr.
-            print("Warning: AST-based splitting did not yield any usable chunks. Falling back to line-by-line splitting.", file=sys.stderr)
-            # Using a small chunk size for line-based splitting, e.g., 1 line at a time.
-            # This is less ideal than AST but better than giving up.
-            chunks = split_markdown_by_lines(markdown_content, 1) # 1 line per chunk
-            if not chunks: # Should not happen if markdown_content is not empty
-                 print("Error: Line-based splitting also yielded no chunks. Cannot proceed.", file=sys.stderr)
-                 return [], [(1, total_lines)], full_compile_error
-
+        if chunks is None:
+            chunks = _split_into_chunks(document, block_table)
+        if not chunks: # Should not happen if markdown_content is not empty
+             print("Error: Line-based splitting also yielded no chunks. Cannot proceed.", file=sys.stderr)
+             return [], [(1, total_lines)], full_compile_error
 
         good_ranges = []
         bad_ranges = []
+        hang_ranges = stats.hang_ranges
         processed_lines = [False] * (total_lines + 1) # 1-indexed
 
-        # Try to compile each identified AST chunk
-        for chunk_content, (start_line, end_line) in chunks:
+        # Chunks that are unchanged since the previous run keep their verdict
+        if carried is None:
+            carried = _carried_verdicts(state, run_config, markdown_content) if strategy == "flat" else {}
+
+        # Probe the chunk TeX's error line points at first; if it fails, it holds the reported error
+        guessed_results = {}
+        guess = _guess_failing_chunk(document, chunks, full_compile_error, backend) if guided else None
+        if guess is not None and guess[1] not in carried:
+            chunk_content, (start_line, end_line) = guess
+            stats.guided_chunk = (start_line, end_line)
+            with stats.stage_timer("chunk_probes"):
+                guessed_results[(start_line, end_line)] = pool.compile_one(chunk_content)
+            stats.chunk_compilations += 1
+            guessed_result = guessed_results[(start_line, end_line)]
+            if not guessed_result[0] and not is_timeout(guessed_result):
+                stats.guided_hit = True
+                if (end_line - start_line + 1) <= 3:
+                    bad_ranges.append((start_line, end_line))
+                    report("bad", start_line, end_line)
+                else:
+                    stats.linear_localization_compilations += end_line - start_line + 1
+                    with stats.stage_timer("localization"):
+                        stats.localization_compilations += _localize_failing_chunks(
+                            pool, [(start_line, chunk_content)], search, good_ranges, bad_ranges, hang_ranges, report
+                        )
+                hang_ranges[:] = _consolidate_ranges(hang_ranges)
+                good_ranges, bad_ranges = _consolidate_ranges(sorted(good_ranges)), _consolidate_ranges(sorted(bad_ranges))
+                if state is not None:
+                    # Only the guessed chunk was probed: keep its verdict and the carried ones for the
+                    # next run, but mark the run incomplete so an unchanged document is searched again
+                    chunk_verdicts = list(carried.values())
+                    if not hang_ranges:
+                        chunk_verdicts.append(ChunkVerdict(
+                            start_line, end_line,
+                            _ranges_within(BlockIndex(good_ranges), start_line, end_line),
+                            _ranges_within(BlockIndex(bad_ranges), start_line, end_line)
+                        ))
+                    state.save(markdown_content, run_config, chunk_verdicts, (good_ranges, bad_ranges, full_compile_error),
+                               complete=False)
+                return good_ranges, bad_ranges, full_compile_error
+
+        probe_chunks = [
+            (chunk_content, chunk_range) for chunk_content, chunk_range in chunks
+            if chunk_range not in carried and chunk_range not in guessed_results
+        ]
+        to_probe = [chunk_content for chunk_content, _ in probe_chunks]
+        stats.carried_chunks += len(chunks) - len(to_probe) - len(guessed_results)
+
+        chunk_probes_started = time.perf_counter()
+        if strategy == "hierarchical":
+            # Blocks outside the failing sections, or in passing halves of them, are good without a probe of their own
+            failing_blocks, hanging_blocks, compilations = _find_failing_blocks(
+                pool, document, chunks, section_starts(block_table), settled=guessed_results
+            )
+            stats.chunk_compilations += compilations
+            chunk_results = [
+                hanging_blocks.get(chunk_range) or (chunk_range not in failing_blocks, "") for _, chunk_range in chunks
+            ]
+        else:
+            # Compile every other AST chunk concurrently. The results come back in chunk
+            # order, so merging them below is deterministic regardless of the worker count.
+            # They are merged as they arrive, so verdicts are reported while later chunks compile.
+            batch_results = None
+            if probe == "batch" and two_stage_probe is not None and to_probe:
+                batch_results = _batch_probe_chunks(pool, two_stage_probe, document, chunks, probe_chunks, stats)
+            if batch_results is not None:
+                probe_results = iter(batch_results)
+            elif speculative_results is not None:
+                probe_results = (future.result() for future in speculative_results)
+                stats.chunk_compilations += len(to_probe)
+            else:
+                probe_results = pool.imap(to_probe)
+                stats.chunk_compilations += len(to_probe)
+            chunk_results = (
+                None if chunk_range in carried else guessed_results.get(chunk_range) or next(probe_results)
+                for _, chunk_range in chunks
+            )
+
+        # Failing chunks that are large enough to be broken down further
+        failing_chunks = []
+        for (chunk_content, (start_line, end_line)), chunk_result in zip(chunks, chunk_results):
             if all(processed_lines[start_line : end_line+1]): # Already covered by a larger good chunk
                 continue
 
-            # Prepend necessary headers/metadata if the chunk is LaTeX, etc.
-            # For generic markdown-to-pdf, often not needed unless there are document-level settings.
-            # For now, assume chunks are relatively self-contained or pandoc handles fragments.
-            # A more advanced version might need to add `--- \n ... \n ---` or LaTeX preamble.
-
-            # If a chunk is very small (e.g., one line of text), compiling it alone might fail
-            # if it relies on context (e.g., inside a list). Pandoc is sometimes robust.
-            # The goal is to find *minimal* compilable pieces.
-            # And *minimal* non-compilable pieces.
-
-            success, error = compile_markdown_to_pdf(chunk_content, temp_pdf_file)
-            # No need to rm temp_pdf_file here, it's handled in the finally block for the whole function call
-
-            if success:
+            if chunk_result is None:
+                verdict = carried[(start_line, end_line)]
+                good_ranges.extend(verdict.good_ranges)
+                bad_ranges.extend(verdict.bad_ranges)
+                _report_ranges(report, verdict.good_ranges, verdict.bad_ranges)
+                for good_start, good_end in verdict.good_ranges:
+                    for i in range(good_start, good_end + 1):
+                        processed_lines[i] = True
+            elif chunk_result[0]:
                 good_ranges.append((start_line, end_line))
+                report("good", start_line, end_line)
                 for i in range(start_line, end_line + 1):
                     processed_lines[i] = True
+            elif is_timeout(chunk_result):
+                # Narrowing down a hanging chunk would cost a timeout per round; report it as it is
+                hang_ranges.append((start_line, end_line))
+                report("hang", start_line, end_line)
+            # If the chunk is small enough (e.g. 1-3 lines), don't break down further.
+            elif (end_line - start_line + 1) <= 3 : # Arbitrary threshold
+                bad_ranges.append((start_line, end_line))
+                report("bad", start_line, end_line)
             else:
-                # This chunk is bad. We could try to recursively break it down.
-                # For now, mark it as a bad range.
-                # The problem states: "You may consider trying to intelligently break
-                # non-compilable line ranges into even smaller sub-ranges"
-
-                # If the chunk is small enough (e.g. 1-3 lines), don't break down further.
-                if (end_line - start_line + 1) <= 3 : # Arbitrary threshold
-                     bad_ranges.append((start_line, end_line))
+                # Try to split this failing chunk further, either line by line or by bisection.
+                # A more advanced step would re-run AST analysis on the chunk content,
+                # but that might be complex if the chunk is not valid standalone MD.
+                failing_chunks.append((start_line, chunk_content))
+                stats.linear_localization_compilations += end_line - start_line + 1
+
+        stats.stage_seconds["chunk_probes"] += time.perf_counter() - chunk_probes_started
+
+        with stats.stage_timer("localization"):
+            stats.localization_compilations += _localize_failing_chunks(pool, failing_chunks, search, good_ranges, bad_ranges, hang_ranges, report)
+
+        good_index = BlockIndex(_consolidate_ranges(sorted(good_ranges)))
+        bad_index = BlockIndex(_consolidate_ranges(sorted(bad_ranges)))
+        hang_ranges[:] = _consolidate_ranges(hang_ranges)
+        hang_index = BlockIndex(hang_ranges)
+        # A chunk that timed out is probed again on the next run, which may have more time
+        chunk_verdicts = [
+            ChunkVerdict(start_line, end_line,
+                         _ranges_within(good_index, start_line, end_line),
+                         _ranges_within(bad_index, start_line, end_line))
+            for _, (start_line, end_line) in chunks
+            if not hang_index.overlapping(start_line, end_line)
+        ]
+
+    # Consolidate overlapping/adjacent ranges
+    good_ranges = _consolidate_ranges(sorted(good_ranges))
+    bad_ranges = _consolidate_ranges(sorted(bad_ranges))
+
+    # Identify lines not covered by any "good" AST-based chunk as potentially problematic
+    # This is a simpler way than complex recursion for now.
+    # The initial `bad_ranges` from direct AST chunk failures are a starting point.
+    # We need to find all lines that are NOT in good_ranges.
+
+    final_bad_ranges = []
+    # Lines whose probes timed out are not known to be bad
+    settled_ranges = _consolidate_ranges(good_ranges + hang_ranges)
+    # If there are good_ranges, infer bad_ranges from the gaps
+    if settled_ranges:
+        # Infer bad ranges from gaps in good_ranges
+        # This assumes that if a line isn't in a good_range, it's part of a bad_range.
+        # This is a strong assumption if AST splitting was coarse.
+        # The `bad_ranges` collected from direct failures of chunks is more precise.
+        # Let's combine them.
+
+        current_line = 1
+        inferred_bad_ranges = []
+        for start_good, end_good in settled_ranges:
+            if current_line < start_good:
+                inferred_bad_ranges.append((current_line, start_good - 1))
+            current_line = end_good + 1
+        if current_line <= total_lines:
+            inferred_bad_ranges.append((current_line, total_lines))
+
+        # Combine inferred bad ranges with directly identified bad ranges
+        combined_bad_ranges = _consolidate_ranges(sorted(bad_ranges + inferred_bad_ranges))
+        final_bad_ranges = combined_bad_ranges
+    else: # No good ranges, means the whole document is essentially bad, or AST splitting was ineffective
+        final_bad_ranges = [(1, total_lines)] if not bad_ranges else _consolidate_ranges(sorted(bad_ranges))
+
+    if state is not None:
+        state.save(markdown_content, run_config, chunk_verdicts, (good_ranges, final_bad_ranges, full_compile_error),
+                   complete=not hang_ranges)
+    return good_ranges, final_bad_ranges, full_compile_error
+
+
+def _split_into_chunks(markdown_content: str | MarkdownDocument, block_table: list[BlockPosition]) -> list[tuple[str, tuple[int, int]]]:
+    """Splits the document at its AST blocks, falling back to one chunk per line."""
+    chunks = split_markdown_by_blocks(markdown_content, block_table)
+    if not chunks:
+        # Fallback to line-based splitting if AST splitting yields no chunks.
+        # This might happen if get_block_source_positions doesn't find suitable blocks
+        # or if the markdown is very simple (e.g., one line).
+        print("Warning: AST-based splitting did not yield any usable chunks. Falling back to line-by-line splitting.", file=sys.stderr)
+        # Using a small chunk size for line-based splitting, e.g., 1 line at a time.
+        # This is less ideal than AST but better than giving up.
+        chunks = split_markdown_by_lines(markdown_content, 1) # 1 line per chunk
+    return chunks
+
+
+def _batch_probe_chunks(pool: CompilePool, two_stage_probe: TwoStageProbe, markdown_content: str | MarkdownDocument,
+                        chunks: list[tuple[str, tuple[int, int]]], probe_chunks: list[tuple[str, tuple[int, int]]],
+                        stats: DebugStats) -> list[tuple[bool, str]] | None:
+    """
+    Probes chunks with a single TeX run (see `tex_engine.typeset_batch`) instead of one probe each.
+
+    The LaTeX of every chunk comes from one `pandoc -t latex` run on the document with a marker
+    before every chunk. The verdicts of the run that cannot have been affected by an earlier
+    chunk's error -- every chunk that passes, and the first one that fails -- are kept. Later
+    failures, and chunks the run did not finish, are confirmed with probes of their own.
+
+    Returns:
+        One result per chunk of `probe_chunks`, or None if the document cannot be converted to
+        LaTeX, in which case the chunks have to be probed one by one.
+    """
+    marked = mark_chunks(markdown_content, [start_line for _, (start_line, _) in chunks])
+    converted, marked_latex = convert_markdown_to_latex(marked, standalone=True, backend=two_stage_probe.backend)
+    if not converted:
+        return None
+    bodies = LatexSourceMap(marked_latex).chunk_bodies()
+    # Chunks whose marker did not survive the conversion are probed on their own
+    batched = [i for i, (_, (start_line, _)) in enumerate(probe_chunks) if start_line in bodies]
+    results = [None] * len(probe_chunks)
+    batch_results = two_stage_probe.typeset_batch([bodies[probe_chunks[i][1][0]] for i in batched])
+    stats.chunk_compilations += 1
+    failure_seen = False
+    for i, result in zip(batched, batch_results):
+        if result is None or (not result[0] and failure_seen):
+            continue
+        failure_seen = failure_seen or not result[0]
+        results[i] = result
+
+    to_confirm = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(to_confirm, pool.compile_all([probe_chunks[i][0] for i in to_confirm])):
+        results[i] = result
+    stats.chunk_compilations += len(to_confirm)
+    stats.batched_chunks += len(probe_chunks) - len(to_confirm)
+    return results
+
+
+def _guess_failing_chunk(markdown_content: str | MarkdownDocument, chunks: list[tuple[str, tuple[int, int]]],
+                         full_compile_error: str,
+                         backend: CompilerBackend | None = None) -> tuple[str, tuple[int, int]] | None:
+    """
+    Returns the chunk that produced the LaTeX line of the whole document's TeX error, or None
+    if the error has no `l.<N>` line or it cannot be traced back to a chunk.
+    """
+    location = parse_tex_error_line(full_compile_error)
+    if location is None:
+        return None
+    # One `pandoc -t latex` run with a marker before every chunk gives the LaTeX -> Markdown map
+    marked = mark_chunks(markdown_content, [start_line for _, (start_line, _) in chunks])
+    converted, marked_latex = convert_markdown_to_latex(marked, standalone=True, backend=backend)
+    if not converted:
+        return None
+    markdown_line = LatexSourceMap(marked_latex).markdown_line_for(*location)
+    if markdown_line is None:
+        return None
+    index = BlockIndex([chunk_range for _, chunk_range in chunks]).find(markdown_line)
+    return None if index is None else chunks[index]
+
+
+def _carried_verdicts(state: RunState | None, run_config: dict | None, markdown_content: str) -> dict:
+    """Returns the previous run's verdicts that still apply, keyed by chunk line range."""
+    if state is None or not state.matches(run_config):
+        return {}
+    return state.carry_forward(markdown_content)
+
+
+def _run_config(markdown_content: str | MarkdownDocument, search: str, probe: str, tex_engine: str, reader: str,
+                pandoc_version: str) -> dict:
+    """Everything besides a chunk's own lines that can change its verdict, to decide whether a previous run can be reused."""
+    return {
+        "pandoc": pandoc_version,
+        "search": search,
+        "probe": probe,
+        "tex_engine": tex_engine if probe != "pdf" else "",
+        # Chunk boundaries come from the reader's AST
+        "reader": reader,
+        # The YAML header sets up the preamble that two-stage probes typeset chunks with
+        "front_matter": _front_matter(markdown_content),
+    }
+
+
+def _front_matter(markdown_content: str | MarkdownDocument) -> str:
+    """Returns the YAML header block at the top of the document, or an empty string."""
+    document = MarkdownDocument.of(markdown_content)
+    if not len(document) or document.line(1).rstrip() != "---":
+        return ""
+    for line in range(2, len(document) + 1):
+        if document.line(line).rstrip() in ("---", "..."):
+            return document.text_of_lines(1, line)
+    return ""
+
+
+def _report_ranges(report: VerdictCallback, good_ranges: list[tuple[int, int]], bad_ranges: list[tuple[int, int]]):
+    """Reports ranges whose verdicts are known without a probe."""
+    for start_line, end_line in good_ranges:
+        report("good", start_line, end_line)
+    for start_line, end_line in bad_ranges:
+        report("bad", start_line, end_line)
+
+
+def _ranges_within(index: BlockIndex, start_line: int, end_line: int) -> list[tuple[int, int]]:
+    """Returns the parts of the indexed ranges that lie inside the lines start_line..end_line."""
+    return [
+        (max(index.starts[i], start_line), min(index.ends[i], end_line))
+        for i in index.overlapping(start_line, end_line)
+    ]
+
+
+def _find_failing_blocks(pool: CompilePool, document: MarkdownDocument, chunks: list[tuple[str, tuple[int, int]]],
+                         section_starts: list[int], settled: dict[tuple[int, int], tuple[bool, str]] | None = None
+                         ) -> tuple[set[tuple[int, int]], dict[tuple[int, int], tuple[bool, str]], int]:
+    """
+    Finds the failing chunks of a failing document top-down: the header-delimited sections
+    are bisected first, then the blocks inside every failing section. A section or span of
+    blocks with a result in `settled`, e.g. the chunk a guided run probed, is not compiled again.
+
+    Sections and spans of blocks whose probe timed out are not searched further, since every
+    round would cost another timeout; their blocks get the timeout as their result.
+
+    Returns:
+        The line ranges of the failing chunks, the timeout results of the chunks whose probe
+        timed out, and the number of compilations performed.
+    """
+    block_index = BlockIndex([chunk_range for _, chunk_range in chunks])
+    block_starts = set(block_index.starts)
+    # Sections start at headers that start a chunk, the first one at the start of the document
+    boundaries = sorted({block_index.starts[0]} | {start for start in section_starts if start in block_starts})
+    last_line = block_index.ends[len(block_index) - 1]
+    sections = [
+        (start, boundaries[i + 1] - 1 if i + 1 < len(boundaries) else last_line)
+        for i, start in enumerate(boundaries)
+    ]
+
+    failing_sections, hanging_sections, compilations = _bisect_units(pool, document, [sections], settled)
+    blocks_of_failing_sections = [
+        [block_index[i] for i in block_index.overlapping(start, end)] for start, end in failing_sections
+    ]
+    failing_spans, hanging_spans, block_compilations = _bisect_units(pool, document, blocks_of_failing_sections, settled)
+    failing_blocks = set()
+    for start, end in failing_spans:
+        failing_blocks.update(block_index[i] for i in block_index.overlapping(start, end))
+    hanging_blocks = {}
+    for (start, end), result in (hanging_sections | hanging_spans).items():
+        hanging_blocks.update(dict.fromkeys((block_index[i] for i in block_index.overlapping(start, end)), result))
+    return failing_blocks, hanging_blocks, compilations + block_compilations
+
+
+def _bisect_units(pool: CompilePool, document: MarkdownDocument,
+                  failing_groups: list[list[tuple[int, int]]], settled: dict[tuple[int, int], tuple[bool, str]] | None = None
+                  ) -> tuple[list[tuple[int, int]], dict[tuple[int, int], tuple[bool, str]], int]:
+    """
+    Finds the failing units (sections or blocks) within groups of consecutive units that are
+    known to fail together, by halving the groups at unit boundaries.
+
+    Works like `_bisect_failing_chunks` one level up: if both halves of a group compile on
+    their own, the group's whole span is reported as one failing unit. A half whose probe
+    times out is not halved again. Halves whose span has a result in `settled` take that
+    result instead of a compilation.
+
+    Returns:
+        The (start_line, end_line) spans of the failing units, sorted, the timeout results of
+        the spans whose probe timed out, and the number of compilations performed.
+    """
+    settled = settled or {}
+    failing = []
+    hanging = {}
+    compilations = 0
+    frontier = [group for group in failing_groups if group]
+    while frontier:
+        splits = []
+        for group in frontier:
+            if len(group) == 1:
+                failing.append(group[0])
+            else:
+                middle = len(group) // 2
+                splits.append((group[:middle], group[middle:]))
+
+        halves = [half for split in splits for half in split]
+        spans = [(half[0][0], half[-1][1]) for half in halves]
+        texts = [document.text_of_lines(start, end) for start, end in spans]
+        # Blank halves cannot fail on their own and are not worth a compilation
+        to_compile = [i for i, text in enumerate(texts) if text.strip() and spans[i] not in settled]
+        results = pool.compile_all([texts[i] for i in to_compile])
+        compilations += len(results)
+        half_results = [settled.get(span, (True, "")) for span in spans]
+        for i, result in zip(to_compile, results):
+            half_results[i] = result
+
+        frontier = []
+        for split_index, (left, right) in enumerate(splits):
+            left_result, right_result = half_results[2 * split_index], half_results[2 * split_index + 1]
+            if left_result[0] and right_result[0]:
+                failing.append((left[0][0], right[-1][1]))
+                continue
+            for half, result in ((left, left_result), (right, right_result)):
+                if is_timeout(result):
+                    hanging[(half[0][0], half[-1][1])] = result
+                elif not result[0]:
+                    frontier.append(half)
+    return sorted(failing), hanging, compilations
+
+
+def _localize_failing_chunks(pool: CompilePool, failing_chunks: list[tuple[int, str]], search: str,
+                             good_ranges: list[tuple[int, int]], bad_ranges: list[tuple[int, int]],
+                             hang_ranges: list[tuple[int, int]], report: VerdictCallback = _ignore_verdict) -> int:
+    """
+    Narrows down the failing lines of chunks, given as (start_line, chunk_content), with the
+    search mode's strategy, reporting every range as it is settled. Ranges whose probes time
+    out go to `hang_ranges` and are not narrowed down further. Returns the number of
+    compilations performed.
+    """
+    if search == "bisect":
+        return _bisect_failing_chunks(pool, failing_chunks, good_ranges, bad_ranges, hang_ranges, report)
+    # Compile the lines of all failing chunks in a single batch, then merge per chunk in order
+    failing_chunks = [(start_line, split_markdown_by_lines(chunk_content, 1)) for start_line, chunk_content in failing_chunks]
+    sub_results = pool.compile_all([
+        sub_chunk_content
+        for _, sub_chunks in failing_chunks
+        for sub_chunk_content, _ in sub_chunks
+    ])
+    result_index = 0
+    for start_line, sub_chunks in failing_chunks:
+        chunk_sub_results = sub_results[result_index : result_index + len(sub_chunks)]
+        result_index += len(sub_chunks)
+        _merge_line_results(start_line, sub_chunks, chunk_sub_results, good_ranges, bad_ranges, hang_ranges, report)
+    return len(sub_results)
+
+
+def _merge_line_results(start_line: int, sub_chunks: list, sub_results: list[tuple[bool, str]],
+                        good_ranges: list[tuple[int, int]], bad_ranges: list[tuple[int, int]],
+                        hang_ranges: list[tuple[int, int]], report: VerdictCallback = _ignore_verdict):
+    """
+    Merges the line-by-line compilation results of one failing chunk into the range lists.
+    Consecutive failing lines are reported as a single bad range.
+    """
+    current_sub_bad_start = -1
+    for i, ((sub_chunk_content, (original_sub_start, original_sub_end)), sub_result) in enumerate(zip(sub_chunks, sub_results)):
+        actual_start_line = start_line + original_sub_start - 1
+        actual_end_line = start_line + original_sub_end - 1
+
+        if is_timeout(sub_result):
+            if current_sub_bad_start != -1:
+                bad_ranges.append((current_sub_bad_start, actual_start_line - 1))
+                report("bad", current_sub_bad_start, actual_start_line - 1)
+                current_sub_bad_start = -1
+            hang_ranges.append((actual_start_line, actual_end_line))
+            report("hang", actual_start_line, actual_end_line)
+        elif not sub_result[0]:
+            if current_sub_bad_start == -1:
+                current_sub_bad_start = actual_start_line
+            # If this is the last sub_chunk and it's bad, close the range
+            if i == len(sub_chunks) - 1:
+                bad_ranges.append((current_sub_bad_start, actual_end_line))
+                report("bad", current_sub_bad_start, actual_end_line)
+        else: # sub_success is True
+            if current_sub_bad_start != -1:
+                # Previous sub-chunk was bad, and this one is good. Close the bad range.
+                bad_ranges.append((current_sub_bad_start, actual_start_line -1))
+                report("bad", current_sub_bad_start, actual_start_line - 1)
+                current_sub_bad_start = -1
+            good_ranges.append((actual_start_line, actual_end_line)) # This part of the larger bad chunk is good
+            report("good", actual_start_line, actual_end_line)
+
+
+def _bisect_failing_chunks(pool: CompilePool, failing_chunks: list[tuple[int, str]],
+                           good_ranges: list[tuple[int, int]], bad_ranges: list[tuple[int, int]],
+                           hang_ranges: list[tuple[int, int]], report: VerdictCallback = _ignore_verdict) -> int:
+    """
+    Localizes the errors inside failing chunks by recursively halving the failing line ranges.
+
+    Both halves of every failing range are compiled; halves that fail are split again until
+    they are single lines. If both halves compile on their own, the error needs lines from
+    both of them, and the whole range is reported as bad. Each round compiles the halves of
+    all failing ranges in one batch, so independent ranges are searched concurrently.
+    This needs O(k log n) compilations for k bad lines in an n-line chunk instead of n.
+    Halves whose compilation times out are reported as hangs and not split again.
+
+    Returns:
+        The number of compilations performed.
+    """
+    compilations = 0
+    # Ranges known to fail, as (document line offset, chunk document, first line, last line)
+    # in the chunk's own line numbers; every half is a slice of its chunk
+    frontier = []
+    for start_line, chunk_content in failing_chunks:
+        chunk = MarkdownDocument(chunk_content)
+        if len(chunk):
+            frontier.append((start_line - 1, chunk, 1, len(chunk)))
+    while frontier:
+        splits = []
+        for offset, chunk, first, last in frontier:
+            if first == last:
+                bad_ranges.append((offset + first, offset + first))
+                report("bad", offset + first, offset + first)
+            else:
+                middle = first + (last - first + 1) // 2
+                splits.append(((offset, chunk, first, middle - 1), (offset, chunk, middle, last)))
+
+        halves = [half for split in splits for half in split]
+        texts = [chunk.text_of_lines(first, last) for _, chunk, first, last in halves]
+        # Blank halves cannot fail on their own and are not worth a compilation
+        to_compile = [i for i, text in enumerate(texts) if text.strip()]
+        results = pool.compile_all([texts[i] for i in to_compile])
+        compilations += len(results)
+        half_results = [(True, "")] * len(halves)
+        for i, result in zip(to_compile, results):
+            half_results[i] = result
+
+        frontier = []
+        for split_index, (left, right) in enumerate(splits):
+            left_result, right_result = half_results[2 * split_index], half_results[2 * split_index + 1]
+            if left_result[0] and right_result[0]:
+                bad_ranges.append((left[0] + left[2], right[0] + right[3]))
+                report("bad", left[0] + left[2], right[0] + right[3])
+                continue
+            for half, result in ((left, left_result), (right, right_result)):
+                offset, _, first, last = half
+                half_start, half_end = offset + first, offset + last
+                if result[0]:
+                    good_ranges.append((half_start, half_end))
+                    report("good", half_start, half_end)
+                elif is_timeout(result):
+                    hang_ranges.append((half_start, half_end))
+                    report("hang", half_start, half_end)
                 else:
-                    # Try to split this failing chunk further using line-based splitting
-                    # as a simple recursive step. A more advanced step would re-run AST analysis
-                    # on the chunk content, but that might be complex if the chunk is not valid standalone MD.
-                    sub_chunks = split_markdown_by_lines(chunk_content, 1) # Split line by line
-
-                    current_sub_bad_start = -1
-                    for i, (sub_chunk_content, (original_sub_start, original_sub_end)) in enumerate(sub_chunks):
-                        actual_start_line = start_line + original_sub_start - 1
-                        actual_end_line = start_line + original_sub_end - 1
-
-                        sub_success, _ = compile_markdown_to_pdf(sub_chunk_content, temp_pdf_file)
-                        # temp_pdf_file cleaned in finally
-
-                        if not sub_success:
-                            if current_sub_bad_start == -1:
-                                current_sub_bad_start = actual_start_line
-                            # If this is the last sub_chunk and it's bad, close the range
-                            if i == len(sub_chunks) - 1:
-                                bad_ranges.append((current_sub_bad_start, actual_end_line))
-                        else: # sub_success is True
-                            if current_sub_bad_start != -1:
-                                # Previous sub-chunk was bad, and this one is good. Close the bad range.
-                                bad_ranges.append((current_sub_bad_start, actual_start_line -1))
-                                current_sub_bad_start = -1
-                            good_ranges.append((actual_start_line, actual_end_line)) # This part of the larger bad chunk is good
-
-                    # If the loop finished and there was an open bad range (e.g. last line was bad)
-                    if current_sub_bad_start != -1 and current_sub_bad_start <= end_line : # ensure it's within original failing chunk
-                         # The end of this sub-bad-range should be the end of the parent failing chunk
-                         # if all subsequent lines also failed.
-                         # This logic is a bit tricky; it should be the last failing line.
-                         # The current logic appends up to actual_start_line -1 for the last good one,
-                         # or actual_end_line for the last bad one.
-                         # If the loop ends and current_sub_bad_start is set, it means the last line(s) were bad.
-                         # The range should go up to end_line (the end of the parent chunk).
-                         # This is implicitly handled if the last sub_chunk is bad.
-                         pass
-
-
-        # Consolidate overlapping/adjacent ranges
-        good_ranges = _consolidate_ranges(sorted(good_ranges))
-        bad_ranges = _consolidate_ranges(sorted(bad_ranges))
-
-        # Identify lines not covered by any "good" AST-based chunk as potentially problematic
-        # This is a simpler way than complex recursion for now.
-        # The initial `bad_ranges` from direct AST chunk failures are a starting point.
-        # We need to find all lines that are NOT in good_ranges.
-
-        final_bad_ranges = []
-        if not good_ranges and not bad_ranges and not full_compile_success: # No good chunks found, whole doc is bad
-            return [], [(1, total_lines)], full_compile_error
-
-        if not good_ranges and bad_ranges: # Only bad chunks found (e.g. from recursive step)
-            return [], _consolidate_ranges(sorted(bad_ranges)), full_compile_error
-
-        # If there are good_ranges, infer bad_ranges from the gaps
-        if good_ranges:
-            # Infer bad ranges from gaps in good_ranges
-            # This assumes that if a line isn't in a good_range, it's part of a bad_range.
-            # This is a strong assumption if AST splitting was coarse.
-            # The `bad_ranges` collected from direct failures of chunks is more precise.
-            # Let's combine them.
-
-            current_line = 1
-            inferred_bad_ranges = []
-            for start_good, end_good in good_ranges:
-                if current_line < start_good:
-                    inferred_bad_ranges.append((current_line, start_good - 1))
-                current_line = end_good + 1
-            if current_line <= total_lines:
-                inferred_bad_ranges.append((current_line, total_lines))
-
-            # Combine inferred bad ranges with directly identified bad ranges
-            combined_bad_ranges = _consolidate_ranges(sorted(bad_ranges + inferred_bad_ranges))
-            final_bad_ranges = combined_bad_ranges
-        else: # No good ranges, means the whole document is essentially bad, or AST splitting was ineffective
-            final_bad_ranges = [(1, total_lines)] if not bad_ranges else _consolidate_ranges(sorted(bad_ranges))
-
-        return good_ranges, final_bad_ranges, full_compile_error
-
-    finally:
-        if temp_pdf_file and os.path.exists(temp_pdf_file):
-            try:
-                os.remove(temp_pdf_file)
-            except OSError as e:
-                # Non-critical, but good to know if cleanup fails
-                print(f"Warning: Could not remove temporary file {temp_pdf_file}: {e}", file=sys.stderr)
+                    frontier.append(half)
+    return compilations
 
 
 def _consolidate_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
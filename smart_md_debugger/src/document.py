@@ -0,0 +1,49 @@
+import bisect
+import itertools
+from array import array
+
+
+class MarkdownDocument:
+    """
+    A document's text with the offsets of its lines, shared by the linter, splitter and debugger.
+
+    The text is kept as one string and its lines are never split into a list of strings of
+    their own: the start offset of every line is precomputed into an array, so a line's offset
+    is an index lookup, the line containing an offset a binary search, and the text of a line
+    range a single slice. Lines end where `str.splitlines` ends them, and keep their line
+    breaks. Line numbers are 1-indexed.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        # Start offset of every line, plus the end of the text
+        self.line_starts = array("q", itertools.accumulate(map(len, text.splitlines(keepends=True)), initial=0))
+
+    @classmethod
+    def of(cls, document: "str | MarkdownDocument") -> "MarkdownDocument":
+        """Returns `document` if it already is a MarkdownDocument, else indexes the text."""
+        return document if isinstance(document, cls) else cls(document)
+
+    def __len__(self) -> int:
+        """The number of lines."""
+        return len(self.line_starts) - 1
+
+    def line_offset(self, line: int) -> int:
+        """Returns the offset where a line starts; line len(self) + 1 starts at the end of the text."""
+        return self.line_starts[line - 1]
+
+    def line_at(self, offset: int) -> int:
+        """Returns the line containing the character at `offset`."""
+        return bisect.bisect_right(self.line_starts, offset, 0, len(self.line_starts) - 1)
+
+    def line(self, line: int) -> str:
+        """Returns the text of a line, with its line break."""
+        return self.text[self.line_starts[line - 1]:self.line_starts[line]]
+
+    def text_of_lines(self, start_line: int, end_line: int) -> str:
+        """Returns the text of the lines start_line..end_line (inclusive), clamped to the document."""
+        start_line = max(start_line, 1)
+        end_line = min(end_line, len(self))
+        if start_line > end_line:
+            return ""
+        return self.text[self.line_starts[start_line - 1]:self.line_starts[end_line]]
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Lints many Markdown files in one run: the linter pre-check of the debugger, without pandoc.
+
+Files, directories (searched recursively for Markdown files) and glob patterns can be mixed.
+The files are linted on a pool of worker processes; every file's findings are printed as soon
+as it is done, one `path:line: TYPE: message` line per finding. `--json FILE` also writes a
+report of all files. The exit status is 1 if any file has findings or cannot be read.
+
+    python -m smart_md_debugger.src.lint_batch notes/ 'appendix/**/*.md' --json lint.json
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, NamedTuple
+
+try:
+    from .linter import LinterError, lint_markdown
+except ImportError:
+    from linter import LinterError, lint_markdown
+
+# File extensions searched for in directories
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+GLOB_CHARACTERS = "*?["
+
+
+class FileResult(NamedTuple):
+    """The findings of one file, or why it could not be linted (`error`)."""
+    path: str
+    errors: List[LinterError]
+    error: str | None = None
+
+
+def find_markdown_files(paths: List[str]) -> List[str]:
+    """
+    Expands files, directories and glob patterns into the Markdown files to lint.
+
+    Directories are searched recursively for files with MARKDOWN_EXTENSIONS, skipping hidden
+    directories. Files and glob matches are taken as they are. Every file is listed once, in
+    the order the arguments name them (sorted within a directory or glob).
+
+    Args:
+        paths: Files, directories and glob patterns (`**` matches any number of directories).
+
+    Returns:
+        The paths of the files.
+    """
+    files: Dict[str, None] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, names in os.walk(path):
+                subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+                for name in sorted(names):
+                    if name.lower().endswith(MARKDOWN_EXTENSIONS):
+                        files.setdefault(os.path.join(directory, name))
+        elif any(character in path for character in GLOB_CHARACTERS):
+            matches = sorted(match for match in glob.glob(path, recursive=True) if os.path.isfile(match))
+            if not matches:
+                print(f"Warning: No files match {path}.", file=sys.stderr)
+            files.update(dict.fromkeys(matches))
+        elif os.path.isfile(path):
+            files.setdefault(path)
+        else:
+            print(f"Warning: {path} does not exist, skipping it.", file=sys.stderr)
+    return list(files)
+
+
+def lint_file(path: str, mask_regions: bool = True) -> FileResult:
+    """Lints one file. Runs in the worker processes."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return FileResult(path, [], str(e))
+    return FileResult(path, lint_markdown(content, mask_regions))
+
+
+def lint_files(paths: List[str], workers: int = 1, mask_regions: bool = True) -> Iterator[FileResult]:
+    """
+    Lints the files on `workers` processes and yields every file's result as soon as it is done.
+
+    With one worker (or one file), the files are linted in this process, in order.
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield lint_file(path, mask_regions)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+        futures = [executor.submit(lint_file, path, mask_regions) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def format_result(result: FileResult) -> List[str]:
+    """The output lines of a file: one per finding, or the reason it could not be read."""
+    if result.error is not None:
+        return [f"{result.path}: ERROR: {result.error}"]
+    return [f"{result.path}:{line}: {error_type}: {message}" for line, error_type, message, _ in result.errors]
+
+
+def build_report(results: List[FileResult]) -> dict:
+    """The JSON report of a run: totals, findings per type, and every file's findings, sorted by path."""
+    by_type: Dict[str, int] = {}
+    for result in results:
+        for _, error_type, _, _ in result.errors:
+            by_type[error_type] = by_type.get(error_type, 0) + 1
+    return {
+        "files": len(results),
+        "files_with_findings": sum(1 for result in results if result.errors),
+        "unreadable_files": sum(1 for result in results if result.error is not None),
+        "findings": sum(len(result.errors) for result in results),
+        "findings_by_type": dict(sorted(by_type.items())),
+        "results": [
+            {
+                "path": result.path,
+                "error": result.error,
+                "findings": [
+                    {"line": line, "type": error_type, "message": message, "suggestion": suggestion}
+                    for line, error_type, message, suggestion in result.errors
+                ],
+            }
+            for result in sorted(results, key=lambda result: result.path)
+        ],
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parses the command line options of the batch linter."""
+    parser = argparse.ArgumentParser(description="Lint Markdown files with the debugger's linter pre-check.")
+    parser.add_argument("paths", nargs="+", help="Markdown files, directories (searched recursively) and glob patterns.")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=os.cpu_count() or 1,
+        help="Number of files to lint concurrently, in separate processes (default: number of CPUs)."
+    )
+    parser.add_argument("--json", default=None, metavar="FILE", help="Also write a JSON report of all files to FILE ('-' for stdout).")
+    parser.add_argument("--quiet", action="store_true", help="Do not print the findings of every file, only the summary.")
+    parser.add_argument("--no-mask", action="store_true",
+                        help="Also check code blocks, inline code, HTML comments and YAML front matter.")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    paths = find_markdown_files(args.paths)
+    if not paths:
+        print("Error: No Markdown files to lint.", file=sys.stderr)
+        return 2
+    # With the JSON report on stdout, the findings go to stderr
+    stream = sys.stderr if args.json == "-" else sys.stdout
+    results = []
+    for result in lint_files(paths, args.workers, mask_regions=not args.no_mask):
+        results.append(result)
+        if not args.quiet:
+            for line in format_result(result):
+                print(line, file=stream)
+            stream.flush()
+    report = build_report(results)
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(f"Linted {report['files']} file(s): {report['findings']} finding(s) in {report['files_with_findings']} file(s)"
+          + (f", {report['unreadable_files']} unreadable" if report["unreadable_files"] else "") + ".", file=sys.stderr)
+    return 1 if report["findings"] or report["unreadable_files"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
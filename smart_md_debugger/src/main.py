@@ -2,12 +2,18 @@
 import sys
 import os
 import shutil # For checking pandoc availability
+import argparse
+import threading
 
 # Adjust import path to correctly find debugger and splitter
 # This assumes main.py is in smart_md_debugger/src and debugger/splitter are in the same directory
 try:
-    from debugger import find_error_ranges
+    from debugger import find_error_ranges, DebugStats, SEARCH_MODES, PROBE_MODES, AST_READERS, STRATEGIES, DEFAULT_SCRATCH_DIR
     from linter import lint_markdown, LinterError # Import linter components
+    from compile_cache import CompileCache
+    from ast_cache import AstCache
+    from run_state import RunState
+    from pandoc_server import PandocServer
 except ImportError:
     # If running from the root of the project (e.g. python src/main.py)
     # then src needs to be in pythonpath or use relative imports from a package.
@@ -17,8 +23,12 @@ except ImportError:
     # If 'smart_md_debugger' is the top-level package and 'src' is a sub-package/module:
     # from ..src.debugger import find_error_ranges # If main was outside src
     # If src is the root for modules:
-    from debugger import find_error_ranges
+    from debugger import find_error_ranges, DebugStats, SEARCH_MODES, PROBE_MODES, AST_READERS, STRATEGIES, DEFAULT_SCRATCH_DIR
     from linter import lint_markdown, LinterError
+    from compile_cache import CompileCache
+    from ast_cache import AstCache
+    from run_state import RunState
+    from pandoc_server import PandocServer
 
 
 def print_linter_errors(errors: list[LinterError]):
@@ -33,11 +43,171 @@ def print_linter_errors(errors: list[LinterError]):
         print("--- Linter Pre-check Passed (No obvious issues found) ---", file=sys.stderr)
 
 
+class ProgressReporter:
+    """
+    Prints the debugger's findings to stderr while it runs.
+
+    Every bad range is printed as soon as its probes settle it. On a terminal, a status
+    line below the findings shows how many probes are done and how many are still queued;
+    it is redrawn in place whenever a probe finishes.
+    """
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.bad_ranges = 0
+        # (finished, submitted) probes, once the first probe has finished
+        self._counts = None
+        # Probes finish on worker threads
+        self._lock = threading.Lock()
+
+    def on_verdict(self, kind: str, start_line: int, end_line: int):
+        if kind == "good":
+            return
+        with self._lock:
+            self._clear_status()
+            if kind == "bad":
+                self.bad_ranges += 1
+                print(f"  Found: lines {start_line}-{end_line} fail to compile", file=self.stream)
+            else:
+                print(f"  Timed out: lines {start_line}-{end_line} did not finish compiling", file=self.stream)
+            self._draw_status()
+
+    def on_progress(self, finished: int, submitted: int):
+        if not self.interactive:
+            return
+        with self._lock:
+            self._counts = (finished, submitted)
+            self._clear_status()
+            self._draw_status()
+
+    def finish(self):
+        """Removes the status line once the run is over."""
+        with self._lock:
+            self._clear_status()
+            self._counts = None
+
+    def _clear_status(self):
+        if self.interactive and self._counts:
+            self.stream.write("\r\033[K")
+
+    def _draw_status(self):
+        if self.interactive and self._counts:
+            finished, submitted = self._counts
+            self.stream.write(f"Probes: {finished} done, {submitted - finished} remaining, "
+                              f"{self.bad_ranges} bad range(s) so far")
+            self.stream.flush()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parses the command line options of the debugger CLI."""
+    parser = argparse.ArgumentParser(
+        description="Find the line ranges of a Markdown document (read from stdin) that fail to compile with pandoc."
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=os.cpu_count() or 1,
+        help="Number of chunk compilations to run concurrently (default: number of CPUs)."
+    )
+    parser.add_argument(
+        "--cache-dir", default=None,
+        help="Directory of the compilation result and AST caches (default: ~/.cache/smart_md_debugger)."
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Compile every chunk even if its result is cached, and run pandoc for the document's AST."
+    )
+    parser.add_argument(
+        "--clear-cache", action="store_true",
+        help="Remove all cached compilation results and ASTs before running."
+    )
+    parser.add_argument(
+        "--search", choices=SEARCH_MODES, default="bisect",
+        help="How failing chunks are narrowed down: compile every line ('linear') "
+             "or recursively halve the failing ranges ('bisect', default)."
+    )
+    parser.add_argument(
+        "--strategy", choices=STRATEGIES, default="flat",
+        help="Which chunks are probed: every block of the document ('flat', default), or the "
+             "header-delimited sections first, then the blocks of failing sections only ('hierarchical')."
+    )
+    parser.add_argument(
+        "--probe", choices=PROBE_MODES, default="pdf",
+        help="How chunks are compiled: a full 'pandoc -t pdf' run per chunk ('pdf', default), or "
+             "'pandoc -t latex' followed by typesetting in a persistent TeX engine ('two-stage'), or the same "
+             "with the document's preamble precompiled once into a format file ('format'), or two-stage probes "
+             "after one TeX run that typesets all chunks at once ('batch')."
+    )
+    parser.add_argument(
+        "--tex-engine", default="pdflatex",
+        help="TeX engine used by the two-stage and format probes (default: pdflatex)."
+    )
+    parser.add_argument(
+        "--ast-reader", choices=AST_READERS, default="commonmark_x",
+        help="Pandoc reader for the AST the document is split by. 'commonmark_x' (default) records "
+             "where every block starts; with 'markdown', chunks fall back to single lines."
+    )
+    parser.add_argument(
+        "--pandoc-server", action="store_true",
+        help="Send the conversions that produce no PDF (the AST, the LaTeX of two-stage probes) to one "
+             "'pandoc server' process instead of starting pandoc for each. Needs pandoc 3.0 or later; "
+             "falls back to running pandoc if the server cannot be started."
+    )
+    parser.add_argument(
+        "--speculative", action="store_true",
+        help="Start compiling chunks while the whole document is still being compiled "
+             "(faster for failing documents, wasted work for documents that compile)."
+    )
+    parser.add_argument(
+        "--guided", action="store_true",
+        help="Trace the line of the TeX error back to its chunk and probe that chunk first. If it fails, "
+             "only the error TeX reported is localized, usually in a handful of compilations."
+    )
+    parser.add_argument(
+        "--scratch-dir", nargs="?", const=DEFAULT_SCRATCH_DIR, default=None, metavar="DIR",
+        help=f"Keep the intermediate files of every worker in its own directory under DIR, ideally a RAM "
+             f"disk (default without DIR: {DEFAULT_SCRATCH_DIR}), and write no PDF for chunk probes."
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None, metavar="SECONDS",
+        help="Kill a chunk compilation after SECONDS and report the chunk as a hang (default: 120 for "
+             "PDF compilations, 20 for chunks typeset by the two-stage and format probes)."
+    )
+    parser.add_argument(
+        "--time-budget", type=float, default=None, metavar="SECONDS",
+        help="Stop starting compilations after SECONDS; chunks left unprobed are reported as hangs."
+    )
+    parser.add_argument(
+        "--no-progress", action="store_true",
+        help="Do not print failing ranges and the probe count to stderr while the search runs."
+    )
+    parser.add_argument(
+        "--state", default=None, metavar="FILE",
+        help="Keep this run's chunk verdicts in FILE. On the next run of the same document, "
+             "only the chunks that changed since then are compiled again."
+    )
+    return parser.parse_args(argv)
+
+
 def main():
     """
     Main function for the smart markdown debugger CLI.
     Reads markdown from stdin, processes it, and prints results.
     """
+    args = parse_args()
+
+    cache = ast_cache = None
+    if args.clear_cache or not args.no_cache:
+        cache = CompileCache(args.cache_dir)
+        ast_cache = AstCache(args.cache_dir)
+    if args.clear_cache:
+        cache.clear()
+        ast_cache.clear()
+        print(f"Cleared compilation cache at {cache.path}", file=sys.stderr)
+        if sys.stdin.isatty():
+            sys.exit(0) # Clearing the cache was the only thing to do.
+        if args.no_cache:
+            cache = ast_cache = None
+
     if not sys.stdin.isatty():
         markdown_input = sys.stdin.read()
     else:
@@ -60,7 +230,43 @@ def main():
 
     # Proceed with Pandoc-based debugging
     print("\nStarting Pandoc-based analysis...\n", file=sys.stderr) # Progress message to stderr
-    good_ranges, bad_ranges, initial_error = find_error_ranges(markdown_input)
+    stats = DebugStats()
+    state = RunState(args.state) if args.state else None
+    scratch_dir = args.scratch_dir
+    if scratch_dir is not None and not os.path.isdir(scratch_dir):
+        print(f"Warning: Scratch directory {scratch_dir} does not exist, using the system's temporary directory.", file=sys.stderr)
+        scratch_dir = None
+    progress = None if args.no_progress else ProgressReporter()
+    pandoc_server = PandocServer() if args.pandoc_server else None
+    try:
+        good_ranges, bad_ranges, initial_error = find_error_ranges(
+            markdown_input, workers=args.workers, cache=cache, search=args.search, stats=stats,
+            probe=args.probe, tex_engine=args.tex_engine, state=state, speculative=args.speculative,
+            guided=args.guided, reader=args.ast_reader, strategy=args.strategy,
+            on_verdict=progress and progress.on_verdict, on_progress=progress and progress.on_progress,
+            probe_timeout=args.timeout, time_budget=args.time_budget, scratch_dir=scratch_dir,
+            pandoc_server=pandoc_server, ast_cache=ast_cache
+        )
+    finally:
+        if progress is not None:
+            progress.finish()
+        if pandoc_server is not None:
+            pandoc_server.close()
+    print(f"Pandoc compilations: {stats.total_compilations}.", file=sys.stderr)
+    if stats.guided_chunk:
+        start, end = stats.guided_chunk
+        outcome = "fails, other chunks were not compiled" if stats.guided_hit else "compiles, searched all chunks"
+        print(f"The TeX error line points at lines {start}-{end}: the chunk {outcome}.", file=sys.stderr)
+    if stats.batched_chunks:
+        print(f"One batched TeX run settled {stats.batched_chunks} chunk(s) without probes of their own.", file=sys.stderr)
+    if stats.carried_chunks:
+        print(f"Reused the verdicts of {stats.carried_chunks} unchanged chunk(s) from the previous run.", file=sys.stderr)
+    if args.search == "bisect" and stats.linear_localization_compilations:
+        print(f"Bisection localized failing chunks with {stats.localization_compilations} compilation(s) "
+              f"instead of {stats.linear_localization_compilations} line by line "
+              f"({stats.compilations_saved} saved).", file=sys.stderr)
+    if cache is not None:
+        print(f"Compilation cache: {cache.hits} hit(s), {cache.misses} miss(es).", file=sys.stderr)
 
     if not bad_ranges and good_ranges:
         # Check if the entire document was good
@@ -71,7 +277,7 @@ def main():
                 print("\nNo errors found.")
                 return # Exit successfully
 
-    if initial_error and not bad_ranges and not good_ranges : # e.g. AST parsing failed
+    if initial_error and not bad_ranges and not good_ranges and not stats.hang_ranges: # e.g. AST parsing failed
         print("An critical error occurred during initial processing:", file=sys.stderr)
         print(initial_error, file=sys.stderr)
         if not bad_ranges: # If find_error_ranges couldn't pinpoint, it might return a full range.
@@ -96,6 +302,8 @@ def main():
                 elif i == 10:
                     print(f"  ... (error message truncated)", file=sys.stderr)
                     break
+    elif stats.hang_ranges:
+        print("No failing ranges found, but some chunks did not finish compiling in time.", file=sys.stderr)
     elif not good_ranges and not initial_error:
          print("Could not determine specific error ranges, but the document failed to compile.", file=sys.stderr)
          print("The error might be global or related to document structure not capturable by AST blocks.", file=sys.stderr)
@@ -107,6 +315,11 @@ def main():
              print("\nInitial pandoc error (whole document):", file=sys.stderr)
              print(initial_error, file=sys.stderr)
 
+    if stats.hang_ranges:
+        print("Line range(s) that did not finish compiling in time (possible infinite loop):")
+        for start, end in stats.hang_ranges:
+            print(f"  Lines {start}-{end}")
+
     # Temporary file cleanup is now handled within find_error_ranges's finally block.
 
 if __name__ == "__main__":
@@ -0,0 +1,188 @@
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Tuple
+
+DEFAULT_STARTUP_TIMEOUT = 10.0
+# Seconds a single conversion may take, on the server (its --timeout) and for the HTTP request
+DEFAULT_REQUEST_TIMEOUT = 120.0
+# Pause between attempts to connect to a server that is still starting
+STARTUP_POLL_INTERVAL = 0.05
+
+
+def _free_port() -> int:
+    """Returns a TCP port on the loopback interface that nothing listens on right now."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class PandocServer:
+    """
+    A local `pandoc server` process that conversions are sent to over HTTP.
+
+    Every `pandoc` subprocess pays for starting the Haskell runtime and loading pandoc's data
+    files; the server pays for that once, and each conversion is a single HTTP request.
+    Every thread keeps its own keep-alive connection to the server, so concurrent probes
+    neither share a connection nor open a new one per request.
+
+    The server is started on the first conversion. It cannot produce PDFs, so it only takes
+    the conversions that need no PDF engine (`-t json`, `-t latex`). If it cannot be started
+    (e.g. pandoc is older than 3.0) or stops answering, `convert` returns None from then on,
+    and callers run `pandoc` as a subprocess instead.
+    """
+
+    def __init__(self, executable: str = "pandoc", startup_timeout: float = DEFAULT_STARTUP_TIMEOUT,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        """
+        Args:
+            executable: The pandoc executable, run as `<executable> server`.
+            startup_timeout: Seconds to wait for the server to accept connections.
+            request_timeout: Seconds a single conversion may take.
+        """
+        self.executable = executable
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.port = None
+        self.error = ""
+        self.requests = 0
+        self.connections_opened = 0
+        self._process = None
+        self._stderr_file = None
+        self._ready = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._connections: List[http.client.HTTPConnection] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def available(self) -> bool:
+        """False once the server failed to start or stopped answering."""
+        return not self.error
+
+    def start(self) -> Tuple[bool, str]:
+        """
+        Starts the server and waits until it accepts connections. Does nothing if it is running
+        or already failed to start; other threads wait while it is starting.
+
+        Returns:
+            (True, "") once the server is ready, or (False, error) if it cannot be started.
+        """
+        with self._start_lock:
+            if self._ready or self.error:
+                return not self.error, self.error
+            self.port = _free_port()
+            command = [self.executable, "server", "--port", str(self.port), "--timeout", str(int(self.request_timeout))]
+            # The server's log goes to a file: a pipe nobody reads during the run would fill up and
+            # block the server. The file is only read for the error of a server that fails to start.
+            self._stderr_file = tempfile.TemporaryFile(mode="w+", encoding="utf-8", errors="replace",
+                                                       prefix="smd-pandoc-server-")
+            try:
+                self._process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                                 stderr=self._stderr_file)
+            except OSError as e:
+                return self._failed_to_start(f"Could not start '{self.executable} server': {e}")
+            deadline = time.monotonic() + self.startup_timeout
+            while True:
+                if self._process.poll() is not None:
+                    self._stderr_file.seek(0)
+                    stderr = self._stderr_file.read().strip()
+                    return self._failed_to_start(
+                        f"'{self.executable} server' exited with code {self._process.returncode}. {stderr}".strip())
+                try:
+                    socket.create_connection(("127.0.0.1", self.port), timeout=STARTUP_POLL_INTERVAL).close()
+                    self._ready = True
+                    return True, ""
+                except OSError:
+                    pass
+                if time.monotonic() > deadline:
+                    return self._failed_to_start(
+                        f"'{self.executable} server' did not accept connections within {self.startup_timeout:g} seconds.")
+                time.sleep(STARTUP_POLL_INTERVAL)
+
+    def _failed_to_start(self, error: str) -> Tuple[bool, str]:
+        self.error = error
+        self._stop_process()
+        print(f"Warning: pandoc server unavailable, running pandoc as a subprocess. {error}", file=sys.stderr)
+        return False, error
+
+    def convert(self, text: str, from_format: str, to_format: str, standalone: bool = False) -> Tuple[bool, str] | None:
+        """
+        Converts text like `pandoc -f <from_format> -t <to_format> [--standalone]`.
+
+        Returns:
+            (True, output) or (False, pandoc's error message), or None if the server is not
+            available and the conversion has to be run as a subprocess.
+        """
+        if self.error or (not self._ready and not self.start()[0]):
+            return None
+        body = json.dumps({"text": text, "from": from_format, "to": to_format, "standalone": standalone})
+        # A kept-alive connection may have been closed by the server in the meantime; retry once on a new one
+        for attempt in range(2):
+            connection = self._worker_connection(fresh=attempt > 0)
+            try:
+                connection.request("POST", "/", body.encode("utf-8"),
+                                   {"Content-Type": "application/json", "Accept": "application/json"})
+                response = connection.getresponse()
+                payload = response.read().decode("utf-8", errors="replace")
+                break
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if attempt == 0:
+                    continue
+                with self._lock:
+                    if not self.error:
+                        self.error = f"pandoc server stopped answering: {e}"
+                        print(f"Warning: {self.error}. Running pandoc as a subprocess.", file=sys.stderr)
+                return None
+        with self._lock:
+            self.requests += 1
+        if response.status != 200:
+            return False, payload
+        try:
+            result = json.loads(payload)
+        except json.JSONDecodeError:
+            return True, payload # Served as plain text
+        if "error" in result:
+            return False, result["error"]
+        return True, result.get("output", "")
+
+    def _worker_connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        """Returns the calling thread's connection to the server, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or fresh:
+            connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.request_timeout)
+            self._local.connection = connection
+            with self._lock:
+                self.connections_opened += 1
+                self._connections.append(connection)
+        return connection
+
+    def _stop_process(self):
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+            self._process = None
+        if self._stderr_file is not None:
+            self._stderr_file.close()
+            self._stderr_file = None
+
+    def close(self):
+        """Closes all connections and stops the server."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._stop_process()
+        for connection in connections:
+            connection.close()
@@ -0,0 +1,132 @@
+import bisect
+import re
+from typing import List, Tuple
+
+# The kinds of regions a RegionMask marks. Their content is not Markdown text the linter checks.
+REGION_KINDS = ("front_matter", "code_fence", "inline_code", "html_comment")
+# What can start a region: a backtick (inline code, or a fence of 3+), a tilde fence or an HTML
+# comment. Without groups, the regex engine skips the text in between fast.
+REGION_START_RX = re.compile(r"`|~~~|<!--")
+# Runs of backticks or tildes, by the character at the start of a REGION_START_RX match
+RUN_RX = {"`": re.compile(r"`+"), "~": re.compile(r"~+")}
+# A fence may be indented by up to 3 spaces
+FENCE_INDENT = 3
+# A line that can close a fence: up to 3 spaces, then 3+ backticks or tildes only
+FENCE_END_RX = {"`": re.compile(r"^ {0,3}(`{3,})[ \t]*\r?$", re.MULTILINE),
+                "~": re.compile(r"^ {0,3}(~{3,})[ \t]*\r?$", re.MULTILINE)}
+# Raw LaTeX fences (```{=latex}) go to LaTeX verbatim, so their content is not masked
+RAW_LATEX_INFO_RX = re.compile(r"\{=(latex|tex)\}")
+# YAML front matter: a "---" first line followed by a non-blank line, up to a "---" or "..."
+# line. Otherwise pandoc reads the "---" as a thematic break.
+FRONT_MATTER_START_RX = re.compile(r"---[ \t]*\r?\n(?![ \t]*\r?(?:\n|$))")
+FRONT_MATTER_END_RX = re.compile(r"^(?:---|\.\.\.)[ \t]*\r?$", re.MULTILINE)
+HTML_COMMENT_END = "-->"
+
+# A region: (start offset, end offset (exclusive), kind)
+Region = Tuple[int, int, str]
+
+
+class RegionMask:
+    """
+    The regions of a Markdown document that are not text: YAML front matter, fenced code
+    blocks, inline code spans and HTML comments, as character offsets into the document.
+
+    The regions are found in one pass over the document, jumping from one possible region
+    start to the next, and are sorted and disjoint. Inline code spans end on the line they
+    start on; an unclosed fence or comment runs to the end of the document, as in CommonMark.
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.regions: List[Region] = []
+        self._starts: List[int] = []
+        self._scan()
+
+    def _add(self, start: int, end: int, kind: str):
+        if end > start:
+            self.regions.append((start, end, kind))
+            self._starts.append(start)
+
+    def _scan(self):
+        content = self.content
+        pos = 0
+        front_matter = FRONT_MATTER_START_RX.match(content)
+        end = front_matter and FRONT_MATTER_END_RX.search(content, front_matter.end())
+        if end:
+            pos = _line_end(content, end.end())
+            self._add(0, pos, "front_matter")
+        # Jump from one possible region start to the next; text in between is never looked at
+        while True:
+            match = REGION_START_RX.search(content, pos)
+            if match is None:
+                return
+            start = match.start()
+            if content[start] == "<":
+                comment_end = content.find(HTML_COMMENT_END, match.end())
+                pos = len(content) if comment_end == -1 else comment_end + len(HTML_COMMENT_END)
+                self._add(start, pos, "html_comment")
+                continue
+            run = RUN_RX[content[start]].match(content, start)
+            if len(run.group()) >= 3:
+                fence = run.group()
+                line_start = content.rfind("\n", 0, start) + 1
+                info_end = _line_end(content, run.end())
+                info = content[run.end():info_end]
+                if start - line_start > FENCE_INDENT or content[line_start:start].strip(" ") \
+                        or (fence[0] == "`" and "`" in info):
+                    # Not a fence: a backtick run opens an inline code span, a tilde run is text
+                    if fence[0] == "~" or _is_escaped(content, start):
+                        pos = run.end()
+                    else:
+                        pos = self._add_code_span(start, run.end())
+                    continue
+                start = line_start
+                end = _fence_end(content, fence, info_end)
+                if not RAW_LATEX_INFO_RX.search(info):
+                    self._add(start, end, "code_fence")
+                pos = end
+            elif _is_escaped(content, start):
+                pos = run.end()
+            else:
+                pos = self._add_code_span(start, run.end())
+
+    def _add_code_span(self, start: int, run_end: int) -> int:
+        """
+        Adds the inline code span opened by the backtick run at `start`, if it is closed on the
+        same line by a run of exactly as many backticks. Returns where to continue the scan.
+        """
+        run_length = run_end - start
+        for run in RUN_RX["`"].finditer(self.content, run_end, _line_end(self.content, run_end)):
+            if run.end() - run.start() == run_length:
+                self._add(start, run.end(), "inline_code")
+                return run.end()
+        return run_end
+
+    def kind_at(self, offset: int) -> str | None:
+        """Returns the kind of the region containing the character at `offset`, or None if it is text."""
+        index = bisect.bisect_right(self._starts, offset) - 1
+        if index >= 0 and offset < self.regions[index][1]:
+            return self.regions[index][2]
+        return None
+
+
+def _line_end(content: str, pos: int) -> int:
+    """Returns the offset after the line break that ends the line containing `pos`."""
+    end = content.find("\n", pos)
+    return len(content) if end == -1 else end + 1
+
+
+def _fence_end(content: str, fence: str, pos: int) -> int:
+    """Returns the end of the line closing the fence opened with `fence`, searching from `pos`."""
+    for match in FENCE_END_RX[fence[0]].finditer(content, pos):
+        if len(match.group(1)) >= len(fence):
+            return _line_end(content, match.end())
+    return len(content)
+
+
+def _is_escaped(content: str, pos: int) -> bool:
+    """Whether the character at `pos` is escaped by an odd number of backslashes."""
+    backslashes = 0
+    while pos - backslashes > 0 and content[pos - backslashes - 1] == "\\":
+        backslashes += 1
+    return backslashes % 2 == 1
@@ -0,0 +1,120 @@
+import difflib
+import json
+import os
+import sys
+from typing import Dict, List, NamedTuple, Tuple
+
+try:
+    from .splitter import BlockIndex
+except ImportError:
+    from splitter import BlockIndex
+
+# Bump whenever the meaning of stored verdicts changes, so old state files are ignored.
+STATE_VERSION = 1
+
+
+class ChunkVerdict(NamedTuple):
+    """What a previous run found out about one chunk: its lines and which of them compile."""
+    start_line: int
+    end_line: int
+    good_ranges: List[Tuple[int, int]]
+    bad_ranges: List[Tuple[int, int]]
+
+    def shifted(self, offset: int) -> "ChunkVerdict":
+        """Returns the same verdict for the chunk moved by `offset` lines."""
+        return ChunkVerdict(
+            self.start_line + offset,
+            self.end_line + offset,
+            [(start + offset, end + offset) for start, end in self.good_ranges],
+            [(start + offset, end + offset) for start, end in self.bad_ranges],
+        )
+
+
+class RunState:
+    """
+    The chunk map and verdicts of the previous debugger run on one document, kept in a JSON file.
+
+    On the next run, the document is diffed against the stored text. Chunks whose lines did
+    not change keep their verdict, shifted to their new position, and only the other chunks
+    are compiled again. Verdicts are only reused if the run configuration (pandoc version,
+    probe and search modes, YAML header, ...) is unchanged. The stored result of a run that
+    is not complete (some probes timed out) is not reused as a whole, only its chunk verdicts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.markdown = None
+        self.config = None
+        self.chunks: List[ChunkVerdict] = []
+        self.result = None
+        self.complete = False
+        self.load()
+
+    def load(self):
+        """Reads the state file; a missing or unreadable file leaves the state empty."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable debugger state {self.path}: {e}", file=sys.stderr)
+            return
+        if data.get("version") != STATE_VERSION:
+            return
+        self.markdown = data["markdown"]
+        self.config = data["config"]
+        self.chunks = [
+            ChunkVerdict(start, end, [tuple(r) for r in good], [tuple(r) for r in bad])
+            for start, end, good, bad in data["chunks"]
+        ]
+        good_ranges, bad_ranges, initial_error = data["result"]
+        self.result = ([tuple(r) for r in good_ranges], [tuple(r) for r in bad_ranges], initial_error)
+        self.complete = data.get("complete", True)
+
+    def save(self, markdown: str, config: dict, chunks: List[ChunkVerdict], result: tuple, complete: bool = True):
+        """Replaces the stored state with the given run."""
+        self.markdown, self.config, self.chunks, self.result = markdown, config, chunks, result
+        self.complete = complete
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": STATE_VERSION,
+                "markdown": markdown,
+                "config": config,
+                "chunks": [list(chunk) for chunk in chunks],
+                "result": list(result),
+                "complete": complete,
+            }, f)
+        os.replace(temp_path, self.path) # A crash never leaves a half-written state behind
+
+    def matches(self, config: dict) -> bool:
+        """True if a previous run with the same configuration is stored."""
+        return self.markdown is not None and self.config == config
+
+    def carry_forward(self, markdown: str) -> Dict[Tuple[int, int], ChunkVerdict]:
+        """
+        Maps the stored chunk verdicts onto a new version of the document.
+
+        Returns:
+            The verdicts of all stored chunks whose lines are unchanged in `markdown`, keyed
+            by their new (start_line, end_line).
+        """
+        old_lines = self.markdown.splitlines()
+        new_lines = markdown.splitlines()
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        chunks = sorted(self.chunks)
+        index = BlockIndex([(chunk.start_line, chunk.end_line) for chunk in chunks])
+        carried = {}
+        for tag, old_start, old_end, new_start, _ in matcher.get_opcodes():
+            if tag != "equal":
+                continue
+            # Opcodes are 0-indexed and end-exclusive, chunks 1-indexed and inclusive
+            for i in index.overlapping(old_start + 1, old_end):
+                chunk = chunks[i]
+                if chunk.start_line > old_start and chunk.end_line <= old_end:
+                    moved = chunk.shifted(new_start - old_start)
+                    carried[(moved.start_line, moved.end_line)] = moved
+        return carried
@@ -0,0 +1,118 @@
+import bisect
+import re
+from typing import Dict, List, Tuple
+
+try:
+    from .document import MarkdownDocument
+except ImportError:
+    from document import MarkdownDocument
+
+# TeX's error context line: "l.<line number> <input up to the error>"
+TEX_ERROR_LINE_RX = re.compile(r"^l\.(\d+) ?(.*)$", re.MULTILINE)
+MARKER_PREFIX = "%SMDSRC "
+MARKER_RX = re.compile(r"^%SMDSRC (\d+)$")
+# Lines a marker adds to pandoc's LaTeX output: the comment and the blank line after it
+MARKER_OUTPUT_LINES = 2
+END_DOCUMENT = "\\end{document}"
+
+
+def parse_tex_error_line(error_message: str) -> Tuple[int, str] | None:
+    """
+    Returns the line number and input text of the first `l.<N>` line in a TeX error message,
+    or None if the message has no such line.
+    """
+    match = TEX_ERROR_LINE_RX.search(error_message)
+    if not match:
+        return None
+    return int(match.group(1)), match.group(2).strip()
+
+
+def mark_chunks(markdown_content: str | MarkdownDocument, chunk_starts: List[int]) -> str:
+    """
+    Inserts a raw LaTeX comment naming the start line before every chunk of the document.
+
+    Pandoc copies the comments verbatim into its LaTeX output, so `LatexSourceMap` can tell
+    which Markdown chunk every line of the output came from.
+    """
+    document = MarkdownDocument.of(markdown_content)
+    marked = []
+    position = 0
+    for line_number in sorted(set(chunk_starts)):
+        if 1 <= line_number <= len(document):
+            offset = document.line_offset(line_number)
+            marked.append(document.text[position:offset])
+            marked.append(f"\n```{{=latex}}\n{MARKER_PREFIX}{line_number}\n```\n\n")
+            position = offset
+    marked.append(document.text[position:])
+    if document.text and not document.text.endswith("\n"):
+        marked.append("\n")
+    return "".join(marked)
+
+
+class LatexSourceMap:
+    """
+    Maps lines of pandoc's LaTeX output back to the Markdown chunks they were generated from.
+
+    Built from the output of a document prepared with `mark_chunks`. The LaTeX that pandoc
+    compiles to PDF has no markers, so its line numbers are translated by discounting the
+    lines the markers added before them, and TeX's echo of the failing input line is used
+    to pin the line down exactly where it is unambiguous.
+    """
+
+    def __init__(self, marked_latex: str):
+        self.lines: List[str] = []
+        # Line of the marked output where each chunk's output starts, and the chunk's Markdown start line
+        self.chunk_output_starts: List[int] = []
+        self.chunk_md_starts: List[int] = []
+        for line in marked_latex.splitlines():
+            match = MARKER_RX.match(line.strip())
+            if match:
+                self.chunk_output_starts.append(len(self.lines) + 1)
+                self.chunk_md_starts.append(int(match.group(1)))
+            self.lines.append(line)
+
+    def markdown_line_for(self, latex_line: int, latex_text: str = "") -> int | None:
+        """
+        Returns the Markdown start line of the chunk that produced a line of the unmarked LaTeX,
+        or None if the line precedes every chunk (e.g. it is part of the preamble).
+        """
+        marked_line = self._marked_line(latex_line, latex_text)
+        index = bisect.bisect_right(self.chunk_output_starts, marked_line) - 1
+        if index < 0:
+            return None
+        return self.chunk_md_starts[index]
+
+    def chunk_bodies(self) -> Dict[int, str]:
+        """
+        Returns the LaTeX generated from every chunk, keyed by the chunk's Markdown start line:
+        the lines after its marker, up to the next marker or `\\end{document}`.
+        """
+        # Marker lines are 1-indexed, so they are also the 0-based index of the line after them
+        ends = [start - 1 for start in self.chunk_output_starts[1:]]
+        document_end = len(self.lines)
+        for i in range(len(self.lines) - 1, -1, -1):
+            if self.lines[i].strip() == END_DOCUMENT:
+                document_end = i
+                break
+        ends.append(document_end)
+        return {
+            md_start: "".join(line + "\n" for line in self.lines[start:end])
+            for start, end, md_start in zip(self.chunk_output_starts, ends, self.chunk_md_starts)
+        }
+
+    def _marked_line(self, latex_line: int, latex_text: str) -> int:
+        """Finds the marked output line corresponding to an unmarked LaTeX line."""
+        # Every marker before the line pushed it down; count them as we go
+        estimate = latex_line
+        index = 0
+        while index < len(self.chunk_output_starts) and self.chunk_output_starts[index] <= estimate:
+            estimate += MARKER_OUTPUT_LINES
+            index += 1
+        # TeX echoes the input line up to the error, cut to "...<tail>" if it is long
+        needle = latex_text[3:] if latex_text.startswith("...") else latex_text
+        if needle:
+            # Prefer the matching line closest to the estimate
+            candidates = [i + 1 for i, line in enumerate(self.lines) if needle in line]
+            if candidates:
+                return min(candidates, key=lambda candidate: abs(candidate - estimate))
+        return estimate
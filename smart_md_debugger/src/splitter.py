@@ -1,185 +1,352 @@
+import json
 import re
-from typing import List, Tuple, Dict, Any
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+try:
+    from .document import MarkdownDocument
+except ImportError:
+    from document import MarkdownDocument
 # Import get_markdown_ast from debugger.py if it's in the same package
 # For now, assuming it might be called from a context where debugger.get_markdown_ast is available
 # If running this file directly, you'd need to adjust imports or mock it.
 # from .debugger import get_markdown_ast # Use this if part of a package
 
-def get_source_pos(element: Dict[str, Any]) -> Tuple[int, int, int, int] | None:
+# Attribute keys that carry source positions: "data-pos" from the commonmark readers'
+# sourcepos extension, "sourcepos" as used by older pandoc versions.
+POSITION_KEYS = ("data-pos", "sourcepos")
+# "SL:SC-EL:EC", possibly prefixed with a file name ("doc.md@1:1-2:5"); spans that cross
+# lines may list several ranges separated by ";".
+POSITION_RX = re.compile(r"(\d+):(\d+)-(\d+):(\d+)")
+# A position attribute as it appears in pandoc's JSON output, e.g. ["data-pos","3:1-4:16"].
+# Quotes inside JSON strings are escaped, so this never matches text of the document.
+POSITION_PAIR_RX = re.compile(r'\[\s*"(?:data-pos|sourcepos)"\s*,\s*"((?:[^"\\]|\\.)*)"\s*\]')
+# Start of the top-level block list. Meta values are objects, so no meta key can be followed by "[".
+BLOCKS_START_RX = re.compile(r'"blocks"\s*:\s*\[')
+# Characters kept while looking for BLOCKS_START_RX, in case it is split between two reads
+BLOCKS_START_OVERLAP = 64
+
+
+class BlockPosition(NamedTuple):
+    """A top-level block of a document: its AST type (e.g. "Header") and the lines it covers."""
+    type: str
+    start_line: int
+    end_line: int
+
+
+def parse_source_pos(value: str) -> Tuple[int, int, int, int] | None:
     """
-    Extracts the source position (start line, start col, end line, end col)
-    from a Pandoc AST element if available in its metadata.
-    Pandoc typically adds this as:
-    "meta": {
-        ...
-        "sourcepos": [
-            [start_line, start_col],
-            [end_line, end_col]
-        ]
-    }
-    Or directly in the element's attributes for some versions/formats.
-    This function needs to be robust to find it.
+    Parses a source position attribute value into (start line, start col, end line, end col),
+    covering all ranges it lists. Returns None if the value holds no range.
     """
-    if not isinstance(element, dict):
+    ranges = [tuple(map(int, match.groups())) for match in POSITION_RX.finditer(value)]
+    if not ranges:
         return None
+    start = min((r[0], r[1]) for r in ranges)
+    end = max((r[2], r[3]) for r in ranges)
+    return start[0], start[1], end[0], end[1]
+
+
+def get_source_pos(element: Dict[str, Any]) -> Tuple[int, int, int, int] | None:
+    """
+    Extracts the source position (start line, start col, end line, end col) from the
+    attributes of a Pandoc AST element, if it has any.
 
-    # Check common locations for source position information
-    # 1. In element attributes (e.g. for CodeBlock)
-    #    Attr = [identifier, [classes], [[key, val]]]
-    #    Example: ["", [], [["sourcepos","1:1-3:3"]]]
-    if 'c' in element and len(element['c']) > 0:
-        attrs = element['c'][0]
+    Pandoc attaches positions as a key-value attribute, e.g. for a Div or CodeBlock:
+        ["", [], [["data-pos", "1:1-3:3"]]]
+    Header keeps its attributes after the level: [level, attr, inlines].
+    """
+    if not isinstance(element, dict) or not isinstance(element.get('c'), list):
+        return None
+    content = element['c']
+    candidates = content[:2] if element.get('t') == "Header" else content[:1]
+    for attrs in candidates:
         if isinstance(attrs, list) and len(attrs) > 2 and isinstance(attrs[2], list):
-            for key, val in attrs[2]:
-                if key == "sourcepos" and isinstance(val, str):
-                    # Parse "SL:SC-EL:EC"
-                    match = re.match(r"(\d+):(\d+)-(\d+):(\d+)", val)
-                    if match:
-                        return int(match.group(1)), int(match.group(2)), int(match.group(3)), int(match.group(4))
-
-    # 2. In 'meta' dictionary, often part of a top-level block element's 'c'
-    #    element = { "t": "Para", "c": [ { "t": "Str", "c": "Text", "meta": { "sourcepos": ...}}]}
-    #    This is less common for block elements themselves, more for inlines.
-    #    The more reliable source for blocks is often passed down or needs to be inferred.
-
-    # 3. Pandoc >= 2.11 often puts it in the second element of a tuple for blocks
-    #    e.g. ["Header", LEVEL, ATTR, INLINES] where ATTR can have sourcepos
-    #    e.g. ["Para", INLINES] -> need to check INLINES
-    #    For block elements, the source position is usually in the attributes part
-    #    of the block structure. For example, for a Para, it's not directly on the Para,
-    #    but on the inlines within it. We are interested in block-level units.
-
-    # For now, this simplified version focuses on Attr as it's common for explicit sourcepos.
-    # A more robust solution would traverse known AST structures.
+            for pair in attrs[2]:
+                if isinstance(pair, list) and len(pair) == 2 and pair[0] in POSITION_KEYS and isinstance(pair[1], str):
+                    return parse_source_pos(pair[1])
     return None
 
 
+def get_line_extent(node: Any) -> Tuple[int, int] | None:
+    """
+    Returns the (start_line, end_line) covered by an AST node and all of its descendants,
+    or None if none of them carries a source position.
+
+    Walks the whole subtree, so blocks without positions of their own (Para, lists,
+    LineBlock, ...) get their extent from the Divs and Spans the sourcepos extension
+    wraps their contents in.
+    """
+    values = []
+    stack = [node]
+    while stack: # Iterative, so deeply nested lists cannot exhaust the recursion limit
+        current = stack.pop()
+        if isinstance(current, dict):
+            stack.extend(current.values())
+            continue
+        if not isinstance(current, list):
+            continue
+        if len(current) == 2 and current[0] in POSITION_KEYS and isinstance(current[1], str):
+            values.append(current[1])
+            continue
+        stack.extend(current)
+    return _line_extent_of(values)
+
+
+def _line_extent_of(position_values: Iterable[str]) -> Tuple[int, int] | None:
+    """Returns the (start_line, end_line) covered by a set of position attribute values."""
+    start_line = end_line = None
+    for value in position_values:
+        position = parse_source_pos(value)
+        if position is not None:
+            first, _, last, last_col = position
+            # End positions point just past the block; "5:1" means it ended with line 4
+            if last_col == 1 and last > first:
+                last -= 1
+            start_line = first if start_line is None else min(start_line, first)
+            end_line = last if end_line is None else max(end_line, last)
+    if start_line is None:
+        return None
+    return start_line, end_line
+
+
 def get_block_source_positions(ast: Dict[str, Any]) -> List[Tuple[int, int]]:
     """
     Extracts start and end line numbers for each top-level block element from the Pandoc AST.
     This aims to identify logical units.
 
+    Every block type is covered: a block's extent is derived from the source positions of
+    the block itself and all of its descendants.
+
     Args:
         ast: The Pandoc AST as a Python dictionary.
 
     Returns:
-        A list of tuples, where each tuple is (start_line, end_line) for a block.
+        A list of tuples, where each tuple is (start_line, end_line) for a block, sorted by
+        start line. Blocks without any source position are left out.
         Returns an empty list if AST is invalid or no source positions found.
     """
+    return [(block.start_line, block.end_line) for block in get_block_table(ast)]
+
+
+def get_block_table(ast: Dict[str, Any]) -> List[BlockPosition]:
+    """
+    Returns the type and line extent of every top-level block of a Pandoc AST that has a
+    source position, sorted by start line.
+
+    The table holds everything chunking needs from the AST, so it can be kept instead of
+    the AST itself (see `ast_cache.AstCache`).
+    """
     if not ast or 'blocks' not in ast or not isinstance(ast['blocks'], list):
         return []
 
-    positions = []
+    table = []
     for block in ast['blocks']:
         if not isinstance(block, dict) or 't' not in block:
             continue
+        extent = get_line_extent(block)
+        if extent is not None and extent[0] >= 1:
+            table.append(BlockPosition(block['t'], *extent))
+    table.sort(key=lambda block: (block.start_line, block.end_line))
+    return table
 
-        # Pandoc >= 2.11 often includes attributes as the second item in content list for blocks
-        # e.g. block['c'][0] for attributes if block['c'] is a list [attrs, content]
-        # or directly in block['c'] if it's like [level, attrs, content] for Header
-        attrs = None
-        content_tuple = block.get('c')
-
-        if isinstance(content_tuple, list) and len(content_tuple) > 0:
-            # Case 1: Element like Para, Div, Plain - attrs might be on inlines or not directly present
-            # We need to parse the "sourcepos" attribute if present.
-            # Example: CodeBlock ["CodeBlock", [ID, [CLASSES], [[KEY,VALUE_PAIRS]]], "code"]
-            # The ATTR part is content_tuple[0]
-            if block['t'] in ["CodeBlock", "Header", "Div", "BlockQuote", "Table"]: # Elements that typically have Attr
-                 if len(content_tuple) > 0 and isinstance(content_tuple[0], list): # Attr is usually the first or second element
-                    attr_list = content_tuple[0] # For CodeBlock, Header (after level)
-                    if block['t'] == "Header" and len(content_tuple) > 1: # Header: [level, attr, inlines]
-                        attr_list = content_tuple[1]
-
-                    if isinstance(attr_list, list) and len(attr_list) > 2 and isinstance(attr_list[2], list):
-                        for key, val in attr_list[2]: # key-value pairs
-                            if key == "sourcepos" and isinstance(val, str):
-                                match = re.match(r"(\d+):(\d+)-(\d+):(\d+)", val)
-                                if match:
-                                    start_line, _, end_line, _ = map(int, match.groups())
-                                    positions.append((start_line, end_line))
-                                    # Skip to next block once position is found
-                                    continue # to next block in ast['blocks']
-            # If not found in Attr, or for elements like Para, List, try to infer from content
-            # This part is tricky and often requires looking at the first and last inline element's sourcepos
-            # For simplicity, we'll rely on blocks that explicitly carry `sourcepos` for now.
-            # Pandoc's native markdown reader adds `sourcepos` attribute to blocks.
-
-    # Filter out overlapping or invalid ranges (though less likely with direct sourcepos)
-    # Sort by start line
-    positions.sort(key=lambda x: x[0])
-
-    # For elements like Para, OrderedList, BulletList, Pandoc might not attach `sourcepos`
-    # directly to the block but to its contents. A more advanced version would recursively
-    # find min/max line numbers from children.
-    # For now, this function will primarily find positions for blocks like CodeBlock, Header, Div
-    # if they have the `sourcepos` attribute.
-
-    # A simple fallback or alternative: iterate through all elements recursively
-    # and collect all sourcepos, then determine block boundaries. This is more complex.
-    # The current approach relies on pandoc providing block-level sourcepos.
-    # If pandoc is run with --sourcepos flag, it should provide this.
-    # The get_markdown_ast in debugger.py needs to ensure pandoc is called with --sourcepos.
-    # Let's assume for now `pandoc -t json --sourcepos` is used.
-
-    # If positions list is empty, it means top-level `sourcepos` attributes were not found.
-    # This could happen if pandoc version is old or if --sourcepos wasn't used.
-    # Or if the markdown structure is unusual.
-    return positions
-
-
-def split_markdown_by_lines(markdown_string: str, lines_per_chunk: int) -> List[Tuple[str, Tuple[int, int]]]:
+
+def get_section_starts(ast: Dict[str, Any]) -> List[int]:
+    """Returns the start lines of the top-level Header blocks, which delimit the document's sections."""
+    return section_starts(get_block_table(ast))
+
+
+def section_starts(block_table: List[BlockPosition]) -> List[int]:
+    """Like `get_section_starts`, for a table built by `get_block_table`."""
+    return [block.start_line for block in block_table if block.type == "Header"]
+
+
+class BlockTableScanner:
+    """
+    Builds the block table of `get_block_table` from pandoc's JSON output as it is read,
+    without materializing the AST.
+
+    The output is fed in pieces, e.g. as it arrives on pandoc's stdout. Everything before
+    the top-level block list is skipped, and every block is decoded on its own and dropped
+    right away, so memory holds one block at a time instead of the whole tree. A block's
+    extent comes from the position attributes in its JSON text, which a regular expression
+    finds without walking the decoded block.
+    """
+
+    def __init__(self):
+        self.table: List[BlockPosition] = []
+        self._buffer = ""
+        self._in_blocks = False
+        self._done = False
+        # Unread length the buffer must reach before decoding an incomplete block is retried.
+        # Doubling it keeps a block that spans many reads from being decoded once per read.
+        self._retry_length = 0
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, text: str):
+        """Scans the next piece of pandoc's JSON output."""
+        if self._done:
+            return
+        self._buffer += text
+        if not self._in_blocks:
+            match = BLOCKS_START_RX.search(self._buffer)
+            if match is None:
+                self._buffer = self._buffer[-BLOCKS_START_OVERLAP:]
+                return
+            self._in_blocks = True
+            self._buffer = self._buffer[match.end():]
+        if len(self._buffer) >= self._retry_length:
+            self._scan_blocks()
+
+    def _scan_blocks(self):
+        buffer = self._buffer
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                self._done = True
+                break
+            try:
+                block, end = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The block is not complete yet
+                self._retry_length = 2 * (len(buffer) - position)
+                break
+            if isinstance(block, dict) and 't' in block:
+                extent = _line_extent_of(match.group(1) for match in POSITION_PAIR_RX.finditer(buffer, position, end))
+                if extent is not None and extent[0] >= 1:
+                    self.table.append(BlockPosition(block['t'], *extent))
+            position = end
+        self._buffer = "" if self._done else buffer[position:]
+
+    def close(self) -> List[BlockPosition]:
+        """
+        Finishes the scan.
+
+        Returns:
+            The block table, sorted by start line.
+
+        Raises:
+            ValueError: If the output ended before the end of the block list.
+        """
+        if not self._done and self._in_blocks:
+            self._retry_length = 0
+            self._scan_blocks()
+        if not self._done:
+            raise ValueError("pandoc's JSON output ended before the end of its block list")
+        self.table.sort(key=lambda block: (block.start_line, block.end_line))
+        return self.table
+
+
+def scan_block_table(pieces: Iterable[str]) -> List[BlockPosition]:
+    """Like `get_block_table`, for pandoc's JSON output given as text pieces (see `BlockTableScanner`)."""
+    scanner = BlockTableScanner()
+    for piece in pieces:
+        scanner.feed(piece)
+    return scanner.close()
+
+
+class BlockIndex:
+    """
+    Interval index over disjoint line ranges, e.g. a document's blocks or chunks.
+
+    The start and end lines are kept in two sorted arrays, so finding the range that
+    covers a line, or all ranges that overlap a span of lines, is a binary search
+    instead of a scan over the whole list.
+    """
+
+    def __init__(self, ranges: List[Tuple[int, int]]):
+        """
+        Args:
+            ranges: Non-overlapping (start_line, end_line) tuples, in any order.
+        """
+        ranges = sorted(ranges)
+        self.starts = array("l", [start for start, _ in ranges])
+        self.ends = array("l", [end for _, end in ranges])
+
+    @classmethod
+    def from_ast(cls, ast: Dict[str, Any]) -> "BlockIndex":
+        """Indexes the top-level blocks of a Pandoc AST."""
+        return cls(get_block_source_positions(ast))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Tuple[int, int]:
+        return self.starts[index], self.ends[index]
+
+    def find(self, line: int) -> int | None:
+        """Returns the index of the range that covers `line`, or None if no range does."""
+        index = bisect_right(self.starts, line) - 1
+        if index >= 0 and self.ends[index] >= line:
+            return index
+        return None
+
+    def overlapping(self, first_line: int, last_line: int) -> range:
+        """Returns the indices of all ranges that share at least one line with first_line..last_line."""
+        # Disjoint sorted ranges have sorted ends too
+        return range(bisect_left(self.ends, first_line), bisect_right(self.starts, last_line))
+
+
+def split_markdown_by_lines(markdown_string: str | MarkdownDocument, lines_per_chunk: int) -> List[Tuple[str, Tuple[int, int]]]:
     """
     Splits markdown string into chunks of specified number of lines.
 
     Args:
-        markdown_string: The markdown content.
+        markdown_string: The markdown content, or its MarkdownDocument.
         lines_per_chunk: Number of lines for each chunk.
 
     Returns:
         A list of tuples, where each tuple is (chunk_string, (start_line, end_line)).
         Line numbers are 1-indexed.
     """
-    lines = markdown_string.splitlines(keepends=True) # Keep newlines to reconstruct accurately
+    document = MarkdownDocument.of(markdown_string)
+    text, line_starts, total_lines = document.text, document.line_starts, len(document)
     chunks = []
-    current_line_number = 1
-    for i in range(0, len(lines), lines_per_chunk):
-        chunk_lines = lines[i:i + lines_per_chunk]
-        chunk_str = "".join(chunk_lines)
-        start_line = current_line_number
-        end_line = current_line_number + len(chunk_lines) -1
-        chunks.append((chunk_str, (start_line, end_line)))
-        current_line_number += len(chunk_lines)
+    for start_line in range(1, total_lines + 1, lines_per_chunk):
+        end_line = min(start_line + lines_per_chunk - 1, total_lines)
+        # Every chunk is one slice of the document, line breaks included
+        chunks.append((text[line_starts[start_line - 1]:line_starts[end_line]], (start_line, end_line)))
     return chunks
 
 
-def split_markdown_by_ast_blocks(markdown_string: str, ast: Dict[str, Any]) -> List[Tuple[str, Tuple[int, int]]]:
+def split_markdown_by_ast_blocks(markdown_string: str | MarkdownDocument, ast: Dict[str, Any]) -> List[Tuple[str, Tuple[int, int]]]:
     """
     Splits markdown string into chunks based on AST block source positions.
 
+    Every chunk starts where a top-level block starts and runs up to the next block, so the
+    chunks cover the whole document: lines before the first block (e.g. the YAML header)
+    belong to the first chunk, and blank lines to the block they follow.
+
     Args:
-        markdown_string: The full markdown content.
+        markdown_string: The full markdown content, or its MarkdownDocument.
         ast: The Pandoc AST of the markdown content (expected to have source positions).
 
     Returns:
         A list of tuples, where each tuple is (chunk_string, (start_line, end_line)).
         Returns empty list if AST positions are not found or on error.
     """
-    source_positions = get_block_source_positions(ast)
-    if not source_positions:
+    return split_markdown_by_blocks(markdown_string, get_block_table(ast))
+
+
+def split_markdown_by_blocks(markdown_string: str | MarkdownDocument, block_table: List[BlockPosition]) -> List[Tuple[str, Tuple[int, int]]]:
+    """Like `split_markdown_by_ast_blocks`, for a table built by `get_block_table`."""
+    document = MarkdownDocument.of(markdown_string)
+    block_starts = sorted({block.start_line for block in block_table if block.start_line <= len(document)})
+    if not block_starts:
         # Fallback or error
         return []
 
-    lines = markdown_string.splitlines(keepends=True)
+    block_starts[0] = 1
+    text, line_starts = document.text, document.line_starts
     chunks = []
-
-    for start_line, end_line in source_positions:
-        if start_line == 0: # Skip if source pos seems invalid (0-indexed from pandoc sometimes)
-            continue
-        # Adjust to 0-indexed for list slicing, lines are 1-indexed from pandoc
-        chunk_lines = lines[start_line - 1 : end_line]
-        chunk_str = "".join(chunk_lines)
-        chunks.append((chunk_str, (start_line, end_line)))
+    for i, start_line in enumerate(block_starts):
+        end_line = block_starts[i + 1] - 1 if i + 1 < len(block_starts) else len(document)
+        chunks.append((text[line_starts[start_line - 1]:line_starts[end_line]], (start_line, end_line)))
 
     return chunks
 
@@ -0,0 +1,396 @@
+import os
+import re
+import select
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+try:
+    from .compile_pool import TIMEOUT_PREFIX
+except ImportError:
+    from compile_pool import TIMEOUT_PREFIX
+
+# Loaded right after \begin{document}: \smdprobecheck raises an error if a chunk left a
+# group, an environment or math mode open, which TeX would otherwise only notice at
+# \end{document}, long after the probe that caused it.
+PROBE_SETUP = r"""\makeatletter
+\edef\smdprobe@level{\the\currentgrouplevel}
+\def\smdprobe@document{document}
+\def\smdprobecheck{%
+  \ifmmode\errmessage{smd-probe: math mode was not closed}\fi
+  \ifx\@currenvir\smdprobe@document\else
+    \errmessage{smd-probe: environment \@currenvir\space was not closed}\fi
+  \ifnum\currentgrouplevel>\smdprobe@level\relax
+    \errmessage{smd-probe: group was not closed}\fi}
+\makeatother
+"""
+# Dumps the format with the \dump primitive, which LaTeX keeps as \@@dump when it redefines \dump.
+DUMP_COMMAND = r"""\makeatletter
+\ifdefined\@@dump\expandafter\@@dump\else\expandafter\dump\fi
+"""
+MARKER_PREFIX = "SMDPROBE"
+JOB_NAME = "smd_probe"
+# Written before every body of a batch run (with its index) and after the last one ("end")
+BATCH_MARKER_PREFIX = "SMDBATCH"
+BATCH_MARKER_RX = re.compile(r"^SMDBATCH (\d+|end)$")
+BATCH_JOB_NAME = "smd_batch"
+# Keeps TeX going after errors, and its error messages short: one line of macro context each
+BATCH_SETUP = r"""\scrollmode
+\errorcontextlines=1
+"""
+DEFAULT_BATCH_TIMEOUT = 120.0
+FORMAT_NAME = "smd_preamble"
+BEGIN_DOCUMENT = "\\begin{document}"
+DEFAULT_PROBE_TIMEOUT = 20.0
+DEFAULT_FORMAT_TIMEOUT = 120.0
+# Engine options that typeset as usual but write no PDF, by engine name. Probes never read the PDF.
+DRAFT_MODE_OPTIONS = {
+    "pdflatex": "-draftmode",
+    "lualatex": "--draftmode",
+    "xelatex": "-no-pdf",
+}
+
+
+def draft_mode_option(engine: str) -> str | None:
+    """Returns the option that keeps a TeX engine from writing its PDF, or None if the engine has none."""
+    name = os.path.splitext(os.path.basename(engine))[0]
+    return DRAFT_MODE_OPTIONS.get(name)
+
+
+def split_latex_preamble(standalone_latex: str) -> str | None:
+    """
+    Returns everything up to and including the `\\begin{document}` line of a standalone
+    LaTeX document, or None if the document has no `\\begin{document}`.
+    """
+    index = standalone_latex.find(BEGIN_DOCUMENT)
+    if index == -1:
+        return None
+    line_end = standalone_latex.find("\n", index)
+    return standalone_latex if line_end == -1 else standalone_latex[:line_end + 1]
+
+
+def build_format(preamble: str, directory: str, engine: str = "pdflatex",
+                 timeout: float = DEFAULT_FORMAT_TIMEOUT) -> Tuple[bool, str]:
+    """
+    Precompiles a LaTeX preamble into a format (.fmt) file.
+
+    The engine runs in ini mode on top of its own LaTeX format (e.g. `&pdflatex`), reads
+    the preamble up to `\\begin{document}` and dumps the result, so every engine started
+    from the format has the document class and all packages loaded already.
+
+    Args:
+        preamble: LaTeX preamble, up to and including `\\begin{document}`.
+        directory: Where the format file is written.
+        engine: TeX engine executable; its format name must match (pdflatex, xelatex).
+        timeout: Seconds to wait for the format to be dumped.
+
+    Returns:
+        (True, path of the .fmt file) on success, (False, error message) otherwise.
+    """
+    with open(os.path.join(directory, FORMAT_NAME + ".tex"), "w", encoding="utf-8") as f:
+        f.write(_strip_begin_document(preamble))
+        f.write(DUMP_COMMAND)
+    try:
+        process = subprocess.run(
+            [engine, "-ini", "-interaction=nonstopmode", f"-jobname={FORMAT_NAME}", f"&{os.path.basename(engine)}", FORMAT_NAME + ".tex"],
+            cwd=directory,
+            capture_output=True,
+            timeout=timeout,
+            check=False
+        )
+    except FileNotFoundError:
+        return False, f"TeX engine '{engine}' not found. Please ensure it is installed and in your PATH."
+    except subprocess.TimeoutExpired:
+        return False, f"Dumping the preamble format took longer than {timeout:g} seconds."
+    format_path = os.path.join(directory, FORMAT_NAME + ".fmt")
+    if process.returncode != 0 or not os.path.exists(format_path):
+        output = process.stdout.decode("utf-8", errors="replace").splitlines()
+        return False, "\n".join(_extract_error_lines(output)) or f"{engine} -ini exited with code {process.returncode}."
+    return True, format_path
+
+
+def typeset_batch(preamble: str, latex_bodies: List[str], engine: str = "pdflatex",
+                  timeout: float = DEFAULT_BATCH_TIMEOUT, format_path: str | None = None,
+                  scratch_dir: str | None = None) -> List[Optional[Tuple[bool, str]]]:
+    """
+    Typesets many chunk bodies in a single engine run and attributes the errors to them.
+
+    The bodies are written one after the other into one document, each preceded by a marker
+    line and followed by the same checks as a PersistentTexEngine probe. TeX runs in scroll
+    mode, so it recovers from errors and keeps going; the "!" error lines printed after a
+    body's marker and before the next one are that body's errors.
+
+    Errors that a body causes can make later bodies fail too (e.g. an environment it left
+    open), and can hide theirs. Only the bodies up to and including the first failing one
+    are typeset exactly like separate probes would be; callers should confirm the failures
+    that come after it.
+
+    Args:
+        preamble: LaTeX preamble, up to and including `\\begin{document}`.
+        latex_bodies: The chunk bodies to typeset.
+        engine: TeX engine executable.
+        timeout: Seconds the whole run may take.
+        format_path: Optional format file with the preamble precompiled (see `build_format`).
+        scratch_dir: Optional directory for the run's working directory; the engine then runs in
+                     draft mode where it has one.
+
+    Returns:
+        Per body, (True, "") if it was typeset without errors, (False, errors) if it raised
+        errors, or None if the run ended (fatal error, timeout, missing engine) before the
+        body was finished.
+    """
+    workdir = tempfile.mkdtemp(prefix="smd-batch-", dir=scratch_dir)
+    try:
+        with open(os.path.join(workdir, BATCH_JOB_NAME + ".tex"), "w", encoding="utf-8") as f:
+            f.write(BEGIN_DOCUMENT + "\n" if format_path else preamble)
+            f.write(PROBE_SETUP)
+            f.write(BATCH_SETUP)
+            for index, body in enumerate(latex_bodies):
+                f.write(f"\\immediate\\write16{{{BATCH_MARKER_PREFIX} {index}}}\n")
+                f.write(body)
+                f.write("\n\\par\\smdprobecheck\n")
+            f.write(f"\\immediate\\write16{{{BATCH_MARKER_PREFIX} end}}\n\\end{{document}}\n")
+        command = [engine, "-interaction=scrollmode", f"-jobname={BATCH_JOB_NAME}"]
+        if format_path:
+            command.append(f"-fmt={format_path}")
+        draft_option = draft_mode_option(engine) if scratch_dir is not None else None
+        if draft_option:
+            command.append(draft_option)
+        command.append(BATCH_JOB_NAME + ".tex")
+        try:
+            # No input: a prompt TeX cannot scroll past (e.g. a missing file) ends the run
+            process = subprocess.run(
+                command,
+                cwd=workdir,
+                env=dict(os.environ, max_print_line="10000"),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+                check=False
+            )
+            output = process.stdout
+        except FileNotFoundError:
+            return [None] * len(latex_bodies)
+        except subprocess.TimeoutExpired as e:
+            output = e.stdout or b""
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return _attribute_batch_output(output.decode("utf-8", errors="replace").splitlines(), len(latex_bodies))
+
+
+def _attribute_batch_output(output_lines: List[str], body_count: int) -> List[Optional[Tuple[bool, str]]]:
+    """Splits the output of a batch run at its markers and turns every body's part into a result."""
+    segments = {}
+    current = None
+    for line in output_lines:
+        match = BATCH_MARKER_RX.match(line.strip().lstrip("*"))
+        if match:
+            current = match.group(1)
+            segments[current] = []
+        elif current is not None:
+            segments[current].append(line)
+    results = []
+    for index in range(body_count):
+        next_key = str(index + 1) if index + 1 < body_count else "end"
+        if str(index) not in segments or next_key not in segments:
+            results.append(None) # The run never finished this body
+            continue
+        error_lines = _extract_error_lines(segments[str(index)])
+        results.append((False, "\n".join(error_lines)) if error_lines else (True, ""))
+    return results
+
+
+def _strip_begin_document(preamble: str) -> str:
+    """Removes the trailing `\\begin{document}` from a preamble."""
+    index = preamble.rfind(BEGIN_DOCUMENT)
+    return preamble if index == -1 else preamble[:index]
+
+
+class PersistentTexEngine:
+    """
+    A long-lived LaTeX process that typesets chunk bodies sent to it over stdin.
+
+    The engine runs in scroll mode: it loads the preamble once, then keeps reading
+    terminal lines, so probing a chunk costs its typesetting time instead of a full
+    engine start plus preamble. After every chunk the engine writes a marker line; the
+    "!" error lines printed before the marker are the chunk's errors. A chunk that
+    fails or times out may leave TeX in a broken state, so the engine is restarted.
+    Starting from a format built by `build_format` makes those restarts cheap too.
+    """
+
+    def __init__(self, preamble: str, engine: str = "pdflatex", probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+                 format_path: str | None = None, scratch_dir: str | None = None):
+        """
+        Args:
+            preamble: LaTeX preamble, up to and including `\\begin{document}`.
+            engine: TeX engine executable, e.g. "pdflatex" or "xelatex".
+            probe_timeout: Seconds to wait for a chunk to be typeset before giving up on it.
+            format_path: Optional format file with the preamble precompiled (see `build_format`).
+            scratch_dir: Optional directory (e.g. on a RAM disk) for the engine's working directory.
+                         The engine then also runs in draft mode where it has one, writing no PDF.
+        """
+        self.preamble = preamble
+        self.engine = engine
+        self.probe_timeout = probe_timeout
+        self.format_path = format_path
+        self.scratch_dir = scratch_dir
+        self.restarts = 0
+        self._process = None
+        self._workdir = None
+        self._buffer = ""
+        self._probe_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self) -> Tuple[bool, str]:
+        """
+        Starts the engine and loads the preamble.
+
+        Returns:
+            (True, "") once the engine is ready for chunks, or (False, error) if the
+            engine cannot be started or the preamble does not compile.
+        """
+        self.close()
+        self._workdir = tempfile.mkdtemp(prefix="smd-tex-", dir=self.scratch_dir)
+        command = [self.engine, "-interaction=scrollmode", f"-jobname={JOB_NAME}"]
+        draft_option = draft_mode_option(self.engine) if self.scratch_dir is not None else None
+        if draft_option:
+            command.append(draft_option)
+        with open(os.path.join(self._workdir, JOB_NAME + ".tex"), "w", encoding="utf-8") as f:
+            if self.format_path:
+                # The format already holds everything before \begin{document}
+                command.append(f"-fmt={self.format_path}")
+                f.write(BEGIN_DOCUMENT + "\n")
+            else:
+                f.write(self.preamble)
+            f.write(PROBE_SETUP)
+        command.append(JOB_NAME + ".tex")
+        # Keep TeX from wrapping long log lines, which would split our marker lines
+        env = dict(os.environ, max_print_line="10000")
+        try:
+            self._process = subprocess.Popen(
+                command,
+                cwd=self._workdir,
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+        except FileNotFoundError:
+            self.close()
+            return False, f"TeX engine '{self.engine}' not found. Please ensure it is installed and in your PATH."
+        success, error = self._finish_probe()
+        if not success:
+            self.close()
+            return False, f"The preamble does not compile:\n{error}"
+        return True, ""
+
+    def probe(self, latex_body: str) -> Tuple[bool, str]:
+        """
+        Typesets a chunk of LaTeX body text.
+
+        Returns:
+            (True, "") if the chunk typesets without errors, (False, error) otherwise.
+        """
+        if self._process is None or self._process.poll() is not None:
+            started, error = self.start()
+            if not started:
+                return False, error
+        try:
+            self._process.stdin.write(latex_body.encode("utf-8"))
+            self._process.stdin.write(b"\n\\par\\smdprobecheck\n")
+            self._process.stdin.flush()
+        except OSError as e:
+            self._restart()
+            return False, f"TeX engine stopped unexpectedly: {e}"
+        success, error = self._finish_probe()
+        if not success:
+            self._restart()
+        return success, error
+
+    def _finish_probe(self) -> Tuple[bool, str]:
+        """Sends the end-of-probe marker and collects the engine output up to it."""
+        self._probe_count += 1
+        marker = f"{MARKER_PREFIX} {self._probe_count}"
+        try:
+            self._process.stdin.write(f"\\immediate\\write16{{{marker}}}\n".encode("utf-8"))
+            self._process.stdin.flush()
+        except OSError as e:
+            return False, f"TeX engine stopped unexpectedly: {e}"
+        output_lines, marker_seen = self._read_until(marker)
+        error_lines = _extract_error_lines(output_lines)
+        if not marker_seen:
+            if self._process.poll() is not None:
+                error_lines.append("TeX engine exited before the chunk was finished.")
+                return False, "\n".join(error_lines)
+            # A timeout comes first, so the result is recognized as one (see `is_timeout`)
+            return False, "\n".join([
+                f"{TIMEOUT_PREFIX}TeX engine did not finish the chunk within {self.probe_timeout:g} seconds "
+                "(runaway argument or infinite loop?).",
+                *error_lines,
+            ])
+        if error_lines:
+            return False, "\n".join(error_lines)
+        return True, ""
+
+    def _read_until(self, marker: str) -> Tuple[List[str], bool]:
+        """Reads engine output lines until the marker line, the timeout, or the end of output."""
+        deadline = time.monotonic() + self.probe_timeout
+        fd = self._process.stdout.fileno()
+        lines = []
+        while True:
+            while "\n" in self._buffer:
+                line, self._buffer = self._buffer.split("\n", 1)
+                if line.strip().lstrip("*") == marker: # TeX may prefix its "*" input prompt
+                    return lines, True
+                lines.append(line)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return lines, False
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                return lines, False
+            data = os.read(fd, 65536)
+            if not data:
+                return lines, False
+            self._buffer += data.decode("utf-8", errors="replace")
+
+    def _restart(self):
+        self.restarts += 1
+        self.close()
+
+    def close(self):
+        """Stops the engine process and removes its working directory."""
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+            for stream in (self._process.stdin, self._process.stdout):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+            self._process = None
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+        self._buffer = ""
+
+
+def _extract_error_lines(output_lines: List[str], context_lines: int = 2) -> List[str]:
+    """Keeps TeX's "!" error lines, plus a few lines of context after each (e.g. the `l.<N>` line)."""
+    kept = []
+    keep_until = -1
+    for i, line in enumerate(output_lines):
+        if line.startswith("! ") or line.startswith("Runaway "):
+            keep_until = i + context_lines
+        if i <= keep_until and line.strip() and line.strip() != "*":
+            kept.append(line)
+    return kept
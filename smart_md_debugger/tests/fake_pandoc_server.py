@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Stand-in for `pandoc server --port <port>`, used to test PandocServer without pandoc.
+
+Answers POST / like pandoc's server with Accept: application/json: the output is the input
+text prefixed with "<from>-><to>:" (the AST for "json" conversions is an empty document), and
+text containing \\bad fails with status 500. Keeps connections alive, as pandoc's server does.
+With FAKE_PANDOC_SERVER_LOG_BYTES set, every request also writes that many bytes to stderr.
+"""
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        log_bytes = int(os.environ.get("FAKE_PANDOC_SERVER_LOG_BYTES", 0))
+        if log_bytes:
+            sys.stderr.write("x" * log_bytes)
+            sys.stderr.flush()
+        params = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if "\\bad" in params["text"]:
+            self._send(500, "Undefined control sequence \\bad")
+        elif params["to"] == "json":
+            self._send(200, json.dumps({"output": json.dumps({"blocks": [], "from": params["from"]}),
+                                        "base64": False, "messages": []}))
+        else:
+            standalone = "standalone:" if params.get("standalone") else ""
+            output = f"{standalone}{params['from']}->{params['to']}:{params['text']}"
+            self._send(200, json.dumps({"output": output, "base64": False, "messages": []}))
+
+    def _send(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+if sys.argv[1:2] != ["server"]:
+    sys.exit(f"{sys.argv[0]}: unknown command {sys.argv[1:2]}")
+port = int(sys.argv[sys.argv.index("--port") + 1])
+ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Stand-in for pdflatex in scroll mode, used to test PersistentTexEngine without TeX.
+
+Typesets the file given as last argument, then reads terminal lines from stdin, printing
+TeX's "*" prompt before each, until \\end{document}. \\immediate\\write16{...} prints its
+argument on its own line, \\bad produces an "Undefined control sequence" error, and \\loop
+never returns.
+
+With -ini, the file is "dumped" into <jobname>.fmt instead; with -fmt=<path>, the
+format's contents are loaded before the file.
+"""
+import re
+import sys
+import time
+
+
+def error(message, line):
+    sys.stdout.write(f"\n! {message}\nl.1 {line}\n")
+
+
+options = dict(arg[1:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("-") and "=" in arg)
+with open(sys.argv[-1], encoding="utf-8") as source:
+    text = source.read()
+if "-ini" in sys.argv:
+    if "\\brokenpreamble" in text:
+        error("Undefined control sequence.", "\\brokenpreamble")
+        sys.exit(1)
+    with open(options["jobname"] + ".fmt", "w", encoding="utf-8") as fmt:
+        fmt.write(text)
+    sys.exit(0)
+if "fmt" in options:
+    with open(options["fmt"], encoding="utf-8") as fmt:
+        text = fmt.read() + text
+if "\\brokenpreamble" in text:
+    error("Undefined control sequence.", "\\brokenpreamble")
+
+
+def typeset(line):
+    if "\\loop" in line:
+        time.sleep(3600)
+    if "\\bad" in line:
+        error("Undefined control sequence.", line.strip())
+    for message in re.findall(r"\\immediate\\write16\{([^}]*)\}", line):
+        sys.stdout.write(f"\n{message}\n")
+    if line.strip() == "\\end{document}":
+        sys.stdout.flush()
+        sys.exit(0)
+
+
+for line in text.splitlines():
+    typeset(line)
+while True:
+    sys.stdout.write("*")
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        break
+    typeset(line)
@@ -0,0 +1,139 @@
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from smart_md_debugger.benchmarks import bench_linter, run_benchmarks
+from smart_md_debugger.benchmarks.corpus import ERROR_TYPES, InjectedError, count_errors, generate_document
+from smart_md_debugger.src import debugger, linter
+
+STUB_PANDOC = run_benchmarks.STUB_PANDOC
+TEST_DIR = os.path.dirname(__file__)
+
+
+def run_stub(args, text, env=None):
+    return subprocess.run([sys.executable, STUB_PANDOC, *args], input=text, capture_output=True,
+                          text=True, env={**os.environ, **(env or {})})
+
+
+class TestCorpus(unittest.TestCase):
+    def test_document_has_requested_size_and_errors(self):
+        document, errors = generate_document(300, errors_per_type=2, seed=3)
+        self.assertGreaterEqual(len(document.splitlines()), 300)
+        self.assertEqual(count_errors(errors), dict.fromkeys(ERROR_TYPES, 2))
+        self.assertEqual(errors, sorted(errors, key=lambda error: error.line))
+
+    def test_errors_are_on_reported_lines(self):
+        document, errors = generate_document(200, seed=1)
+        lines = document.splitlines()
+        snippets = {"undefined-command": "\\undefinedcommand", "unclosed-environment": "\\begin{enumerate}",
+                    "unbalanced-brace": "is never closed"}
+        for error in errors:
+            self.assertIn(snippets[error.type], lines[error.line - 1])
+
+    def test_generation_is_reproducible(self):
+        self.assertEqual(generate_document(150, seed=7), generate_document(150, seed=7))
+        self.assertNotEqual(generate_document(150, seed=7)[0], generate_document(150, seed=8)[0])
+
+    def test_accuracy(self):
+        errors = [InjectedError("undefined-command", 10), InjectedError("unbalanced-brace", 40)]
+        accuracy = run_benchmarks.localization_accuracy([(9, 11), (20, 20)], errors)
+        self.assertEqual(accuracy["found"], 1)
+        self.assertEqual(accuracy["recall"], 0.5)
+        self.assertEqual(accuracy["precision"], 0.5)
+        self.assertEqual(accuracy["excess_lines"], 3)
+
+
+class TestStubPandoc(unittest.TestCase):
+    def compile(self, text):
+        return run_stub(["-f", "markdown", "-t", "pdf", "-o", os.devnull], text)
+
+    def test_valid_document_compiles(self):
+        with open(os.path.join(TEST_DIR, "test_valid_document.md"), encoding="utf-8") as f:
+            self.assertEqual(self.compile(f.read()).returncode, 0)
+
+    def test_errors_fail_like_pandoc(self):
+        for text in ("Some \\undefinedcommand here.\n", "\\begin{itemize}\n\\item a\n", "$x^{2$\n"):
+            result = self.compile(text)
+            self.assertEqual(result.returncode, 43, text)
+            self.assertIn("Error producing PDF.", result.stderr)
+
+    def test_generated_documents_fail_only_on_injected_errors(self):
+        document, errors = generate_document(120, seed=2)
+        lines = document.splitlines()
+        self.assertEqual(self.compile(document).returncode, 43)
+        for error in errors:
+            lines[error.line - 1] = "Nothing to see here."
+        self.assertEqual(self.compile("\n".join(lines) + "\n").returncode, 0)
+
+    def test_json_has_source_positions(self):
+        result = run_stub(["-f", "commonmark_x+sourcepos", "-t", "json"], "# Title\n\nOne\ntwo\n\nThree\n")
+        ast = json.loads(result.stdout)
+        self.assertEqual(len(ast["blocks"]), 3)
+        self.assertIn(["data-pos", "3:1-4:4"], ast["blocks"][1]["c"][0][2])
+
+
+class TestRunBenchmarks(unittest.TestCase):
+    def test_small_run_finds_every_error(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = os.path.join(temp_dir, "report.json")
+            corpus_dir = os.path.join(temp_dir, "corpus")
+            status = run_benchmarks.main(["--lines", "60", "--strategies", "hierarchical", "--searches", "linear",
+                                          "--caches", "none", "warm", "-j", "2", "--output", output,
+                                          "--save-corpus", corpus_dir])
+            self.assertEqual(status, 0)
+            with open(output, encoding="utf-8") as f:
+                report = json.load(f)
+            self.assertEqual(report["backend"], "simulated")
+            self.assertEqual(len(report["results"]), 2)
+            for result in report["results"]:
+                self.assertEqual(result["accuracy"]["recall"], 1.0)
+                self.assertEqual(set(result["stage_seconds"]), set(debugger.STAGES))
+            cold, warm = report["results"]
+            self.assertGreater(cold["pandoc_invocations"]["total"], 0)
+            self.assertLess(warm["pandoc_invocations"]["total"], cold["pandoc_invocations"]["total"])
+            self.assertTrue(os.path.exists(os.path.join(corpus_dir, "bench_60_lines.md")))
+
+
+class TestBenchLinter(unittest.TestCase):
+    def test_per_line_cost(self):
+        (result,) = bench_linter.run_benchmark([100], repeat=1, seed=0, baseline=linter)
+        self.assertEqual(result["lines"], len(generate_document(100, seed=0)[0].splitlines()))
+        self.assertGreater(result["us_per_line"], 0)
+        self.assertGreater(result["speedup"], 0)
+        self.assertTrue(result["same_findings"])
+
+    def test_findings_are_compared(self):
+        class EmptyLinter:
+            @staticmethod
+            def lint_markdown(content):
+                return []
+        (result,) = bench_linter.run_benchmark([100], repeat=1, seed=0, baseline=EmptyLinter)
+        self.assertFalse(result["same_findings"])
+
+    def test_code_appendix_is_not_linted(self):
+        (plain,) = bench_linter.run_benchmark([100], repeat=1, seed=0)
+        (with_code,) = bench_linter.run_benchmark([100], repeat=1, seed=0, code_lines=50)
+        self.assertEqual(with_code["lines"], plain["lines"] + 53)
+        self.assertEqual(with_code["findings"], plain["findings"])
+
+    @unittest.skipUnless(subprocess.run(["git", "rev-parse", "HEAD"], cwd=TEST_DIR, capture_output=True).returncode == 0,
+                         "needs a git checkout")
+    def test_compare_loads_the_modules_of_the_revision(self):
+        # HEAD's linter imports region_mask and document, which must come from HEAD as well
+        baseline = bench_linter.load_linter_at("HEAD")
+        self.assertIn(baseline.__package__ + ".region_mask", sys.modules)
+        self.assertIsNot(baseline.MarkdownDocument, linter.MarkdownDocument)
+        (result,) = bench_linter.run_benchmark([100], repeat=1, seed=0, baseline=baseline)
+        self.assertTrue(result["same_findings"])
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            self.assertEqual(bench_linter.main(["--lines", "50", "--repeat", "1", "--compare", "HEAD", "--json"]), 0)
+        self.assertEqual(json.loads(stdout.getvalue())["compare"], "HEAD")
+
+
+if __name__ == "__main__":
+    unittest.main()
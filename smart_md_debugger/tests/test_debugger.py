@@ -0,0 +1,900 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from smart_md_debugger.src import debugger
+from smart_md_debugger.src.compile_pool import TIMEOUT_PREFIX, CompilePool, is_timeout
+from smart_md_debugger.src.compile_cache import CompileCache
+from smart_md_debugger.src.ast_cache import AstCache
+from smart_md_debugger.src.tex_engine import (
+    PersistentTexEngine,
+    build_format,
+    draft_mode_option,
+    split_latex_preamble,
+    typeset_batch,
+)
+from smart_md_debugger.src.run_state import RunState
+from smart_md_debugger.src.pandoc_server import PandocServer
+from smart_md_debugger.src.compiler_backend import SimulatedBackend
+from smart_md_debugger.src.splitter import get_block_table
+from smart_md_debugger.src.source_map import LatexSourceMap, mark_chunks, parse_tex_error_line
+
+FAKE_TEX_ENGINE = os.path.join(os.path.dirname(__file__), "fake_tex_engine.py")
+FAKE_PANDOC_SERVER = os.path.join(os.path.dirname(__file__), "fake_pandoc_server.py")
+
+
+def fake_compile(markdown_string: str, output_pdf_path: str = "temp_output.pdf", cache=None, **options) -> tuple[bool, str]:
+    """Stands in for pandoc: any chunk containing \\bad fails to compile."""
+    if "\\bad" in markdown_string:
+        return False, "! Undefined control sequence."
+    return True, ""
+
+
+def fake_ast_for_blocks(block_ranges: list[tuple[int, int]]) -> dict:
+    """Builds a minimal pandoc AST of paragraphs wrapped in Divs with the given data-pos ranges."""
+    return {
+        "pandoc-api-version": [1, 23, 1],
+        "meta": {},
+        "blocks": [
+            {"t": "Div", "c": [["", [], [["data-pos", f"{start}:1-{end}:2"]]], [{"t": "Para", "c": []}]]}
+            for start, end in block_ranges
+        ],
+    }
+
+
+DOCUMENT = """Intro line one.
+Intro line two.
+
+Para with \\bad command.
+And its second line.
+Third line.
+Fourth line, also \\bad.
+Fifth line.
+
+Closing paragraph.
+"""
+BLOCKS = [(1, 2), (4, 8), (10, 10)]
+
+
+def fake_blocks(block_ranges: list[tuple[int, int]]) -> list:
+    """The block table of `fake_ast_for_blocks`, as `get_markdown_blocks` returns it."""
+    return get_block_table(fake_ast_for_blocks(block_ranges))
+
+
+class TestCompilePool(unittest.TestCase):
+
+    def test_results_keep_submission_order(self):
+        inputs = [f"chunk {i} \\bad" if i % 3 == 0 else f"chunk {i}" for i in range(20)]
+        with CompilePool(fake_compile, workers=4) as pool:
+            results = pool.compile_all(inputs)
+        self.assertEqual(results, [fake_compile(s) for s in inputs])
+
+    def test_submitted_compilations_can_be_cancelled(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_compile(markdown_string, output_pdf_path):
+            started.set()
+            release.wait(timeout=5)
+            return True, ""
+
+        with CompilePool(blocking_compile, workers=2) as pool:
+            futures = pool.submit_all(["a", "b", "c", "d"])
+            started.wait(timeout=5)
+            self.assertTrue(futures[-1].cancel()) # Both workers are busy with the first two
+            release.set()
+            self.assertEqual(futures[0].result(), (True, ""))
+        with CompilePool(fake_compile) as pool:
+            self.assertEqual([f.result() for f in pool.submit_all(["a", "\\bad"])], [fake_compile("a"), fake_compile("\\bad")])
+
+    def test_progress_counts_every_compilation(self):
+        progress = []
+        lock = threading.Lock()
+
+        def record(finished, submitted):
+            with lock:
+                progress.append((finished, submitted))
+
+        with CompilePool(fake_compile, workers=3, on_progress=record) as pool:
+            results = pool.imap([f"chunk {i}" for i in range(6)])
+            self.assertEqual(pool.submitted, 6) # Submitted before the first result is requested
+            self.assertEqual(len(list(results)), 6)
+            pool.compile_one("one more")
+        self.assertEqual(sorted(finished for finished, _ in progress), list(range(1, 8)))
+        self.assertEqual(max(progress), (7, 7))
+        self.assertTrue(all(finished <= submitted for finished, submitted in progress))
+
+    def test_workers_get_own_scratch_directories(self):
+        seen = set()
+        lock = threading.Lock()
+
+        def recording_compile(markdown_string, output_pdf_path):
+            with lock:
+                seen.add(os.path.dirname(output_pdf_path))
+            return True, ""
+
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            with CompilePool(recording_compile, workers=3, scratch_dir=scratch_dir) as pool:
+                pool.compile_all([f"chunk {i}" for i in range(12)])
+                self.assertEqual({os.path.dirname(directory) for directory in seen}, {scratch_dir})
+                self.assertEqual(len(os.listdir(scratch_dir)), len(seen))
+            self.assertEqual(os.listdir(scratch_dir), []) # Removed with the pool
+
+    def test_each_worker_uses_its_own_output_path(self):
+        seen = {}
+        lock = threading.Lock()
+        barrier = threading.Barrier(3)
+
+        def recording_compile(markdown_string, output_pdf_path):
+            barrier.wait(timeout=5) # Force three compilations to overlap
+            with lock:
+                seen.setdefault(threading.get_ident(), set()).add(output_pdf_path)
+            return True, ""
+
+        with CompilePool(recording_compile, workers=3) as pool:
+            pool.compile_all(["a", "b", "c"])
+        paths = [path for thread_paths in seen.values() for path in thread_paths]
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(len(paths), len(set(paths)))
+
+
+class TestCompileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def test_cached_result_skips_pandoc(self):
+        cache = CompileCache(self.cache_dir.name)
+        failed_run = subprocess.CompletedProcess([], 43, stdout="", stderr="Error producing PDF.\n! LaTeX Error: Oops.\n")
+        with mock.patch.object(debugger, "get_pandoc_version", return_value="pandoc 3.1"), \
+             mock.patch.object(debugger, "_run_killable", return_value=failed_run) as run:
+            first = debugger.compile_markdown_to_pdf("\\oops", "out.pdf", cache=cache)
+            second = debugger.compile_markdown_to_pdf("\\oops", "other.pdf", cache=cache)
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual((first[0], first[1].splitlines()[0]), (False, "! LaTeX Error: Oops."))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_scratch_compilation_discards_pdf(self):
+        finished = subprocess.CompletedProcess([], 0, stdout="", stderr="")
+        with mock.patch.object(debugger, "_run_killable", return_value=finished) as run:
+            result = debugger.compile_markdown_to_pdf("Text", "/dev/shm/smd-worker-1/probe.pdf", scratch=True)
+        self.assertEqual(result, (True, ""))
+        command, _, _, env = run.call_args.args
+        self.assertEqual(command[-2:], ["-o", os.devnull])
+        self.assertEqual(env["TMPDIR"], "/dev/shm/smd-worker-1")
+
+    def test_key_depends_on_pandoc_version_and_args(self):
+        key = CompileCache.make_key("text", "pandoc 3.1", ["-t", "pdf"])
+        self.assertNotEqual(key, CompileCache.make_key("text", "pandoc 3.2", ["-t", "pdf"]))
+        self.assertNotEqual(key, CompileCache.make_key("text", "pandoc 3.1", ["-t", "latex"]))
+        self.assertNotEqual(key, CompileCache.make_key("text!", "pandoc 3.1", ["-t", "pdf"]))
+
+    def test_evicts_least_recently_used(self):
+        cache = CompileCache(self.cache_dir.name, max_entries=2)
+        cache.put("a", True, "")
+        cache.put("b", False, "err")
+        cache.get("a") # "b" is now the least recently used entry
+        cache.put("c", True, "")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), (True, ""))
+        self.assertEqual(len(cache), 2)
+
+    def test_persists_and_clears(self):
+        CompileCache(self.cache_dir.name).put("a", False, "err")
+        reopened = CompileCache(self.cache_dir.name)
+        self.assertEqual(reopened.get("a"), (False, "err"))
+        reopened.clear()
+        self.assertEqual(len(reopened), 0)
+
+
+class TestAstCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def test_warm_run_skips_pandoc(self):
+        cache = AstCache(self.cache_dir.name)
+        with mock.patch.object(debugger, "get_pandoc_version", return_value="pandoc 3.1"), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(BLOCKS), "")) as get_blocks:
+            cold = debugger.get_document_blocks(DOCUMENT, ast_cache=cache)
+            warm = debugger.get_document_blocks(DOCUMENT, ast_cache=AstCache(self.cache_dir.name))
+        self.assertEqual(get_blocks.call_count, 1)
+        self.assertEqual(cold, warm)
+        self.assertEqual([(block.type, block.start_line, block.end_line) for block in warm[0]],
+                         [("Div", 1, 2), ("Div", 4, 8), ("Div", 10, 10)])
+
+    def test_failed_ast_is_not_cached(self):
+        cache = AstCache(self.cache_dir.name)
+        with mock.patch.object(debugger, "get_markdown_blocks", return_value=(None, "Parse error")):
+            self.assertEqual(debugger.get_document_blocks(DOCUMENT, ast_cache=cache), (None, "Parse error"))
+        self.assertEqual(len(cache), 0)
+
+    def test_key_depends_on_pandoc_version_and_reader(self):
+        key = AstCache.make_key("text", "pandoc 3.1", "commonmark_x")
+        self.assertNotEqual(key, AstCache.make_key("text", "pandoc 3.2", "commonmark_x"))
+        self.assertNotEqual(key, AstCache.make_key("text", "pandoc 3.1", "markdown"))
+        self.assertNotEqual(key, AstCache.make_key("text!", "pandoc 3.1", "commonmark_x"))
+
+    def test_evicts_least_recently_used(self):
+        cache = AstCache(self.cache_dir.name, max_entries=2)
+        cache.put("a", [])
+        cache.put("b", [])
+        os.utime(os.path.join(cache.cache_dir, "a.marshal"), (0, 0))
+        os.utime(os.path.join(cache.cache_dir, "b.marshal"), (1, 1))
+        cache.put("c", [])
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), [])
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestPersistentTexEngine(unittest.TestCase):
+
+    PREAMBLE = "\\documentclass{article}\n\\begin{document}\n"
+
+    def test_probes_reuse_one_engine(self):
+        with PersistentTexEngine(self.PREAMBLE, FAKE_TEX_ENGINE) as engine:
+            self.assertEqual(engine.start(), (True, ""))
+            self.assertEqual(engine.probe("Some \\textbf{text}."), (True, ""))
+            self.assertEqual(engine.probe("More text."), (True, ""))
+            self.assertEqual(engine.restarts, 0)
+
+    def test_failing_probe_reports_error_and_restarts(self):
+        with PersistentTexEngine(self.PREAMBLE, FAKE_TEX_ENGINE) as engine:
+            success, error = engine.probe("A \\bad command.")
+            self.assertFalse(success)
+            self.assertIn("! Undefined control sequence.", error)
+            self.assertEqual(engine.restarts, 1)
+            self.assertEqual(engine.probe("Fine again."), (True, ""))
+
+    def test_hanging_probe_times_out(self):
+        with PersistentTexEngine(self.PREAMBLE, FAKE_TEX_ENGINE, probe_timeout=0.5) as engine:
+            success, error = engine.probe("\\loop")
+            self.assertFalse(success)
+            self.assertIn("did not finish", error)
+            self.assertEqual(engine.probe("Fine again."), (True, ""))
+
+    def test_start_failures(self):
+        with PersistentTexEngine(self.PREAMBLE + "\\brokenpreamble\n", FAKE_TEX_ENGINE) as engine:
+            success, error = engine.start()
+            self.assertFalse(success)
+            self.assertIn("preamble does not compile", error)
+        with PersistentTexEngine(self.PREAMBLE, "no-such-tex-engine") as engine:
+            self.assertEqual(engine.start()[0], False)
+
+    def test_engine_starts_from_precompiled_format(self):
+        with tempfile.TemporaryDirectory() as format_dir:
+            built, format_path = build_format(self.PREAMBLE, format_dir, FAKE_TEX_ENGINE)
+            self.assertTrue(built)
+            with open(format_path, encoding="utf-8") as f:
+                self.assertNotIn("\\begin{document}", f.read())
+            # The preamble itself is not read again once a format is given
+            with PersistentTexEngine(self.PREAMBLE + "\\brokenpreamble\n", FAKE_TEX_ENGINE, format_path=format_path) as engine:
+                self.assertEqual(engine.start(), (True, ""))
+                self.assertEqual(engine.probe("Text."), (True, ""))
+
+    def test_engine_works_in_scratch_dir_without_pdf(self):
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            with PersistentTexEngine(self.PREAMBLE, FAKE_TEX_ENGINE, scratch_dir=scratch_dir) as engine:
+                self.assertEqual(engine.probe("Text."), (True, ""))
+                self.assertEqual(os.path.dirname(engine._workdir), scratch_dir)
+            self.assertEqual(os.listdir(scratch_dir), [])
+        self.assertEqual(draft_mode_option("/usr/bin/pdflatex"), "-draftmode")
+        self.assertEqual(draft_mode_option("xelatex"), "-no-pdf")
+        self.assertIsNone(draft_mode_option(FAKE_TEX_ENGINE))
+
+    def test_build_format_failure(self):
+        with tempfile.TemporaryDirectory() as format_dir:
+            built, error = build_format("\\brokenpreamble\n\\begin{document}\n", format_dir, FAKE_TEX_ENGINE)
+            self.assertFalse(built)
+            self.assertIn("Undefined control sequence", error)
+            self.assertFalse(build_format(self.PREAMBLE, format_dir, "no-such-tex-engine")[0])
+
+    def test_split_latex_preamble(self):
+        document = "\\documentclass{article}\n\\usepackage{amsmath}\n\\begin{document}\nBody\n\\end{document}\n"
+        self.assertEqual(split_latex_preamble(document), "\\documentclass{article}\n\\usepackage{amsmath}\n\\begin{document}\n")
+        self.assertIsNone(split_latex_preamble("Body only"))
+
+
+class TestPandocServer(unittest.TestCase):
+
+    def test_conversions_reuse_one_connection(self):
+        with PandocServer(FAKE_PANDOC_SERVER) as server:
+            results = [server.convert(f"Text {i}", "markdown", "latex") for i in range(5)]
+            self.assertEqual(results[3], (True, "markdown->latex:Text 3"))
+            self.assertEqual(server.convert("A \\bad one", "markdown", "latex"), (False, "Undefined control sequence \\bad"))
+            self.assertEqual((server.requests, server.connections_opened), (6, 1))
+
+    def test_threads_get_their_own_connections(self):
+        with PandocServer(FAKE_PANDOC_SERVER) as server:
+            threads = [threading.Thread(target=server.convert, args=("Text", "markdown", "latex")) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual((server.requests, server.connections_opened), (3, 3))
+
+    def test_conversions_fall_back_to_subprocess(self):
+        finished = subprocess.CompletedProcess([], 0, stdout="\\section{Title}\n", stderr="")
+        with PandocServer("no-such-pandoc") as server, \
+             mock.patch.object(debugger.subprocess, "run", return_value=finished) as run, \
+             mock.patch("sys.stderr"):
+            self.assertIsNone(server.convert("# Title", "markdown", "latex"))
+            self.assertFalse(server.available)
+            self.assertEqual(debugger.convert_markdown_to_latex("# Title", server=server), (True, "\\section{Title}\n"))
+        self.assertEqual(run.call_count, 1)
+
+    def test_startup_error_includes_server_output(self):
+        # `python server --port ...` exits right away, complaining that there is no file "server"
+        with PandocServer(sys.executable) as server, mock.patch("sys.stderr"):
+            self.assertFalse(server.start()[0])
+        self.assertIn("exited with code 2", server.error)
+        self.assertIn("can't open file", server.error) # Python's message, read from the server's log
+
+    def test_server_log_does_not_block_conversions(self):
+        # 1 MB of log, far more than a pipe buffer holds
+        with mock.patch.dict(os.environ, {"FAKE_PANDOC_SERVER_LOG_BYTES": str(64 * 1024)}), \
+             PandocServer(FAKE_PANDOC_SERVER, request_timeout=10) as server:
+            results = [server.convert(f"Text {i}", "markdown", "latex") for i in range(16)]
+        self.assertEqual(results[-1], (True, "markdown->latex:Text 15"))
+        self.assertTrue(server.available)
+
+    def test_debugger_conversions_use_the_server(self):
+        with PandocServer(FAKE_PANDOC_SERVER) as server, \
+             mock.patch.object(debugger.subprocess, "run") as run:
+            ast, error = debugger.get_markdown_ast("# Title", server=server)
+            converted = debugger.convert_markdown_to_latex("# Title", standalone=True, server=server)
+        run.assert_not_called()
+        self.assertEqual((ast, error), ({"blocks": [], "from": "commonmark_x+sourcepos"}, ""))
+        self.assertEqual(converted, (True, "standalone:markdown->latex:# Title"))
+
+
+class TestSimulatedBackend(unittest.TestCase):
+    DOCUMENT = """# Title
+
+Intro with \\textbf{bold} text.
+
+```python
+print("\\not a command")
+```
+
+Para with \\undefinedthing here.
+Second line.
+Third line.
+Fourth line.
+
+\\begin{itemize}
+\\item Closed.
+\\end{itemize}
+
+Closing $x^{2}$ paragraph.
+"""
+
+    def run_debugger(self, backend, **kwargs):
+        with mock.patch.object(debugger.subprocess, "Popen") as popen, \
+             mock.patch.object(debugger.subprocess, "run") as run:
+            result = debugger.find_error_ranges(self.DOCUMENT, backend=backend, **kwargs)
+        popen.assert_not_called()
+        run.assert_not_called()
+        return result
+
+    def test_compilation_fails_like_pandoc(self):
+        result = debugger.compile_markdown_to_pdf("Text \\undefinedthing.\n", backend=SimulatedBackend())
+        self.assertEqual(result, (False, "Error producing PDF.\n! Undefined control sequence.\nl.3 Text \\undefinedthing\n"))
+        self.assertEqual(parse_tex_error_line(result[1]), (3, "Text \\undefinedthing"))
+        for markdown, message in [("\\begin{itemize}\n\\item a\n", "\\begin{itemize} on input line 1 ended by \\end{document}"),
+                                  ("\\begin{foo}\n\\end{foo}\n", "Environment foo undefined"),
+                                  ("$x^{2$\n", "Missing } inserted")]:
+            converted, error = debugger.compile_markdown_to_pdf(markdown, backend=SimulatedBackend())
+            self.assertFalse(converted)
+            self.assertIn(message, error)
+        self.assertEqual(debugger.compile_markdown_to_pdf("`\\code` and\n```\n\\code\n```\n", backend=SimulatedBackend()), (True, ""))
+
+    def test_errors_and_patterns_are_configurable(self):
+        self.assertEqual(debugger.compile_markdown_to_pdf("\\undefinedthing\n", backend=SimulatedBackend(errors=["unbalanced-brace"])),
+                         (True, ""))
+        backend = SimulatedBackend(patterns={r"\\input\{": "! LaTeX Error: File `missing.tex' not found."})
+        converted, error = debugger.compile_markdown_to_pdf("Text.\n\\input{missing}\n", backend=backend)
+        self.assertIn("File `missing.tex' not found.", error)
+        with self.assertRaises(ValueError):
+            SimulatedBackend(errors=["typo"])
+
+    def test_hangs_and_latency_time_out(self):
+        cache = mock.Mock(make_key=mock.Mock(return_value="key"), get=mock.Mock(return_value=None))
+        hanging = SimulatedBackend(hang_patterns=[r"\\loop"])
+        self.assertTrue(is_timeout(debugger.compile_markdown_to_pdf("\\loop\n", cache=cache, backend=hanging)))
+        cache.put.assert_not_called()
+        slow = SimulatedBackend(latency=1.0)
+        self.assertTrue(is_timeout(debugger.compile_markdown_to_pdf("Text\n", timeout=0.01, backend=slow)))
+        self.assertEqual(slow.invocations, {"pdf": 1})
+
+    def test_blocks_have_source_positions(self):
+        blocks, error = debugger.get_markdown_blocks(self.DOCUMENT, backend=SimulatedBackend())
+        self.assertEqual(error, "")
+        self.assertEqual([(block.start_line, block.end_line) for block in blocks],
+                         [(1, 1), (3, 3), (5, 7), (9, 12), (14, 16), (18, 18)])
+        self.assertEqual(debugger.convert_markdown_to_latex("# Title\n", backend=SimulatedBackend()), (True, "\\section{Title}\n"))
+
+    def test_debugger_runs_without_pandoc(self):
+        backend = SimulatedBackend()
+        stats = debugger.DebugStats()
+        good, bad, error = self.run_debugger(backend, stats=stats, workers=2)
+        self.assertEqual(bad, [(9, 9)])
+        self.assertIn("! Undefined control sequence.", error)
+        self.assertEqual(good, [(1, 8), (10, 18)])
+        self.assertEqual(backend.invocations["pdf"], stats.total_compilations)
+        for kwargs in ({"search": "bisect"}, {"strategy": "hierarchical"}, {"guided": True}):
+            self.assertEqual(self.run_debugger(SimulatedBackend(), **kwargs)[1], [(9, 9)], kwargs)
+
+    def test_cache_keys_depend_on_backend(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = CompileCache(cache_dir)
+            self.addCleanup(cache.close)
+            with mock.patch.object(debugger, "get_pandoc_version", return_value="pandoc 3.1"), \
+                 mock.patch.object(debugger, "_run_killable", return_value=subprocess.CompletedProcess([], 0, "", "")):
+                self.assertEqual(debugger.compile_markdown_to_pdf("\\undefinedthing\n", cache=cache), (True, ""))
+            self.assertFalse(debugger.compile_markdown_to_pdf("\\undefinedthing\n", cache=cache, backend=SimulatedBackend())[0])
+
+
+class TestFindErrorRanges(unittest.TestCase):
+
+    def run_debugger(self, **kwargs):
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=fake_compile), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(BLOCKS), "")):
+            return debugger.find_error_ranges(DOCUMENT, **kwargs)
+
+    def test_localizes_failing_lines_within_block(self):
+        good, bad, initial_error = self.run_debugger()
+        self.assertEqual(bad, [(4, 4), (7, 7)])
+        self.assertEqual(good, [(1, 3), (5, 6), (8, 10)]) # Blank lines belong to the block before them
+        self.assertIn("Undefined control sequence", initial_error)
+
+    def test_parallel_results_match_sequential(self):
+        sequential = self.run_debugger(workers=1)
+        for workers in (2, 4, 8):
+            self.assertEqual(self.run_debugger(workers=workers), sequential)
+
+    def test_two_stage_probe_matches_pdf_probe(self):
+        def fake_convert(markdown_string, standalone=False, server=None, backend=None):
+            if standalone:
+                return True, "\\documentclass{article}\n\\begin{document}\n" + markdown_string + "\\end{document}\n"
+            return True, markdown_string
+
+        with mock.patch.object(debugger, "convert_markdown_to_latex", side_effect=fake_convert), \
+             mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=fake_compile) as compile_pdf, \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(BLOCKS), "")):
+            two_stage = debugger.find_error_ranges(DOCUMENT, probe="two-stage", tex_engine=FAKE_TEX_ENGINE, workers=2)
+        self.assertEqual(compile_pdf.call_count, 1) # Only the whole document is compiled to PDF
+        self.assertEqual(two_stage, self.run_debugger(probe="pdf"))
+
+    def test_format_probe_builds_format_once(self):
+        probe = debugger.TwoStageProbe(TestPersistentTexEngine.PREAMBLE, FAKE_TEX_ENGINE, precompile=True)
+        self.addCleanup(probe.close)
+        with mock.patch.object(debugger, "convert_markdown_to_latex", side_effect=lambda md, server=None, backend=None: (True, md)), \
+             mock.patch.object(debugger, "build_format", wraps=debugger.build_format) as build:
+            with CompilePool(probe, workers=3) as pool:
+                results = pool.compile_all(["Fine.", "A \\bad one.", "Fine too.", "More."] * 3)
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual([success for success, _ in results], [True, False, True, True] * 3)
+        self.assertEqual(probe.format_error, "")
+
+    def test_two_stage_probe_stage_one_failure_skips_engine(self):
+        probe = debugger.TwoStageProbe("\\begin{document}\n", "no-such-tex-engine")
+        with mock.patch.object(debugger, "convert_markdown_to_latex", return_value=(False, "YAML parse exception")):
+            self.assertEqual(probe("---\nbad: [yaml\n---\n"), (False, "YAML parse exception"))
+        self.assertEqual(probe.engine_error, "")
+
+    def test_ast_is_extracted_during_full_compilation(self):
+        both_running = threading.Barrier(2)
+
+        def waiting_compile(markdown_string, output_pdf_path="temp_output.pdf", cache=None, **options):
+            if markdown_string == DOCUMENT:
+                both_running.wait(timeout=5) # Breaks unless the AST is requested meanwhile
+            return fake_compile(markdown_string)
+
+        def waiting_blocks(markdown_string, reader="commonmark_x", server=None, backend=None):
+            both_running.wait(timeout=5)
+            return fake_blocks(BLOCKS), ""
+
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=waiting_compile), \
+             mock.patch.object(debugger, "get_markdown_blocks", side_effect=waiting_blocks):
+            good, bad, _ = debugger.find_error_ranges(DOCUMENT)
+        self.assertEqual(bad, [(4, 4), (7, 7)])
+
+    def test_speculative_probes_match_regular_run(self):
+        self.assertEqual(self.run_debugger(workers=4, speculative=True), self.run_debugger(workers=4))
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", return_value=(True, "")), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(BLOCKS), "")):
+            self.assertEqual(debugger.find_error_ranges(DOCUMENT, workers=4, speculative=True), ([(1, 10)], [], ""))
+
+    def test_pandoc_output_is_consumed_while_it_is_written(self):
+        upper = [sys.executable, "-c", "import sys\nfor line in sys.stdin: sys.stdout.write(line.upper())"]
+        pieces = []
+        document = "line\n" * 100000 # More than a pipe holds, in both directions
+        self.assertEqual(debugger._stream_pandoc_output(upper, document, pieces.append), (True, ""))
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces), document.upper())
+        failing = [sys.executable, "-c", "import sys; sys.stdin.read(); sys.exit('Parse error')"]
+        self.assertEqual(debugger._stream_pandoc_output(failing, "Text", pieces.append), (False, "Parse error\n"))
+
+    def test_blocks_from_server_output(self):
+        with PandocServer(FAKE_PANDOC_SERVER) as server:
+            self.assertEqual(debugger.get_markdown_blocks("# Title", server=server), ([], ""))
+
+    def test_ast_reader_records_source_positions(self):
+        finished = subprocess.CompletedProcess([], 0, stdout='{"blocks": []}', stderr="")
+        with mock.patch.object(debugger.subprocess, "run", return_value=finished) as run:
+            self.assertEqual(debugger.get_markdown_ast("Text"), ({"blocks": []}, ""))
+            self.assertEqual(run.call_args.args[0], ["pandoc", "-f", "commonmark_x+sourcepos", "-t", "json"])
+            debugger.get_markdown_ast("Text", reader="markdown")
+            self.assertEqual(run.call_args.args[0], ["pandoc", "-f", "markdown", "-t", "json"])
+        with self.assertRaises(ValueError):
+            debugger.find_error_ranges(DOCUMENT, reader="rst")
+
+    def test_verdicts_are_reported_while_running(self):
+        for search in debugger.SEARCH_MODES:
+            verdicts, progress = [], []
+            stats = debugger.DebugStats()
+            good, bad, _ = self.run_debugger(search=search, stats=stats, on_progress=lambda *counts: progress.append(counts),
+                                             on_verdict=lambda *verdict: verdicts.append(verdict))
+            self.assertEqual(debugger._consolidate_ranges([(s, e) for kind, s, e in verdicts if kind == "bad"]), bad)
+            self.assertEqual(debugger._consolidate_ranges([(s, e) for kind, s, e in verdicts if kind == "good"]), good)
+            self.assertEqual(verdicts[0], ("good", 1, 3)) # The first chunk is settled before any localization
+            self.assertEqual(progress[-1], (stats.total_compilations, stats.total_compilations))
+
+    def test_bisect_finds_same_ranges_as_linear(self):
+        self.assertEqual(self.run_debugger(search="bisect"), self.run_debugger(search="linear"))
+
+    def test_unknown_search_mode(self):
+        with self.assertRaises(ValueError):
+            debugger.find_error_ranges(DOCUMENT, search="random")
+
+
+class TestTimeouts(unittest.TestCase):
+    # The closing paragraph of DOCUMENT sends TeX into a loop
+    DOCUMENT = DOCUMENT.replace("Closing paragraph.", "Closing \\loop paragraph.")
+
+    @staticmethod
+    def compile_with_hang(markdown_string, output_pdf_path="temp_output.pdf", cache=None, **options):
+        if "\\loop" in markdown_string:
+            return False, TIMEOUT_PREFIX + "pandoc did not finish within 1 seconds."
+        return fake_compile(markdown_string)
+
+    def run_debugger(self, compile_fn, **kwargs):
+        stats = debugger.DebugStats()
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=compile_fn), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(BLOCKS), "")), \
+             mock.patch.object(debugger, "get_pandoc_version", return_value="pandoc 3.1"):
+            return debugger.find_error_ranges(self.DOCUMENT, stats=stats, **kwargs), stats
+
+    def test_hanging_chunk_gets_its_own_verdict(self):
+        verdicts = []
+        (good, bad, _), stats = self.run_debugger(self.compile_with_hang, on_verdict=lambda *verdict: verdicts.append(verdict))
+        self.assertEqual(bad, [(4, 4), (7, 7)]) # The hanging chunk is not inferred to be bad
+        self.assertEqual(good, [(1, 3), (5, 6), (8, 9)])
+        self.assertEqual(stats.hang_ranges, [(10, 10)])
+        self.assertIn(("hang", 10, 10), verdicts)
+
+    def test_hanging_section_is_not_bisected(self):
+        document = "# One\n\nText \\undefinedthing.\n\n# Two\n\nMore.\n\n# Three\n\n\\loop here\n\nEnd.\n"
+        verdicts = []
+        stats = debugger.DebugStats()
+        good, bad, _ = debugger.find_error_ranges(document, strategy="hierarchical", stats=stats, probe_timeout=1,
+                                                  backend=SimulatedBackend(hang_patterns=[r"\\loop"]),
+                                                  on_verdict=lambda *verdict: verdicts.append(verdict))
+        self.assertEqual(bad, [(3, 4)])
+        self.assertEqual(stats.hang_ranges, [(5, 13)]) # Sections Two and Three timed out together
+        self.assertIn(("hang", 11, 12), verdicts)
+        # Two section halves, then two block halves of section One; the hanging half is not probed again
+        self.assertEqual(stats.chunk_compilations, 4)
+
+    def test_hanging_chunk_is_probed_again_next_run(self):
+        with tempfile.TemporaryDirectory() as state_dir:
+            state_path = os.path.join(state_dir, "state.json")
+            self.run_debugger(self.compile_with_hang, state=RunState(state_path))
+            (good, bad, _), stats = self.run_debugger(fake_compile, state=RunState(state_path))
+        self.assertEqual(stats.carried_chunks, 2)
+        self.assertEqual(stats.hang_ranges, [])
+        self.assertEqual(good, [(1, 3), (5, 6), (8, 10)])
+
+    def test_time_budget_stops_probing(self):
+        def slow_compile(markdown_string, output_pdf_path="temp_output.pdf", cache=None, **options):
+            time.sleep(0.3)
+            return fake_compile(markdown_string)
+
+        (good, bad, _), stats = self.run_debugger(slow_compile, time_budget=0.1, workers=2)
+        self.assertEqual((good, bad), ([], []))
+        self.assertEqual(stats.hang_ranges, [(1, 10)]) # Every chunk was left unprobed
+
+    def test_pool_starts_nothing_after_deadline(self):
+        compile_fn = mock.Mock(return_value=(True, ""))
+        with CompilePool(compile_fn, workers=2, deadline=time.monotonic() - 1) as pool:
+            results = pool.compile_all(["a", "b"])
+        self.assertTrue(all(is_timeout(result) for result in results))
+        compile_fn.assert_not_called()
+
+    def test_timed_out_compilation_is_not_cached(self):
+        cache = mock.Mock(make_key=mock.Mock(return_value="key"), get=mock.Mock(return_value=None))
+        with mock.patch.object(debugger, "_run_killable", side_effect=subprocess.TimeoutExpired("pandoc", 2)), \
+             mock.patch.object(debugger, "get_pandoc_version", return_value="pandoc 3.1"):
+            result = debugger.compile_markdown_to_pdf("\\loop", cache=cache, timeout=2)
+        self.assertTrue(is_timeout(result))
+        cache.put.assert_not_called()
+        self.assertIn("--pdf-engine-opt=-interaction=nonstopmode", debugger.PANDOC_PDF_ARGS)
+
+    @unittest.skipUnless(hasattr(os, "killpg"), "needs process groups")
+    def test_timeout_kills_the_whole_process_group(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pid_path = os.path.join(temp_dir, "pid")
+            # Stands in for pandoc running a TeX engine that never finishes
+            script = (
+                "import subprocess, sys, time\n"
+                "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+                f"open({pid_path!r}, 'w').write(str(child.pid))\n"
+                "time.sleep(60)\n"
+            )
+            started = time.monotonic()
+            with self.assertRaises(subprocess.TimeoutExpired):
+                debugger._run_killable([sys.executable, "-c", script], "", timeout=1)
+            self.assertLess(time.monotonic() - started, 10)
+            with open(pid_path) as f:
+                child_pid = int(f.read())
+        for _ in range(50): # The orphaned child is reaped by init shortly after it dies
+            try:
+                os.kill(child_pid, 0)
+            except ProcessLookupError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail("The TeX engine stand-in survived the timeout")
+
+
+class TestIncrementalRuns(unittest.TestCase):
+
+    def setUp(self):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.state_path = os.path.join(state_dir.name, "state.json")
+
+    def run_debugger(self, document, blocks, state=None):
+        stats = debugger.DebugStats()
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=fake_compile), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(blocks), "")), \
+             mock.patch.object(debugger, "get_pandoc_version", return_value="pandoc 3.1"):
+            result = debugger.find_error_ranges(document, search="bisect", stats=stats, state=state)
+        return result, stats
+
+    def test_unchanged_chunks_keep_their_verdicts(self):
+        self.run_debugger(DOCUMENT, BLOCKS, RunState(self.state_path))
+        edited = "New \\bad first line.\n\n" + DOCUMENT
+        edited_blocks = [(1, 1)] + [(start + 2, end + 2) for start, end in BLOCKS]
+        result, stats = self.run_debugger(edited, edited_blocks, RunState(self.state_path))
+        self.assertEqual(result, self.run_debugger(edited, edited_blocks)[0])
+        self.assertEqual((stats.carried_chunks, stats.chunk_compilations, stats.localization_compilations), (3, 1, 0))
+
+    def test_changed_chunk_is_probed_again(self):
+        self.run_debugger(DOCUMENT, BLOCKS, RunState(self.state_path))
+        fixed = DOCUMENT.replace("Fourth line, also \\bad.", "Fourth line.")
+        result, stats = self.run_debugger(fixed, BLOCKS, RunState(self.state_path))
+        self.assertEqual(result[1], [(4, 4)])
+        self.assertEqual((stats.carried_chunks, stats.chunk_compilations), (2, 1))
+
+    def test_identical_document_needs_no_compilation(self):
+        first, _ = self.run_debugger(DOCUMENT, BLOCKS, RunState(self.state_path))
+        second, stats = self.run_debugger(DOCUMENT, BLOCKS, RunState(self.state_path))
+        self.assertEqual(second, first)
+        self.assertEqual(stats.total_compilations, 0)
+
+    def test_changed_configuration_discards_verdicts(self):
+        self.run_debugger(DOCUMENT, BLOCKS, RunState(self.state_path))
+        with_header = "---\ntitle: T\n---\n" + DOCUMENT
+        blocks = [(start + 3, end + 3) for start, end in BLOCKS]
+        _, stats = self.run_debugger(with_header, blocks, RunState(self.state_path))
+        self.assertEqual((stats.carried_chunks, stats.chunk_compilations), (0, 3))
+
+
+class TestGuidedSearch(unittest.TestCase):
+
+    PREAMBLE = "\\documentclass{article}\n\\begin{document}\n"
+
+    def fake_convert(self, markdown_string, standalone=False, server=None, backend=None):
+        return True, self.PREAMBLE + markdown_string + "\\end{document}\n"
+
+    def run_guided(self, tex_error, **kwargs):
+        def compile_with_log(markdown_string, output_pdf_path="temp_output.pdf", cache=None, **options):
+            if markdown_string == DOCUMENT:
+                return False, tex_error
+            return fake_compile(markdown_string)
+
+        stats = debugger.DebugStats()
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=compile_with_log) as compile_pdf, \
+             mock.patch.object(debugger, "convert_markdown_to_latex", side_effect=self.fake_convert), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(BLOCKS), "")), \
+             mock.patch.object(debugger, "get_pandoc_version", return_value="pandoc 3.1"):
+            result = debugger.find_error_ranges(DOCUMENT, search="bisect", stats=stats, guided=True, **kwargs)
+        return result, stats, compile_pdf.call_count
+
+    def test_error_line_leads_to_failing_chunk(self):
+        # Line 4 of the Markdown is line 6 of the LaTeX, after the two preamble lines
+        (good, bad, _), stats, compilations = self.run_guided("! Undefined control sequence.\nl.6 Para with \\bad")
+        self.assertEqual((stats.guided_chunk, stats.guided_hit), ((4, 9), True))
+        self.assertEqual(bad, [(4, 4), (7, 7)])
+        self.assertEqual(good, [(5, 6), (8, 9)])
+        self.assertEqual(compilations, 2 + stats.localization_compilations) # Whole document, guessed chunk
+
+    def test_wrong_guess_falls_back_to_full_search(self):
+        (good, bad, _), stats, _ = self.run_guided("! Undefined control sequence.\nl.3 Intro line one.")
+        self.assertEqual((stats.guided_chunk, stats.guided_hit), ((1, 3), False))
+        self.assertEqual(bad, [(4, 4), (7, 7)])
+        self.assertEqual(stats.chunk_compilations, 3) # The guessed chunk is not compiled twice
+
+    def test_wrong_guess_is_reused_by_hierarchical_search(self):
+        (good, bad, _), stats, _ = self.run_guided("! Undefined control sequence.\nl.3 Intro line one.", strategy="hierarchical")
+        self.assertEqual((stats.guided_chunk, stats.guided_hit), ((1, 3), False))
+        self.assertEqual(bad, [(4, 4), (7, 7)])
+        # The guess, then the half after the guessed chunk and its two blocks
+        self.assertEqual(stats.chunk_compilations, 4)
+
+    def test_guessed_chunk_verdict_is_saved(self):
+        tex_error = "! Undefined control sequence.\nl.6 Para with \\bad"
+        with tempfile.TemporaryDirectory() as state_dir:
+            state = RunState(os.path.join(state_dir, "state.json"))
+            first, _, _ = self.run_guided(tex_error, state=state)
+            self.assertFalse(state.complete) # The other chunks were never probed
+            self.assertEqual([chunk[:2] for chunk in state.chunks], [(4, 9)])
+            second, stats, _ = self.run_guided(tex_error, state=RunState(state.path))
+        self.assertEqual(second[1], first[1])
+        self.assertEqual(second[0], [(1, 3), (5, 6), (8, 10)]) # The full search also settles the other chunks
+        # The guessed chunk keeps its verdict; only the other two chunks are probed
+        self.assertEqual((stats.carried_chunks, stats.chunk_compilations), (1, 2))
+
+    def test_condensed_error_keeps_tex_line(self):
+        stderr = ("Error producing PDF.\n! LaTeX Error: Environment foo undefined.\n\nSee the LaTeX manual.\n"
+                  "Type  H <return>  for immediate help.\n ...\n\nl.57 \\begin{foo}\n")
+        condensed = debugger._condense_pdf_error(stderr)
+        self.assertTrue(condensed.startswith("! LaTeX Error: Environment foo undefined."))
+        self.assertEqual(parse_tex_error_line(condensed), (57, "\\begin{foo}"))
+
+    def test_source_map_discounts_marker_lines(self):
+        marked = mark_chunks("# Title\n\nText $x\n", [1, 3])
+        self.assertEqual(marked.count("%SMDSRC"), 2)
+        latex = "\\begin{document}\n%SMDSRC 1\n\n\\section{Title}\n\n%SMDSRC 3\n\nText \\(x\n\\end{document}\n"
+        source_map = LatexSourceMap(latex)
+        # Unmarked LaTeX: 1 \begin{document}, 2 \section, 3 blank, 4 Text
+        self.assertEqual(source_map.markdown_line_for(4), 3)
+        self.assertEqual(source_map.markdown_line_for(2), 1)
+        self.assertIsNone(source_map.markdown_line_for(1))
+        self.assertEqual(source_map.markdown_line_for(99, "...xt \\(x"), 3) # The echoed text wins
+        self.assertEqual(parse_tex_error_line("! Missing $ inserted.\n<inserted text>\nl.42 Text \\(x"), (42, "Text \\(x"))
+        self.assertIsNone(parse_tex_error_line("pandoc: file not found"))
+
+    def test_source_map_splits_latex_into_chunk_bodies(self):
+        latex = "\\begin{document}\n\\maketitle\n%SMDSRC 1\n\n\\section{Title}\n\n%SMDSRC 3\n\nText\n\\end{document}\n"
+        self.assertEqual(LatexSourceMap(latex).chunk_bodies(), {1: "\n\\section{Title}\n\n", 3: "\nText\n"})
+
+
+class TestBatchProbe(unittest.TestCase):
+    PREAMBLE = "\\documentclass{article}\n\\begin{document}\n"
+
+    def fake_convert(self, markdown_string, standalone=False, server=None, backend=None):
+        if standalone:
+            return True, self.PREAMBLE + markdown_string + "\\end{document}\n"
+        return True, markdown_string
+
+    def run_debugger(self, document, blocks, **kwargs):
+        stats = debugger.DebugStats()
+        with mock.patch.object(debugger, "convert_markdown_to_latex", side_effect=self.fake_convert), \
+             mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=fake_compile), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks(blocks), "")):
+            return debugger.find_error_ranges(document, tex_engine=FAKE_TEX_ENGINE, stats=stats, **kwargs), stats
+
+    def test_one_run_attributes_errors_to_chunks(self):
+        results = typeset_batch(self.PREAMBLE, ["Fine.\n", "A \\bad one.\n", "Fine too.\n", "\\bad again.\n"], FAKE_TEX_ENGINE)
+        self.assertEqual([result[0] for result in results], [True, False, True, False])
+        self.assertIn("Undefined control sequence", results[1][1])
+
+    def test_unfinished_bodies_have_no_result(self):
+        results = typeset_batch(self.PREAMBLE, ["Fine.\n", "\\loop\n", "Fine too.\n"], FAKE_TEX_ENGINE, timeout=1)
+        self.assertEqual(results, [(True, ""), None, None])
+        self.assertEqual(typeset_batch(self.PREAMBLE, ["Fine.\n"], "no-such-tex-engine"), [None])
+
+    def test_batch_probe_matches_pdf_probe(self):
+        (result, stats) = self.run_debugger(DOCUMENT, BLOCKS, probe="batch", search="linear")
+        self.assertEqual(result, self.run_debugger(DOCUMENT, BLOCKS, probe="pdf", search="linear")[0])
+        self.assertEqual(stats.batched_chunks, 3)
+        self.assertEqual(stats.chunk_compilations, 1) # One TeX run for all chunks
+
+    def test_failures_after_the_first_are_confirmed(self):
+        document = "One.\n\n\\bad two.\n\nThree.\n\n\\bad four.\n\nFive.\n"
+        blocks = [(1, 1), (3, 3), (5, 5), (7, 7), (9, 9)]
+        (good, bad, _), stats = self.run_debugger(document, blocks, probe="batch")
+        self.assertEqual(bad, [(3, 4), (7, 8)])
+        self.assertEqual(good, [(1, 2), (5, 6), (9, 9)])
+        self.assertEqual(stats.batched_chunks, 4)
+        self.assertEqual(stats.chunk_compilations, 2) # The batch, and the second failure on its own
+
+
+class TestHierarchicalStrategy(unittest.TestCase):
+
+    def make_document(self, sections: int, bad_section: int) -> tuple[str, dict]:
+        """Sections of a header, a blank line, a two-line paragraph and a blank line."""
+        parts, blocks = [], []
+        for i in range(sections):
+            first = 5 * i + 1
+            body = "Text with \\bad command.\n" if i == bad_section else f"Text {i}.\n"
+            parts.append(f"# Section {i}\n\n{body}More text.\n\n")
+            blocks.append({"t": "Header", "c": [1, ["", [], [["data-pos", f"{first}:1-{first + 1}:1"]]], []]})
+            blocks.append({"t": "Div", "c": [["", [], [["data-pos", f"{first + 2}:1-{first + 3}:11"]]], []]})
+        return "".join(parts), {"blocks": blocks}
+
+    def run_debugger(self, document, ast, **kwargs):
+        stats = debugger.DebugStats()
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=fake_compile), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(get_block_table(ast), "")):
+            result = debugger.find_error_ranges(document, search="bisect", stats=stats, **kwargs)
+        return result, stats
+
+    def test_one_error_in_many_sections_needs_few_probes(self):
+        document, ast = self.make_document(200, 137)
+        flat, flat_stats = self.run_debugger(document, ast)
+        hierarchical, stats = self.run_debugger(document, ast, strategy="hierarchical")
+        self.assertEqual(hierarchical, flat)
+        self.assertEqual(hierarchical[1], [(5 * 137 + 3, 5 * 137 + 5)]) # The paragraph and its blank line
+        self.assertEqual(flat_stats.chunk_compilations, 400)
+        self.assertLessEqual(stats.total_compilations, 25)
+
+    def test_errors_in_several_sections(self):
+        document, ast = self.make_document(9, 2)
+        document = document.replace("Text 7.", "Text 7 \\bad.")
+        self.assertEqual(self.run_debugger(document, ast, strategy="hierarchical")[0], self.run_debugger(document, ast)[0])
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            debugger.find_error_ranges(DOCUMENT, strategy="random")
+
+
+class TestBisection(unittest.TestCase):
+
+    def test_single_error_in_large_chunk_needs_logarithmic_compilations(self):
+        chunk_lines = [f"Line {i}.\n" for i in range(1, 129)]
+        chunk_lines[77] = "Line with \\bad command.\n"
+        good, bad = [], []
+        with CompilePool(fake_compile) as pool:
+            compilations = debugger._bisect_failing_chunks(pool, [(10, "".join(chunk_lines))], good, bad, [])
+        self.assertEqual(bad, [(87, 87)])
+        self.assertEqual(compilations, 2 * 7) # Two halves per level of a 128-line range
+        self.assertEqual(debugger._consolidate_ranges(good), [(10, 86), (88, 137)])
+
+    def test_error_spanning_both_halves_reports_whole_range(self):
+        def needs_both_markers(markdown_string, output_pdf_path):
+            return not ("OPEN" in markdown_string and "CLOSE" in markdown_string), ""
+
+        good, bad = [], []
+        with CompilePool(needs_both_markers) as pool:
+            debugger._bisect_failing_chunks(pool, [(5, "OPEN\nbody\nCLOSE\nmore\n")], good, bad, [])
+        self.assertEqual(bad, [(5, 8)]) # Both halves compile on their own
+        self.assertEqual(good, [])
+
+    def test_stats_report_saved_compilations(self):
+        document = "Intro.\n\n" + "".join(f"Line {i}.\n" for i in range(40)) + "\\bad\n"
+        stats = debugger.DebugStats()
+        with mock.patch.object(debugger, "compile_markdown_to_pdf", side_effect=fake_compile), \
+             mock.patch.object(debugger, "get_markdown_blocks", return_value=(fake_blocks([(1, 1), (3, 43)]), "")):
+            good, bad, _ = debugger.find_error_ranges(document, search="bisect", stats=stats)
+        self.assertEqual(bad, [(43, 43)])
+        self.assertEqual(stats.linear_localization_compilations, 41)
+        self.assertLess(stats.localization_compilations, 15)
+        self.assertEqual(stats.compilations_saved, 41 - stats.localization_compilations)
+        self.assertEqual(stats.total_compilations, 1 + 2 + stats.localization_compilations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from smart_md_debugger.src.document import MarkdownDocument
+
+TEXT = "# Title\r\n\nOne\u2028two\nlast"
+
+
+class TestMarkdownDocument(unittest.TestCase):
+    def test_lines_match_splitlines(self):
+        document = MarkdownDocument(TEXT)
+        lines = TEXT.splitlines(keepends=True)
+        self.assertEqual(len(document), len(lines))
+        self.assertEqual([document.line(line) for line in range(1, len(document) + 1)], lines)
+        self.assertEqual(list(document.line_starts), [0, 9, 10, 14, 18, 22])
+
+    def test_offsets(self):
+        document = MarkdownDocument(TEXT)
+        self.assertEqual(document.line_offset(3), 10)
+        self.assertEqual(document.line_offset(len(document) + 1), len(TEXT))
+        self.assertEqual([document.line_at(offset) for offset in (0, 8, 9, 10, 13, 14, 21)], [1, 1, 2, 3, 3, 4, 5])
+        for offset in range(len(TEXT)):
+            line = document.line_at(offset)
+            self.assertLessEqual(document.line_offset(line), offset)
+            self.assertLess(offset, document.line_offset(line + 1))
+
+    def test_text_of_lines(self):
+        document = MarkdownDocument(TEXT)
+        self.assertEqual(document.text_of_lines(2, 3), "\nOne\u2028")
+        self.assertEqual(document.text_of_lines(4, 99), "two\nlast")
+        self.assertEqual(document.text_of_lines(0, 1), "# Title\r\n")
+        self.assertEqual(document.text_of_lines(3, 2), "")
+
+    def test_empty_document(self):
+        document = MarkdownDocument("")
+        self.assertEqual(len(document), 0)
+        self.assertEqual(document.text_of_lines(1, 1), "")
+
+    def test_of_reuses_documents(self):
+        document = MarkdownDocument(TEXT)
+        self.assertIs(MarkdownDocument.of(document), document)
+        self.assertEqual(MarkdownDocument.of(TEXT).text, TEXT)
+
+
+if __name__ == "__main__":
+    unittest.main()
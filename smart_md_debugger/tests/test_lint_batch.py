@@ -0,0 +1,90 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from smart_md_debugger.src import lint_batch
+
+
+class TestLintBatch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.write("clean.md", "# Title\n\nSome $x^2$ math.\n")
+        self.write("notes/week1.md", "Unclosed $x\n")
+        self.write("notes/deep/week2.markdown", "\\begin{align}\n")
+        self.write("notes/readme.txt", "$")
+        self.write("notes/.hidden/skip.md", "$")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def run_main(self, argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            status = lint_batch.main(argv)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_find_markdown_files(self):
+        files = lint_batch.find_markdown_files([self.path("notes"), self.path("*.md"), self.path("notes/week1.md")])
+        self.assertEqual(files, [self.path("notes/week1.md"), self.path("notes/deep/week2.markdown"), self.path("clean.md")])
+        self.assertEqual(lint_batch.find_markdown_files([os.path.join(self.root, "**", "week*")]),
+                         [self.path("notes/deep/week2.markdown"), self.path("notes/week1.md")])
+
+    def test_missing_paths_are_skipped(self):
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            self.assertEqual(lint_batch.find_markdown_files([self.path("missing.md"), self.path("*.tex")]), [])
+        self.assertIn("Warning:", stderr.getvalue())
+
+    def test_workers_lint_every_file(self):
+        files = lint_batch.find_markdown_files([self.root])
+        inline = {result.path: result for result in lint_batch.lint_files(files, workers=1)}
+        pooled = {result.path: result for result in lint_batch.lint_files(files, workers=2)}
+        self.assertEqual(pooled, inline)
+        self.assertEqual(inline[self.path("clean.md")].errors, [])
+        self.assertEqual(inline[self.path("notes/week1.md")].errors[0][1], "UNCLOSED_DELIMITER")
+
+    def test_unreadable_file(self):
+        with open(self.path("binary.md"), "wb") as f:
+            f.write(b"\xff\xfe$")
+        result = lint_batch.lint_file(self.path("binary.md"))
+        self.assertEqual(result.errors, [])
+        self.assertIsNotNone(result.error)
+
+    def test_main_streams_findings_and_writes_report(self):
+        report_path = self.path("report.json")
+        status, stdout, stderr = self.run_main([self.root, "-j", "2", "--json", report_path])
+        self.assertEqual(status, 1)
+        self.assertIn(f"{self.path('notes/week1.md')}:1: UNCLOSED_DELIMITER:", stdout)
+        self.assertIn("Linted 3 file(s): 2 finding(s) in 2 file(s).", stderr)
+        with open(report_path, encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual(report["files"], 3)
+        self.assertEqual(report["findings_by_type"], {"UNCLOSED_DELIMITER": 1, "UNCLOSED_ENV": 1})
+        self.assertEqual([result["path"] for result in report["results"]], sorted(result["path"] for result in report["results"]))
+
+    def test_json_on_stdout(self):
+        status, stdout, _ = self.run_main([self.path("clean.md"), "--json", "-"])
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(stdout)["findings"], 0)
+
+    def test_no_files(self):
+        status, _, stderr = self.run_main([self.path("nothing")])
+        self.assertEqual(status, 2)
+        self.assertIn("Error: No Markdown files to lint.", stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import unittest
+
+from smart_md_debugger.src.linter import MarkdownLinter, Token, lint_markdown, tokenize
+
+TEST_DIR = os.path.dirname(__file__)
+
+
+def read_sample(name):
+    with open(os.path.join(TEST_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def error_types(errors):
+    return [(line, error_type) for line, error_type, _, _ in errors]
+
+
+class TestTokenize(unittest.TestCase):
+    def test_token_types_and_positions(self):
+        tokens = tokenize("Text `\\alpha` and $x_a_b$.\n\\begin{align}\n\\sqrt ab\n\\end {align}\n")
+        self.assertEqual([(token.type, token.line, token.column) for token in tokens], [
+            ("backtick", 1, 5), ("math", 1, 18), ("script", 1, 20), ("math", 1, 24),
+            ("environment", 2, 0), ("command", 3, 0), ("environment", 4, 0),
+        ])
+        self.assertEqual(tokens[0], Token("backtick", 1, 5, "`\\alpha`", argument="\\alpha"))
+        self.assertEqual(tokens[5][3:], ("\\sqrt ab", "sqrt", "ab"))
+        self.assertEqual(tokens[6][4:], ("end", "align"))
+
+    def test_tokens_of_different_types_may_overlap(self):
+        tokens = tokenize("`\\sqrt \\alpha_1_2`")
+        self.assertEqual([token.type for token in tokens], ["backtick", "command", "script"])
+
+    def test_escaped_delimiters_are_not_tokens(self):
+        self.assertEqual(tokenize("Costs \\$5 and \\\\(x\\)"), [Token("math", 1, 18, "\\)")])
+
+    def test_tokens_do_not_span_lines(self):
+        for line_break in ("\n", "\r\n", "\r", "\x0c", "\u2028"):
+            self.assertEqual(tokenize(f"`\\a{line_break}b`"), [], repr(line_break))
+            self.assertEqual(tokenize(f"\\sqrt{line_break}ab"), [], repr(line_break))
+            self.assertEqual([token.line for token in tokenize(f"x{line_break}$y$")], [2, 2], repr(line_break))
+
+
+class TestMarkdownLinter(unittest.TestCase):
+    def test_document_is_tokenized_once(self):
+        linter = MarkdownLinter("$x$ `\\beta`")
+        self.assertIs(linter.tokens, linter.tokens)
+        self.assertEqual([token.type for token in linter.tokens_of_type("math")], ["math", "math"])
+
+    def test_clean_sample_has_no_errors(self):
+        self.assertEqual(lint_markdown(read_sample("test_linter_clean.md")), [])
+
+    def test_mixed_sample(self):
+        errors = lint_markdown(read_sample("test_linter_mixed.md"))
+        self.assertEqual(error_types(errors)[:6], [
+            (6, "BACKTICK_ESCAPING"), (6, "BACKTICK_ESCAPING"), (9, "UNCLOSED_DELIMITER"),
+            (10, "MIXED_DELIMITERS"), (10, "UNCLOSED_DELIMITER"), (11, "UNCLOSED_DELIMITER"),
+        ])
+        self.assertEqual(errors, sorted(errors, key=lambda error: error[0]))
+
+    def test_errors_on_a_line_keep_check_order(self):
+        errors = lint_markdown("\\mathbf ab \\sqrt xy $x_a_b$ \\textbf cd\n")
+        self.assertEqual([message for _, _, message, _ in errors], [
+            "Potential double subscript found: '_a_'. LaTeX does not allow consecutive non-braced subscripts.",
+            "Command \\sqrt found with potentially unbraced multi-token argument: 'xy'.",
+            "Command \\textbf found with potentially unbraced multi-token argument: 'cd'.",
+            "Command \\mathbf found with potentially unbraced multi-token argument: 'ab'.",
+        ])
+
+    def test_code_comments_and_front_matter_are_skipped(self):
+        content = ("---\ntitle: $x_a_b$\n---\n"
+                   "Use `$` and `\\begin{x}` here. <!-- \\end{y} -->\n"
+                   "```python\nprice = \"$5\"\n```\n"
+                   "```{=latex}\n\\begin{center}\n```\n")
+        self.assertEqual(error_types(lint_markdown(content)), [(4, "BACKTICK_ESCAPING"), (9, "UNCLOSED_ENV")])
+        self.assertEqual(error_types(lint_markdown(content, mask_regions=False)), [
+            (2, "DOUBLE_SUBSCRIPT"), (4, "BACKTICK_ESCAPING"), (4, "MISMATCHED_END_ENV"), (9, "UNCLOSED_ENV"),
+        ])
+
+    def test_environment_positions(self):
+        errors = lint_markdown("\\begin{itemize}\n\\end{enumerate}\n  \\end{align}\n")
+        self.assertEqual(error_types(errors), [(2, "MISMATCHED_END_ENV"), (3, "UNMATCHED_END_ENV")])
+        self.assertIn("at line 3, col 2", errors[1][2])
+
+
+if __name__ == "__main__":
+    unittest.main()
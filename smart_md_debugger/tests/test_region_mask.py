@@ -0,0 +1,55 @@
+import unittest
+
+from smart_md_debugger.src.linter import lint_markdown
+from smart_md_debugger.src.region_mask import RegionMask
+
+
+def masked(content):
+    """Returns the text and kind of every region of `content`."""
+    return [(content[start:end], kind) for start, end, kind in RegionMask(content).regions]
+
+
+class TestRegionMask(unittest.TestCase):
+    def test_front_matter(self):
+        self.assertEqual(masked("---\ntitle: x\n...\nText\n"), [("---\ntitle: x\n...\n", "front_matter")])
+        self.assertEqual(masked("Text\n---\ntitle: x\n---\n"), [])
+        # Followed by a blank line, or never closed, a first-line "---" is a thematic break
+        self.assertEqual(masked("---\n\nText $x\n\n---\n\nMore $y\n"), [])
+        self.assertEqual(masked("---\n\n# Title\n\nSome $x math\n"), [])
+        self.assertEqual(masked("---\ntitle: x\nText\n"), [])
+        self.assertEqual(masked("---\n"), [])
+        document = "---\n\n# Title\n\nSome $x math\n\n\\begin{align}\nx\n"
+        self.assertEqual([error[:2] for error in lint_markdown(document)], [(5, "UNCLOSED_DELIMITER"), (7, "UNCLOSED_ENV")])
+
+    def test_code_fences(self):
+        content = "a\n```python\nx = 1\n~~~\n```\nb\n  ~~~~\n$\n~~~~~\n"
+        self.assertEqual(masked(content), [("```python\nx = 1\n~~~\n```\n", "code_fence"),
+                                           ("  ~~~~\n$\n~~~~~\n", "code_fence")])
+
+    def test_unclosed_fence_runs_to_the_end(self):
+        self.assertEqual(masked("a\n````\nb\n```\n"), [("````\nb\n```\n", "code_fence")])
+
+    def test_raw_latex_fences_are_not_masked(self):
+        self.assertEqual(masked("```{=latex}\n\\begin{x}\n```\n"), [])
+
+    def test_inline_code(self):
+        self.assertEqual(masked("a `b` c ``d ` e`` \\`f` `g\n`h`\n"),
+                         [("`b`", "inline_code"), ("``d ` e``", "inline_code"), ("` `", "inline_code"),
+                          ("`h`", "inline_code")])
+
+    def test_html_comments(self):
+        content = "a <!-- b --> `c` <!-- d\ne `f`\ng --> `h`\n"
+        self.assertEqual(masked(content), [("<!-- b -->", "html_comment"), ("`c`", "inline_code"),
+                                           ("<!-- d\ne `f`\ng -->", "html_comment"), ("`h`", "inline_code")])
+
+    def test_comment_inside_code_is_code(self):
+        self.assertEqual(masked("`<!--` $x$\n"), [("`<!--`", "inline_code")])
+
+    def test_kind_at(self):
+        mask = RegionMask("a `b` c\n```\nd\n```\n")
+        self.assertEqual([mask.kind_at(offset) for offset in (0, 2, 4, 5, 8, 13)],
+                         [None, "inline_code", "inline_code", None, "code_fence", "code_fence"])
+
+
+if __name__ == "__main__":
+    unittest.main()
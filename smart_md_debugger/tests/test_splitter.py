@@ -0,0 +1,146 @@
+import json
+import unittest
+
+from smart_md_debugger.src.splitter import (
+    BlockIndex,
+    BlockPosition,
+    BlockTableScanner,
+    get_block_source_positions,
+    get_block_table,
+    get_section_starts,
+    get_line_extent,
+    get_source_pos,
+    parse_source_pos,
+    scan_block_table,
+    split_markdown_by_ast_blocks,
+)
+
+DOCUMENT = """# Title
+
+Some text
+over two lines.
+
+- Item 1
+- Item 2
+  - Subitem
+
+> Quoted
+"""
+
+
+def pos(value: str) -> list:
+    return ["", [], [["data-pos", value]]]
+
+
+def span(value: str, text: str) -> dict:
+    return {"t": "Span", "c": [pos(value), [{"t": "Str", "c": text}]]}
+
+
+# Shaped like `pandoc -f commonmark_x+sourcepos -t json` output for DOCUMENT: the Header
+# carries its own data-pos, the other blocks are wrapped in Divs or only have positioned Spans.
+AST = {
+    "pandoc-api-version": [1, 23, 1],
+    "meta": {},
+    "blocks": [
+        {"t": "Header", "c": [1, ["title", [], [["data-pos", "1:1-2:1"]]], [span("1:3-1:8", "Title")]]},
+        {"t": "Para", "c": [span("3:1-3:5", "Some"), {"t": "SoftBreak"}, span("4:1-4:16", "over")]},
+        {"t": "Div", "c": [pos("6:1-9:1"), [{"t": "BulletList", "c": [
+            [{"t": "Div", "c": [pos("6:3-7:1"), [{"t": "Plain", "c": [span("6:3-6:9", "Item 1")]}]]}],
+            [{"t": "Div", "c": [pos("7:3-9:1"), [
+                {"t": "Plain", "c": [span("7:3-7:9", "Item 2")]},
+                {"t": "BulletList", "c": [[{"t": "Plain", "c": [span("8:5-8:12", "Subitem")]}]]},
+            ]]}],
+        ]}]]},
+        {"t": "HorizontalRule"},
+        {"t": "BlockQuote", "c": [{"t": "Para", "c": [span("10:3-10:9", "Quoted")]}]},
+    ],
+}
+
+
+class TestSourcePositions(unittest.TestCase):
+
+    def test_parse_source_pos(self):
+        self.assertEqual(parse_source_pos("3:1-4:16"), (3, 1, 4, 16))
+        self.assertEqual(parse_source_pos("doc.md@3:5-3:9;4:1-4:3"), (3, 5, 4, 3))
+        self.assertIsNone(parse_source_pos(""))
+
+    def test_get_source_pos_reads_attributes(self):
+        self.assertEqual(get_source_pos(AST["blocks"][0]), (1, 1, 2, 1))
+        self.assertEqual(get_source_pos(AST["blocks"][2]), (6, 1, 9, 1))
+        self.assertIsNone(get_source_pos(AST["blocks"][1]))
+
+    def test_extent_comes_from_descendants(self):
+        self.assertEqual(get_line_extent(AST["blocks"][1]), (3, 4))
+        self.assertEqual(get_line_extent(AST["blocks"][4]), (10, 10))
+        self.assertIsNone(get_line_extent(AST["blocks"][3]))
+
+    def test_every_positioned_block_is_found(self):
+        self.assertEqual(get_block_source_positions(AST), [(1, 1), (3, 4), (6, 8), (10, 10)])
+
+    def test_block_table_keeps_block_types(self):
+        self.assertEqual(get_block_table(AST), [
+            BlockPosition("Header", 1, 1), BlockPosition("Para", 3, 4),
+            BlockPosition("Div", 6, 8), BlockPosition("BlockQuote", 10, 10),
+        ])
+        self.assertEqual(get_section_starts(AST), [1])
+
+
+class TestSplitByAstBlocks(unittest.TestCase):
+
+    def test_chunks_cover_the_whole_document(self):
+        chunks = split_markdown_by_ast_blocks(DOCUMENT, AST)
+        self.assertEqual([chunk_range for _, chunk_range in chunks], [(1, 2), (3, 5), (6, 9), (10, 10)])
+        self.assertEqual("".join(chunk for chunk, _ in chunks), DOCUMENT)
+
+    def test_leading_lines_join_the_first_chunk(self):
+        document = "---\ntitle: T\n---\n\n" + DOCUMENT
+        ast = {"blocks": [{"t": "Div", "c": [pos("5:1-6:1"), []]}, {"t": "Div", "c": [pos("7:1-8:1"), []]}]}
+        chunks = split_markdown_by_ast_blocks(document, ast)
+        self.assertEqual([chunk_range for _, chunk_range in chunks], [(1, 6), (7, 14)])
+
+    def test_no_positions_gives_no_chunks(self):
+        self.assertEqual(split_markdown_by_ast_blocks(DOCUMENT, {"blocks": [{"t": "Para", "c": []}]}), [])
+
+
+class TestBlockTableScanner(unittest.TestCase):
+
+    def test_scan_matches_ast_in_any_pieces(self):
+        output = json.dumps(AST, separators=(",", ":"))
+        for size in (1, 7, 64, len(output)):
+            pieces = [output[i:i + size] for i in range(0, len(output), size)]
+            self.assertEqual(scan_block_table(pieces), get_block_table(AST))
+        self.assertEqual(scan_block_table([json.dumps(AST, indent=2)]), get_block_table(AST))
+
+    def test_positions_in_meta_and_text_are_ignored(self):
+        ast = {
+            "meta": {"blocks": {"t": "MetaInlines", "c": [{"t": "Str", "c": '["data-pos","1:1-9:1"]'}]}},
+            "blocks": [{"t": "Para", "c": [span("2:1-2:4", '"blocks":[')]}],
+        }
+        self.assertEqual(scan_block_table([json.dumps(ast)]), [BlockPosition("Para", 2, 2)])
+
+    def test_truncated_output_is_an_error(self):
+        scanner = BlockTableScanner()
+        scanner.feed(json.dumps(AST)[:-40])
+        with self.assertRaises(ValueError):
+            scanner.close()
+
+
+class TestBlockIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = BlockIndex.from_ast(AST) # Blocks (1, 1), (3, 4), (6, 8), (10, 10)
+
+    def test_find_covering_block(self):
+        self.assertEqual([self.index.find(line) for line in range(1, 12)], [0, None, 1, 1, None, 2, 2, 2, None, 3, None])
+        self.assertEqual(self.index[2], (6, 8))
+        self.assertEqual(len(self.index), 4)
+
+    def test_overlapping_blocks(self):
+        self.assertEqual(list(self.index.overlapping(4, 6)), [1, 2])
+        self.assertEqual(list(self.index.overlapping(1, 10)), [0, 1, 2, 3])
+        self.assertEqual(list(self.index.overlapping(9, 9)), [])
+        self.assertEqual(list(BlockIndex([]).overlapping(1, 5)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()